@@ -1,7 +1,8 @@
 import sys
 # Ensure the path to the repo is included for module imports
 sys.path.append('/opt/airflow/repo/data_collection')
-from cve_collection import cve_init
+from cve_collection import cve_init, cve_update
+from process import graph_driver
 
 import logging
 import requests
@@ -11,28 +12,22 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
 from datetime import timedelta
-from neo4j import GraphDatabase
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('ingestion_dag_logger')
 
-# Configs for Neo4j & NVD
-NEO4J_URI = "bolt://neo4j:7687"
-NEO4J_USER = "neo4j"
-NEO4J_PASSWORD = "abcd90909090"
+# Configs for NVD (Neo4j connection settings come from NEO4J_URI, see process/graph_driver.py)
 NVD_API_CVE_COUNT_URL = "https://services.nvd.nist.gov/rest/json/cves/2.0?resultsPerPage=1"
 
 # Task 1: Get total CVEs in Neo4j
 def count_cves_in_neo4j():
     # Tell the user we are beginning the DAG ingestion checks
     logger.info("Checking how many CVEs are in Neo4j database...")
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session() as session:
-        result = session.run("MATCH (n:UcoCVE) RETURN COUNT(n) AS total_cves")
-        count = result.single()["total_cves"]
-        logging.info(f"Total CVEs in Neo4j: {count}")
-        return count
+    records = graph_driver.run_read("MATCH (n:UcoCVE) RETURN COUNT(n) AS total_cves")
+    count = records[0]["total_cves"]
+    logging.info(f"Total CVEs in Neo4j: {count}")
+    return count
 
 # Task 2: Get total CVEs from NVD API
 def count_cves_in_nvd():
@@ -47,9 +42,9 @@ def count_cves_in_nvd():
     return nvd_total
 
 # Task 3: Decide whether to run collection based on counts
-# Working method: Access the database, set the init_finished int to 0 and call
-# cve_init() to resume the ingestion process from the last recorded startIndex
-# in the database.
+# Working method: if the initial load never finished, resume cve_init() from the last
+# recorded startIndex. Otherwise cve_update() fetches only the CVEs NVD added or modified
+# since the last sync (lastModStartDate/lastModEndDate windows); the counts are logged.
 def compare_counts_and_run():
     neo4j_count = count_cves_in_neo4j()
     nvd_count = count_cves_in_nvd()
@@ -58,23 +53,24 @@ def compare_counts_and_run():
         logging.error("Failed to fetch NVD data. Skipping collection.")
         return
 
-    if nvd_count > neo4j_count:
-        logging.info("Running CVE collection - NVD has more CVEs.")
-        # Gather the environment variables needed for the database connection
-        # Define the relative path to the data file
-        logger.info("Setting up database connection...")
-        vol_path = os.environ['VOL_PATH']
-        cve_db_file = os.path.join(vol_path, 'cve_database.db')
-        with sqlite3.connect(cve_db_file) as conn:
-            # Create database cursor
-            cursor = conn.cursor()
-            cursor.execute("UPDATE cve_meta SET init_finished=0 WHERE id=12345")
-            conn.commit()
-            logger.info("Database connection established and init_finished set to 0.")
-            logger.info("Running cve_init() to resume CVE ingestion...")
-            cve_init()
+    logger.info("Setting up database connection...")
+    vol_path = os.environ['VOL_PATH']
+    cve_db_file = os.path.join(vol_path, 'cve_database.db')
+    with sqlite3.connect(cve_db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cve_meta'")
+        row = None
+        if cursor.fetchone():
+            cursor.execute("SELECT init_finished FROM cve_meta WHERE id=12345")
+            row = cursor.fetchone()
+        init_finished = row[0] if row else 0
+
+    if init_finished != 1:
+        logging.info(f"CVE initialization not finished (NVD: {nvd_count}, Neo4j: {neo4j_count}), resuming cve_init()...")
+        cve_init()
     else:
-        logging.info("No need to run CVE collection. CVEs are up-to-date.")
+        logging.info(f"Running CVE update for added and modified CVEs (NVD: {nvd_count}, Neo4j: {neo4j_count}).")
+        cve_update()
 
 # Airflow DAG definition
 default_args = {
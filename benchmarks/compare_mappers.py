@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import shutil
+import difflib
+import logging
+import argparse
+import sqlite3
+import tempfile
+
+import rdflib
+
+# Golden-output check for the in-process RML mapper. For every mapping it takes a fixed sample of
+# the collected data (the first --sample records of each rml:source), maps it once with
+# RML_MAPPER_BACKEND=jar and once with native, normalizes both outputs to sorted N-Triples and
+# diffs them. Mapped values end up in node URIs, so any difference would split nodes between a
+# graph built with the jar and one built natively. Needs java and mapping/mapper.jar.
+#
+#   python benchmarks/compare_mappers.py --data ./data --sample 500 --output mapper_comparison
+#
+# --data is a data folder the collectors filled: the production ./data, or the data folder of a
+# benchmarks/run_benchmarks.py --workdir run. The CVE pipeline hands the native mapper its pages in
+# memory, so unless --data holds a cves.json (the jar backend leaves the last batch there), the CVE
+# mapping is compared on --cves synthetic CVEs from the stand-in, shaped by build_cve_batch, half
+# of them with their CPE in the dictionary. The sorted outputs and a .diff per mapping are left in
+# --output; the exit code is 1 when any mapping differs.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from benchmarks import standin_server  # noqa: E402
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark_logger')
+
+DIFF_LINES = 200
+
+
+def _truncate(document, sample):
+    # Sample the top-level array the iterators start from, keyed ({"cves": [...]}) or bare
+    if isinstance(document, list):
+        return document[:sample]
+    if isinstance(document, dict):
+        return {key: value[:sample] if isinstance(value, list) else value for key, value in document.items()}
+    return document
+
+
+def copy_sample(data_folder, workdir, datasource, sample):
+    """Copy the first records of every source of a mapping into workdir/data; False if none exist."""
+    from process import rml_mapper
+    found = False
+    for triples_map in rml_mapper.compile_mapping(rml_mapper.MAPPING_FILES[datasource]):
+        source = os.path.normpath(triples_map.source)
+        # Collected sources are ./data/<source>/<file>.json; anything else (cpe_rml2.ttl reads a
+        # file under mapping/) is not collected data
+        if not source.startswith("data" + os.sep):
+            continue
+        relative = os.path.relpath(source, "data")
+        record_source = os.path.join(data_folder, os.path.splitext(relative)[0] + rml_mapper.RECORD_FILE_SUFFIX)
+        target = os.path.join(workdir, source)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(record_source):
+            with open(record_source, encoding="utf-8") as f, \
+                    open(rml_mapper.record_file(target), "w", encoding="utf-8") as out:
+                for index, line in enumerate(f):
+                    if index >= sample:
+                        break
+                    out.write(line)
+            found = True
+        elif os.path.exists(os.path.join(data_folder, relative)):
+            with open(os.path.join(data_folder, relative), encoding="utf-8") as f:
+                document = json.load(f)
+            with open(target, "w", encoding="utf-8") as out:
+                json.dump(_truncate(document, sample), out)
+            found = True
+    return found
+
+
+def write_synthetic_cves(workdir, count):
+    """Write count stand-in CVEs as the cves.json document the CVE pipeline would map."""
+    from data_collection import cve_collection
+    sizes = {**standin_server.DEFAULT_SIZES, "cpes": max(1, count), "cwes": max(1, count // 4)}
+    cpe_db_file = os.path.join(workdir, "cpe_data.db")
+    with sqlite3.connect(cpe_db_file) as conn:
+        conn.execute("CREATE TABLE cpe_data (cpeName TEXT PRIMARY KEY, cpeNameId TEXT, lastModified TEXT, titles TEXT)")
+        for index in range(0, sizes["cpes"], 2):
+            cpe = standin_server._cpe(index)["cpe"]
+            conn.execute("INSERT INTO cpe_data VALUES (?, ?, ?, ?)",
+                         (cpe["cpeName"], cpe["cpeNameId"], cpe["lastModified"], json.dumps(cpe["titles"])))
+    cwe_ids = frozenset(f"CWE-{index + 1}" for index in range(sizes["cwes"]))
+    cpe_index = cve_collection.CpeIndex(cpe_db_file)
+    try:
+        cves = cve_collection.build_cve_batch([standin_server._cve(index, sizes) for index in range(count)],
+                                              cwe_ids, cpe_index)
+    finally:
+        cpe_index.close()
+    os.makedirs(os.path.join(workdir, "data", "cve"), exist_ok=True)
+    with open(os.path.join(workdir, "data", "cve", "cves.json"), "w", encoding="utf-8") as f:
+        json.dump(cves, f)
+
+
+def sorted_ntriples(file_path):
+    """The triples of a mapper output as sorted N-Triples lines, whatever syntax it was written in."""
+    graph = rdflib.Graph()
+    graph.parse(file_path, format="nt" if file_path.endswith(".nt") else "turtle")
+    lines = graph.serialize(format="nt", encoding="utf-8").decode("utf-8").splitlines()
+    return sorted(line for line in lines if line.strip())
+
+
+def compare(datasource, output_folder):
+    from process import shared_functions as sf
+    outputs = {}
+    # native first: the jar backend rewrites the sources as whole JSON documents
+    for backend, suffix in [("native", ".nt"), ("jar", ".ttl")]:
+        sf.mapper_backend = backend
+        output_file = os.path.join(output_folder, f"{datasource}_{backend}{suffix}")
+        if not sf.call_mapper_update(datasource, output_file=output_file):
+            logger.error(f"{datasource}: the {backend} mapper failed")
+            return False
+        outputs[backend] = sorted_ntriples(output_file)
+        with open(os.path.join(output_folder, f"{datasource}_{backend}.sorted.nt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(outputs[backend]) + "\n")
+
+    diff = list(difflib.unified_diff(outputs["jar"], outputs["native"], "jar", "native", lineterm=""))
+    with open(os.path.join(output_folder, f"{datasource}.diff"), "w", encoding="utf-8") as f:
+        f.write("\n".join(diff) + "\n")
+    if diff:
+        logger.error(f"{datasource}: jar and native differ ({len(outputs['jar'])} vs {len(outputs['native'])} "
+                     f"triples), first lines of {datasource}.diff:\n" + "\n".join(diff[:DIFF_LINES]))
+        return False
+    logger.info(f"{datasource}: identical, {len(outputs['jar'])} triples")
+    return True
+
+
+def main():
+    from process import rml_mapper
+    parser = argparse.ArgumentParser(description="Diff the native RML mapper against mapper.jar on a sample of collected data.")
+    parser.add_argument("--data", default="data", help="data folder the collectors wrote")
+    parser.add_argument("--sample", type=int, default=500, help="records taken from each source")
+    parser.add_argument("--cves", type=int, default=200,
+                        help="synthetic CVEs to compare when --data has no cves.json (0 skips the CVE mapping)")
+    parser.add_argument("--output", default="mapper_comparison", help="folder for the sorted outputs and diffs")
+    parser.add_argument("--mappings", default=",".join(rml_mapper.MAPPING_FILES),
+                        help="comma-separated mappings to compare")
+    args = parser.parse_args()
+
+    if shutil.which("java") is None:
+        parser.error("java is needed to run mapping/mapper.jar")
+    data_folder = os.path.abspath(args.data)
+    output_folder = os.path.abspath(args.output)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # The mappings read ./data/... and the jar is run as ./mapping/mapper.jar
+    workdir = tempfile.mkdtemp(prefix="uckg_mapper_comparison_")
+    os.symlink(os.path.join(REPO_ROOT, "mapping"), os.path.join(workdir, "mapping"))
+    os.chdir(workdir)
+    # Mapped values are compared as written, not as rdflib would normalize them
+    rdflib.NORMALIZE_LITERALS = False
+
+    results = {}
+    try:
+        for datasource in [name.strip() for name in args.mappings.split(",") if name.strip()]:
+            found = copy_sample(data_folder, workdir, datasource, args.sample)
+            if not found and datasource == "cve" and args.cves > 0:
+                write_synthetic_cves(workdir, args.cves)
+                found = True
+            if not found:
+                logger.info(f"{datasource}: no collected data under {data_folder}, skipped")
+                continue
+            results[datasource] = compare(datasource, output_folder)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for datasource, identical in results.items():
+        print(f"{datasource:<8}{'identical' if identical else 'DIFFERENT'}")
+    return 0 if results and all(results.values()) else 1
+
+
+if __name__ == "__main__":
+    os.environ.setdefault('ROOT_FOLDER', REPO_ROOT)
+    os.environ.setdefault('VOL_PATH', tempfile.mkdtemp(prefix="uckg_mapper_comparison_vol_"))
+    os.environ.setdefault('UCO_ONTO_PATH', os.path.join(REPO_ROOT, "data", "UCKG_Snapshots", "uco2.ttl"))
+    os.environ.setdefault('UCO_ONTO_EXTEND_PATH', os.path.join(REPO_ROOT, "data", "UCKG_Snapshots", "uco_extended.ttl"))
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+import functools
+import subprocess
+import collections
+import multiprocessing
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# End-to-end ingestion benchmark. Starts benchmarks/standin_server.py, points every collector
+# download at it and runs cwe_init, capec_init, attack_init, d3fend_init and cve_init one after
+# the other, each in its own forked process on a fresh volume, the way entry.py runs them. For
+# every source it reports the wall time, the time spent in each pipeline stage, records per
+# second and the peak RSS of the process (and of any ontology updater subprocess it started).
+#
+# Stage times are exclusive, summed over all threads (the CVE pipeline overlaps its stages, so
+# they can add up to more than the wall time):
+#   download  http_session.get (NVD pages, bulk downloads, D3FEND lookups)
+#   map       shared_functions.call_mapper_update
+#   ontology  shared_functions.call_ontology_updater, reasoning and writing the ontology file
+#   load      graph_updater.update_graph
+#
+# Runs without Neo4j or java by default: ONTOLOGY_UPDATE_MODE=delta, GRAPH_LOAD_MODE=admin-import
+# and RML_MAPPER_BACKEND=native, so "load" is staging for neo4j-admin import and the CSV conversion
+# is timed at the end. Set GRAPH_LOAD_MODE (and NEO4J_URI) to benchmark loading into a running
+# database instead.
+#
+#   python benchmarks/run_benchmarks.py --cves 20000 --latency 0.05 --json results.json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from benchmarks import standin_server  # noqa: E402
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark_logger')
+
+SOURCES = ["cwe", "capec", "attack", "d3fend", "cve"]
+STAGES = ["download", "map", "ontology", "load"]
+STANDIN_STARTUP_TIMEOUT = 30
+
+
+class StandinAdapter(HTTPAdapter):
+    """Send https://<host>/<path> to the stand-in server as <base_url>/<host>/<path>."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.scheme == "https":
+            request.url = f"{self.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+class StageTimer:
+    """Exclusive wall time per stage: time spent in a nested timed call counts only for the inner stage."""
+
+    def __init__(self):
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def wrap(self, stage, module, name):
+        original = getattr(module, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            frames = self.local.__dict__.setdefault("frames", [])
+            frames.append(0.0)
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                nested = frames.pop()
+                if frames:
+                    frames[-1] += elapsed
+                with self.lock:
+                    self.seconds[stage] += elapsed - nested
+                    self.calls[stage] += 1
+
+        setattr(module, name, timed)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_standin(port, sizes, latency, snapshots):
+    command = [sys.executable, os.path.join(REPO_ROOT, "benchmarks", "standin_server.py"),
+               "--port", str(port), "--latency", str(latency)]
+    for name, size in sizes.items():
+        command.extend([f"--{name}", str(size)])
+    if snapshots:
+        command.extend(["--snapshots", snapshots])
+    process = subprocess.Popen(command)
+
+    deadline = time.monotonic() + STANDIN_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The stand-in server exited with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/{standin_server.CWE_HOST}/data/downloads.html", timeout=1)
+            return process
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The stand-in server did not start")
+
+
+def prepare_workdir(workdir):
+    """Lay out a working directory the collectors can run in: shared mappings and ontology, fresh data."""
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "vol"), exist_ok=True)
+    for name in ["mapping", os.path.join("data", "UCKG_Snapshots")]:
+        link = os.path.join(workdir, name)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(REPO_ROOT, name), link)
+    for source in ["cve", "cpe", "cwe", "capec", "d3fend", "attack"]:
+        os.makedirs(os.path.join(workdir, "data", source), exist_ok=True)
+
+
+def configure_environment(workdir):
+    snapshot_folder = os.path.join(REPO_ROOT, "data", "UCKG_Snapshots")
+    os.environ['ROOT_FOLDER'] = REPO_ROOT
+    os.environ['VOL_PATH'] = os.path.join(workdir, "vol")
+    os.environ.setdefault('UCO_ONTO_PATH', os.path.join(snapshot_folder, "uco2.ttl"))
+    os.environ.setdefault('UCO_ONTO_EXTEND_PATH', os.path.join(snapshot_folder, "uco_extended.ttl"))
+    os.environ.setdefault('ONTOLOGY_UPDATE_MODE', 'delta')
+    os.environ.setdefault('GRAPH_LOAD_MODE', 'admin-import')
+    # No java needed; RML_MAPPER_BACKEND=jar times the jar instead
+    os.environ.setdefault('RML_MAPPER_BACKEND', 'native')
+    # The stand-in does not throttle, so neither should the client
+    os.environ.setdefault('NVD_RATE_LIMIT', '100000')
+    # Replaying would bypass the stand-in and recording would time the snapshot store
+    os.environ['SNAPSHOT_MODE'] = 'off'
+    # Prometheus metric files of the runs stay with the rest of the benchmark data
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, "metrics")
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def _count_lines(*file_paths):
+    total = 0
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            with open(file_path, "rb") as f:
+                total += sum(1 for _ in f)
+    return total
+
+
+def count_records(source):
+    """Records the source produced for the mapper (CVEs: the progress stored in cve_meta)."""
+    if source == "cve":
+        cve_db_file = os.path.join(os.environ['VOL_PATH'], 'cve_database.db')
+        with sqlite3.connect(cve_db_file) as conn:
+            row = conn.execute("SELECT offset FROM cve_meta").fetchone()
+        return row[0] if row else 0
+    if source == "attack":
+        attack_folder = os.path.join("data", "attack")
+        return _count_lines(*[os.path.join(attack_folder, name) for name in sorted(os.listdir(attack_folder))
+                              if name.endswith(".ndjson")])
+    return _count_lines(os.path.join("data", source, {"cwe": "cwes.ndjson"}.get(source, source + ".ndjson")))
+
+
+def run_source(source, base_url, conn):
+    """Child process: run one source's init function against the stand-in and send back its measurements."""
+    from process import shared_functions as sf
+    from process import graph_updater
+    from data_collection import http_session
+    from data_collection import cve_collection, cwe_collection, capec_collection, attack_collection, d3fend_collection
+
+    http_session.session.mount("https://", StandinAdapter(base_url, pool_connections=http_session.POOL_SIZE,
+                                                          pool_maxsize=http_session.POOL_SIZE))
+    timer = StageTimer()
+    timer.wrap("download", http_session, "get")
+    timer.wrap("map", sf, "call_mapper_update")
+    timer.wrap("ontology", sf, "call_ontology_updater")
+    timer.wrap("load", graph_updater, "update_graph")
+
+    init = {
+        "cve": cve_collection.cve_init,
+        "cwe": cwe_collection.cwe_init,
+        "capec": capec_collection.capec_init,
+        "attack": attack_collection.attack_init,
+        "d3fend": d3fend_collection.d3fend_init,
+    }[source]
+    error = None
+    started = time.perf_counter()
+    try:
+        init()
+    except Exception as e:
+        logger.exception(f"{source} failed")
+        error = repr(e)
+    wall = time.perf_counter() - started
+
+    try:
+        records = count_records(source)
+    except Exception:
+        records = 0
+    conn.send({
+        "source": source,
+        "wall_seconds": wall,
+        "records": records,
+        "records_per_second": records / wall if wall > 0 else 0.0,
+        "stages": {stage: timer.seconds[stage] for stage in STAGES},
+        "stage_calls": {stage: timer.calls[stage] for stage in STAGES},
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "error": error,
+    })
+    conn.close()
+
+
+def finish_admin_import():
+    """Time turning everything staged into neo4j-admin CSVs (the import itself needs the database)."""
+    from process import graph_admin_import
+    started = time.perf_counter()
+    graph_admin_import.finish_admin_import()
+    return time.perf_counter() - started
+
+
+def print_results(results, baseline_rss_mb):
+    header = f"{'source':<8}{'records':>9}{'wall s':>9}{'rec/s':>10}" + "".join(f"{stage + ' s':>11}" for stage in STAGES) \
+        + f"{'RSS MB':>9}{'child MB':>10}"
+    print()
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['source']:<8}{result['records']:>9}{result['wall_seconds']:>9.2f}"
+              f"{result['records_per_second']:>10.1f}"
+              + "".join(f"{result['stages'][stage]:>11.2f}" for stage in STAGES)
+              + f"{result['peak_rss_mb']:>9.0f}{result['peak_child_rss_mb']:>10.0f}"
+              + (f"  FAILED: {result['error']}" if result['error'] else ""))
+    print(f"\nRSS of the harness before forking (included in every RSS figure): {baseline_rss_mb:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark UCKG ingestion against a local stand-in for NVD and MITRE.")
+    parser.add_argument("--sources", default=",".join(SOURCES),
+                        help="comma-separated sources, run in this order (cve needs cwe first)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stand-in adds to every response")
+    parser.add_argument("--snapshots", help="volume recorded with SNAPSHOT_MODE=record for the stand-in to serve")
+    parser.add_argument("--workdir", help="keep the data and volume here instead of a temporary directory")
+    parser.add_argument("--json", help="also write the results to this file")
+    for name, default in standin_server.DEFAULT_SIZES.items():
+        parser.add_argument(f"--{name}", type=int, default=default, help=f"number of synthetic {name}")
+    args = parser.parse_args()
+
+    sources = [source.strip() for source in args.sources.split(",") if source.strip()]
+    unknown = [source for source in sources if source not in SOURCES]
+    if unknown:
+        parser.error(f"unknown sources: {', '.join(unknown)}")
+    sizes = {name: getattr(args, name) for name in standin_server.DEFAULT_SIZES}
+
+    json_file = os.path.abspath(args.json) if args.json else None
+    snapshots = os.path.abspath(args.snapshots) if args.snapshots else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="uckg_benchmark_"))
+    prepare_workdir(workdir)
+    configure_environment(workdir)
+    # The collectors read and write ./data relative to the working directory
+    os.chdir(workdir)
+    logger.info(f"Benchmarking {', '.join(sources)} in {workdir} with {sizes}")
+
+    port = free_port()
+    standin = start_standin(port, sizes, args.latency, snapshots)
+    base_url = f"http://127.0.0.1:{port}"
+    baseline_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    results = []
+    mp_context = multiprocessing.get_context("fork")
+    try:
+        for source in sources:
+            parent_conn, child_conn = mp_context.Pipe(duplex=False)
+            process = mp_context.Process(target=run_source, args=(source, base_url, child_conn), name=source)
+            process.start()
+            child_conn.close()
+            try:
+                result = parent_conn.recv()
+            except EOFError:
+                result = {"source": source, "wall_seconds": 0.0, "records": 0, "records_per_second": 0.0,
+                          "stages": {stage: 0.0 for stage in STAGES}, "stage_calls": {stage: 0 for stage in STAGES},
+                          "peak_rss_mb": 0.0, "peak_child_rss_mb": 0.0, "error": "process died"}
+            process.join()
+            results.append(result)
+            logger.info(f"{source}: {result['records']} records in {result['wall_seconds']:.2f} s")
+    finally:
+        standin.terminate()
+        standin.wait()
+
+    summary = {"sizes": sizes, "latency": args.latency, "workdir": workdir,
+               "ontology_update_mode": os.environ['ONTOLOGY_UPDATE_MODE'],
+               "graph_load_mode": os.environ['GRAPH_LOAD_MODE'], "results": results}
+    if os.environ['GRAPH_LOAD_MODE'] == "admin-import":
+        summary["admin_import_csv_seconds"] = finish_admin_import()
+
+    print_results(results, baseline_rss_mb)
+    if "admin_import_csv_seconds" in summary:
+        print(f"neo4j-admin import CSVs written in {summary['admin_import_csv_seconds']:.2f} s")
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if any(result["error"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import logging
+import zipfile
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+# Local stand-in for every upstream the collectors download from, so ingestion can be run and
+# timed without touching NVD or MITRE. A request for https://<host>/<path> is sent here as
+# http://127.0.0.1:<port>/<host>/<path> (see run_benchmarks.py, which rewrites the collectors'
+# URLs). Every response is generated from the sizes given on the command line, is the same on
+# every run and carries an ETag, so the conditional downloads of http_session.get_cached behave
+# as they do against the real sites:
+#
+#   services.nvd.nist.gov/rest/json/cves/2.0, /cpes/2.0   paged by startIndex/resultsPerPage
+#   cwe.mitre.org/data/downloads.html                      links the CWE XML zip
+#   capec.mitre.org/data/downloads.html                    links the CAPEC XML zip
+#   d3fend.mitre.org/ontologies/d3fend.json, /api/technique/<id>.json
+#   attack.mitre.org/resources/attack-data-and-tools/      links one workbook per domain
+#
+# With --snapshots pointing at a volume recorded with SNAPSHOT_MODE=record, requests that were
+# recorded are answered with the recorded body instead, so real data can be replayed at the
+# stand-in's latency.
+#
+#   python benchmarks/standin_server.py --port 8099 --cves 20000 --latency 0.2
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('standin_logger')
+
+NVD_HOST = "services.nvd.nist.gov"
+CWE_HOST = "cwe.mitre.org"
+CAPEC_HOST = "capec.mitre.org"
+D3FEND_HOST = "d3fend.mitre.org"
+ATTACK_HOST = "attack.mitre.org"
+
+ATTACK_VERSION = "v99.0"
+ATTACK_DOMAINS = ["enterprise-attack", "mobile-attack", "ics-attack"]
+D3FEND_VERSION = "0.99.0"
+NVD_TIMESTAMP = "2099-01-01T00:00:00.000"
+
+DEFAULT_SIZES = {
+    "cves": 5000,
+    "cpes": 2000,
+    "cwes": 900,
+    "capecs": 550,
+    "techniques": 600,
+    "d3fend": 250,
+}
+
+
+def _cve(index, sizes):
+    cve_id = f"CVE-2099-{index:06d}"
+    cpe_name = _cpe_name(index % sizes["cpes"])
+    return {"cve": {
+        "id": cve_id,
+        "sourceIdentifier": "standin@example.org",
+        "published": NVD_TIMESTAMP,
+        "lastModified": NVD_TIMESTAMP,
+        "vulnStatus": "Analyzed",
+        "descriptions": [{"lang": "en", "value": f"Synthetic vulnerability {index} used for benchmarking the "
+                                                 f"ingestion pipeline. " * 3}],
+        "metrics": {"cvssMetricV2": [{
+            "source": "nvd@nist.gov",
+            "type": "Primary",
+            "cvssData": {"version": "2.0", "vectorString": "AV:N/AC:L/Au:N/C:P/I:P/A:P", "baseScore": 7.5},
+            "baseSeverity": "HIGH",
+            "exploitabilityScore": 10.0,
+            "impactScore": 6.4,
+            "obtainAllPrivilege": False,
+            "userInteractionRequired": False,
+        }]},
+        "weaknesses": [{"source": "nvd@nist.gov", "type": "Primary",
+                        "description": [{"lang": "en", "value": f"CWE-{index % sizes['cwes'] + 1}"}]}],
+        "configurations": [{"nodes": [{"operator": "OR", "negate": False, "cpeMatch": [
+            {"vulnerable": True, "criteria": cpe_name, "matchCriteriaId": str(uuid.uuid5(uuid.NAMESPACE_URL, cve_id))}
+        ]}]}],
+        "references": [{"url": f"https://example.org/advisories/{cve_id}", "source": "standin@example.org"}],
+    }}
+
+
+def _cpe_name(index):
+    return f"cpe:2.3:a:vendor{index % 97}:product{index}:1.{index % 10}:*:*:*:*:*:*:*"
+
+
+def _cpe(index):
+    cpe_name = _cpe_name(index)
+    return {"cpe": {
+        "deprecated": False,
+        "cpeName": cpe_name,
+        "cpeNameId": str(uuid.uuid5(uuid.NAMESPACE_URL, cpe_name)).upper(),
+        "lastModified": NVD_TIMESTAMP,
+        "created": NVD_TIMESTAMP,
+        "titles": [{"title": f"Vendor{index % 97} Product{index} 1.{index % 10}", "lang": "en"}],
+    }}
+
+
+def nvd_page(endpoint, params, sizes):
+    """One page of the CVE or CPE API. Change queries (lastModStartDate) find nothing."""
+    start_index = int(params.get("startIndex", 0))
+    per_page = int(params.get("resultsPerPage", 2000))
+    if endpoint == "cves":
+        key, total, build = "vulnerabilities", sizes["cves"], lambda i: _cve(i, sizes)
+    else:
+        key, total, build = "products", sizes["cpes"], _cpe
+    if "lastModStartDate" in params:
+        total = 0
+    items = [build(i) for i in range(start_index, min(start_index + per_page, total))]
+    return json.dumps({
+        "resultsPerPage": len(items),
+        "startIndex": start_index,
+        "totalResults": total,
+        "format": "NVD_CVE" if endpoint == "cves" else "NVD_CPE",
+        "version": "2.0",
+        "timestamp": NVD_TIMESTAMP,
+        key: items,
+    }).encode("utf-8")
+
+
+def _zip(name, text):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(name, text)
+    return buffer.getvalue()
+
+
+def cwe_catalog(sizes):
+    weaknesses = []
+    for index in range(1, sizes["cwes"] + 1):
+        weaknesses.append(
+            f'<Weakness ID="{index}" Name="Synthetic Weakness {index}" Abstraction="Base" Structure="Simple" '
+            f'Status="Draft">'
+            f'<Description>Synthetic weakness {index} used for benchmarking.</Description>'
+            f'<Extended_Description>Longer description of weakness {index}.</Extended_Description>'
+            f'<Related_Weaknesses><Related_Weakness Nature="ChildOf" CWE_ID="{max(1, index // 2)}" '
+            f'View_ID="1000" Ordinal="Primary"/></Related_Weaknesses>'
+            f'<Common_Consequences><Consequence><Scope>Integrity</Scope><Impact>Modify Application Data</Impact>'
+            f'</Consequence></Common_Consequences>'
+            f'<Potential_Mitigations><Mitigation><Phase>Implementation</Phase>'
+            f'<Description>Validate all input.</Description></Mitigation></Potential_Mitigations>'
+            f'<Likelihood_Of_Exploit>Medium</Likelihood_Of_Exploit>'
+            f'<Related_Attack_Patterns><Related_Attack_Pattern CAPEC_ID="{index % sizes["capecs"] + 1}"/>'
+            f'</Related_Attack_Patterns>'
+            f'</Weakness>')
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Weakness_Catalog xmlns="http://cwe.mitre.org/cwe-7" Name="CWE" Version="99.0">'
+            f'<Weaknesses>{"".join(weaknesses)}</Weaknesses></Weakness_Catalog>')
+
+
+def capec_catalog(sizes):
+    patterns = []
+    for index in range(1, sizes["capecs"] + 1):
+        patterns.append(
+            f'<Attack_Pattern ID="{index}" Name="Synthetic Attack Pattern {index}" Abstraction="Standard" '
+            f'Status="Draft">'
+            f'<Description>Synthetic attack pattern {index} used for benchmarking.</Description>'
+            f'<Likelihood_Of_Attack>High</Likelihood_Of_Attack><Typical_Severity>High</Typical_Severity>'
+            f'<Prerequisites><Prerequisite>The target accepts input.</Prerequisite></Prerequisites>'
+            f'<Related_Weaknesses><Related_Weakness CWE_ID="{index % sizes["cwes"] + 1}"/></Related_Weaknesses>'
+            f'<Taxonomy_Mappings><Taxonomy_Mapping Taxonomy_Name="ATTACK">'
+            f'<Entry_ID>{1000 + index % sizes["techniques"]}</Entry_ID><Entry_Name>Technique</Entry_Name>'
+            f'</Taxonomy_Mapping></Taxonomy_Mappings>'
+            f'</Attack_Pattern>')
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Attack_Pattern_Catalog xmlns="http://capec.mitre.org/capec-3" '
+            'xmlns:xhtml="http://www.w3.org/1999/xhtml" Name="CAPEC" Version="99.0">'
+            f'<Attack_Patterns>{"".join(patterns)}</Attack_Patterns></Attack_Pattern_Catalog>')
+
+
+CWE_DOWNLOADS_PAGE = b"""<html><body><table id="StripedTable">
+<tr><th>Format</th></tr>
+<tr><td><a href="/data/xml/cwec_latest.xml.zip">cwec_latest.xml.zip</a></td></tr>
+</table></body></html>"""
+
+CAPEC_DOWNLOADS_PAGE = b"""<html><body><table>
+<tr><td class="FirstCell">Mechanisms of Attack</td><td><a href="/data/xml/views/1000.xml.zip">XML.zip</a></td></tr>
+</table></body></html>"""
+
+
+def d3fend_ontology(sizes):
+    graph = [{"@id": "http://d3fend.mitre.org/ontologies/d3fend.owl", "@type": "owl:Ontology",
+              "owl:versionInfo": D3FEND_VERSION}]
+    for index in range(sizes["d3fend"]):
+        graph.append({"@id": f"d3f:SyntheticTechnique{index}", "@type": ["owl:Class", "owl:NamedIndividual"],
+                      "d3f:d3fend-id": f"D3-ST{index}", "rdfs:label": f"Synthetic Technique {index}",
+                      "d3f:definition": f"Synthetic defensive technique {index} used for benchmarking."})
+    return json.dumps({"@context": {}, "@graph": graph}).encode("utf-8")
+
+
+def d3fend_technique(technique_id, sizes):
+    index = int(technique_id.rsplit("SyntheticTechnique", 1)[-1] or 0)
+    return json.dumps({"def_to_off": {"head": {"vars": ["off_tech_id"]}, "results": {"bindings": [
+        {"off_tech_id": {"type": "literal", "value": f"T{1000 + index % sizes['techniques']}"}}
+    ]}}}).encode("utf-8")
+
+
+def attack_page():
+    links = "".join(f'<a href="/docs/{domain}-{ATTACK_VERSION}/{domain}-{ATTACK_VERSION}.xlsx">{domain}</a>'
+                    for domain in ATTACK_DOMAINS)
+    return f"<html><body>{links}</body></html>".encode("utf-8")
+
+
+def attack_workbook(domain, sizes):
+    import pandas as pd
+
+    def items(prefix, kind, count):
+        return pd.DataFrame({
+            "ID": [f"{prefix}{1000 + i}" for i in range(count)],
+            "STIX ID": [f"{kind}--{uuid.uuid5(uuid.NAMESPACE_URL, f'{domain}{prefix}{i}')}" for i in range(count)],
+            "name": [f"Synthetic {kind} {i}" for i in range(count)],
+            "description": [f"Synthetic {kind} {i} of {domain} used for benchmarking." for i in range(count)],
+            "url": [f"https://attack.mitre.org/{kind}/{prefix}{1000 + i}" for i in range(count)],
+            "domain": domain,
+        })
+
+    count = sizes["techniques"]
+    sheets = {
+        "techniques": items("T", "techniques", count),
+        "tactics": items("TA", "tactics", max(1, count // 40)),
+        "software": items("S", "software", max(1, count // 2)),
+        "groups": items("G", "groups", max(1, count // 4)),
+        "campaigns": items("C", "campaigns", max(1, count // 20)),
+        "mitigations": items("M", "mitigations", max(1, count // 15)),
+        "relationships": pd.DataFrame({
+            "source ID": [f"G{1000 + i % max(1, count // 4)}" for i in range(count * 3)],
+            "source type": "group",
+            "mapping type": "uses",
+            "target ID": [f"T{1000 + i % count}" for i in range(count * 3)],
+            "target type": "technique",
+        }),
+    }
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sheet_name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+    return buffer.getvalue()
+
+
+def synthetic_body(host, path, params, sizes):
+    """Return (body, content type) for a request to https://<host><path>, or None if unknown."""
+    if host == NVD_HOST and path in ("/rest/json/cves/2.0", "/rest/json/cpes/2.0"):
+        return nvd_page(path.split("/")[-2], params, sizes), "application/json"
+    if host == CWE_HOST and path == "/data/downloads.html":
+        return CWE_DOWNLOADS_PAGE, "text/html"
+    if host == CWE_HOST and path == "/data/xml/cwec_latest.xml.zip":
+        return _zip("cwec_v99.0.xml", cwe_catalog(sizes)), "application/zip"
+    if host == CAPEC_HOST and path == "/data/downloads.html":
+        return CAPEC_DOWNLOADS_PAGE, "text/html"
+    if host == CAPEC_HOST and path == "/data/xml/views/1000.xml.zip":
+        return _zip("1000.xml", capec_catalog(sizes)), "application/zip"
+    if host == D3FEND_HOST and path == "/ontologies/d3fend.json":
+        return d3fend_ontology(sizes), "application/json"
+    if host == D3FEND_HOST and path.startswith("/api/technique/") and path.endswith(".json"):
+        return d3fend_technique(path[len("/api/technique/"):-len(".json")], sizes), "application/json"
+    if host == ATTACK_HOST and path == "/resources/attack-data-and-tools/":
+        return attack_page(), "text/html"
+    for domain in ATTACK_DOMAINS:
+        if host == ATTACK_HOST and path == f"/docs/{domain}-{ATTACK_VERSION}/{domain}-{ATTACK_VERSION}.xlsx":
+            return attack_workbook(domain, sizes), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    sizes = DEFAULT_SIZES
+    latency = 0.0
+    snapshot_store = None
+    # Bodies that do not depend on the query (downloads, pages, workbooks) are built once
+    cache = {}
+    cache_lock = threading.Lock()
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        params = dict(parse_qsl(parts.query))
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = self._recorded(host, path, params)
+        content_type = "application/octet-stream"
+        if body is None:
+            key = (host, path) if not params else None
+            with self.cache_lock:
+                cached = self.cache.get(key) if key else None
+            if cached is None:
+                cached = synthetic_body(host, path, params, self.sizes)
+                if cached is not None and key:
+                    with self.cache_lock:
+                        self.cache[key] = cached
+            if cached is None:
+                self._send(404, b"Not found", "text/plain")
+                return
+            body, content_type = cached
+
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", content_type, etag)
+            return
+        self._send(200, body, content_type, etag)
+
+    def _recorded(self, host, path, params):
+        if self.snapshot_store is None:
+            return None
+        return self.snapshot_store.load(f"https://{host}{path}", params or None)
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(port, sizes=None, latency=0.0, snapshots=None, host="127.0.0.1"):
+    """Build (without starting) a stand-in server; port 0 picks a free port."""
+    store = None
+    if snapshots:
+        # snapshot_store reads the volume path from the environment on every call
+        os.environ['VOL_PATH'] = snapshots
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from data_collection import snapshot_store as store
+    handler = type("ConfiguredStandinHandler", (StandinHandler,),
+                   {"sizes": {**DEFAULT_SIZES, **(sizes or {})}, "latency": latency,
+                    "snapshot_store": store, "cache": {}})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic NVD, CWE, CAPEC, D3FEND and ATT&CK data locally.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--snapshots", help="volume recorded with SNAPSHOT_MODE=record to answer from first")
+    for name, default in DEFAULT_SIZES.items():
+        parser.add_argument(f"--{name}", type=int, default=default, help=f"number of synthetic {name}")
+    args = parser.parse_args()
+
+    sizes = {name: getattr(args, name) for name in DEFAULT_SIZES}
+    server = make_server(args.port, sizes, args.latency, args.snapshots)
+    logger.info(f"Stand-in server listening on http://127.0.0.1:{server.server_address[1]} with {sizes}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,192 +1,179 @@
 import os
 import requests
-import json
+import network
 import pandas as pd
-import numpy as np
 from io import BytesIO
 from config import LOGGER
 from process import shared_functions as sf
+from data_collection import http_session
 from bs4 import BeautifulSoup
 from fnmatch import fnmatch
 
 
-# Import your parse functions
-from parse import (
-    parse_attack_file,
-    parse_mitigations_file,
-    parse_campaigns_file,
-    parse_software_file,
-    parse_tactics_file,
-    parse_groups_file,
-    parse_relationships_file
-)
-
-
-# Per-dataset config: just sheet_name, parse fn, and output name
+# Per-dataset config: the sheet to read, the columns the mapping uses and, optionally, a column
+# a row must have a value in to be kept
+ITEM_COLUMNS = ["ID", "name", "description", "url", "domain"]
 DATASETS = [
-    {
-        "name":        "attack",
-        "sheet_name":  None,
-        "parse_fn":    parse_attack_file,
-        "output_json": "attack.json",
-    },
-    {
-        "name":        "mitigations",
-        "sheet_name":  "mitigations",
-        "parse_fn":    parse_mitigations_file,
-        "output_json": "mitigations.json",
-    },
-    {
-        "name":        "campaigns",
-        "sheet_name":  "campaigns",
-        "parse_fn":    parse_campaigns_file,
-        "output_json": "campaigns.json",
-    },
-    {
-        "name":        "software",
-        "sheet_name":  "software",
-        "parse_fn":    parse_software_file,
-        "output_json": "software.json",
-    },
-    {
-        "name":        "tactics",
-        "sheet_name":  "tactics",
-        "parse_fn":    parse_tactics_file,
-        "output_json": "tactics.json",
-    },
-    {
-        "name":        "groups",
-        "sheet_name":  "groups",
-        "parse_fn":    parse_groups_file,
-        "output_json": "groups.json",
-    },
-    {
-        "name":        "relationships",
-        "sheet_name":  "relationships",
-        "parse_fn":    parse_relationships_file,
-        "output_json": "relationships.json",
-    },
+    {"name": "attack",        "sheet_name": None,            "columns": ITEM_COLUMNS},
+    {"name": "mitigations",   "sheet_name": "mitigations",   "columns": ITEM_COLUMNS},
+    {"name": "campaigns",     "sheet_name": "campaigns",     "columns": ITEM_COLUMNS},
+    {"name": "software",      "sheet_name": "software",      "columns": ITEM_COLUMNS},
+    {"name": "tactics",       "sheet_name": "tactics",       "columns": ITEM_COLUMNS},
+    {"name": "groups",        "sheet_name": "groups",        "columns": ITEM_COLUMNS},
+    {"name": "relationships", "sheet_name": "relationships",
+     "columns": ["source ID", "source type", "target ID", "target type"], "required": "source ID"},
 ]
 
-def download_attack_json_file(cfg):
+ATTACK_URL = "https://attack.mitre.org"
+DOMAINS = ["enterprise-attack", "mobile-attack", "ics-attack"]
+# Sheets read from every workbook: index 0 (the techniques) plus the named ones
+SHEETS = [cfg["sheet_name"] if cfg["sheet_name"] is not None else 0 for cfg in DATASETS]
+# Parsed sheets per workbook release, keyed by the versioned file name
+WORKBOOK_CACHE_FOLDER = "attack_workbooks"
+
+
+def find_workbook_urls():
+    """Return {domain: url} of the current ATT&CK workbooks linked from the data and tools page."""
+    url = ATTACK_URL + '/resources/attack-data-and-tools/'
+    # Download Excel files from the HTML page and convert them to JSON.
+    # Fetch the HTML page from the URL
+    html_response = http_session.get_cached(url)
+    html_response.raise_for_status()
+
+    # Parse HTML using BeautifulSoup
+    soup = BeautifulSoup(html_response.text, 'html.parser')
+
+    # Dynamically grab whichever versioned Excel files exist
+    excel_files = {}
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        for prefix in DOMAINS:
+            # match any version, but we'll filter by hyphens next
+            pattern = f"/docs/{prefix}-v*/{prefix}-v*.xlsx"
+            if fnmatch(href, pattern):
+                # grab just the filename portion
+                filename = href.rsplit("/", 1)[-1]
+                # split on '-' – the "pure" file has exactly 3 parts:
+                #   ['mobile', 'attack', 'v*.xlsx']
+                # everything else (matrices, mitigations, …) has 4+ parts
+                if len(filename.split("-")) == 3:
+                    # Base URL is needed to build full links from relative paths.
+                    excel_files[prefix] = ATTACK_URL + href
+                break
+
+    if len(excel_files) < len(DOMAINS):
+        LOGGER.info("Not all required Excel links were found!")
+    return excel_files
+
+
+def shape_sheet(cfg, df, domain):
+    """Cut a sheet down to the dataset's rows and columns with whole-column operations."""
+    if "domain" in cfg["columns"]:
+        # Rows without a domain belong to the workbook they came from
+        df = df.assign(domain=df["domain"].fillna(domain) if "domain" in df else domain)
+    missing = [column for column in cfg["columns"] if column not in df]
+    if missing:
+        LOGGER.info(f"The {domain} {cfg['name']} sheet has no {missing} columns")
+    df = df.reindex(columns=cfg["columns"])
+    if "required" in cfg:
+        df = df[df[cfg["required"]].notna()]
+    return df
+
+
+def read_workbook(domain, file_url):
+    """Return {dataset name: DataFrame} for every dataset, downloading and parsing each release once."""
+    cache_folder = os.path.join(os.environ['VOL_PATH'], WORKBOOK_CACHE_FOLDER)
+    cache_file = os.path.join(cache_folder, file_url.rsplit("/", 1)[-1] + ".frames.pkl")
+    if os.path.exists(cache_file):
+        LOGGER.info(f"Using the cached sheets of {file_url}")
+        return pd.read_pickle(cache_file)
+
+    LOGGER.info(f"Downloading {file_url}")
+    file_response = http_session.get_cached(file_url)
+    file_response.raise_for_status()
+    # Use BytesIO to load the Excel content directly, reading all sheets in one pass
+    workbook = pd.ExcelFile(BytesIO(file_response.content))
+    sheets = [sheet for sheet in SHEETS if sheet == 0 or sheet in workbook.sheet_names]
+    for sheet in SHEETS:
+        if sheet not in sheets:
+            LOGGER.info(f"{file_url} has no '{sheet}' sheet")
+    frames = pd.read_excel(workbook, sheet_name=sheets)
+    datasets = {cfg["name"]: shape_sheet(cfg, frames[sheet], domain)
+                for cfg, sheet in zip(DATASETS, SHEETS) if sheet in frames}
+
+    os.makedirs(cache_folder, exist_ok=True)
+    # A new release replaces the cached sheets of the previous one
+    for old_file in os.listdir(cache_folder):
+        if old_file.startswith(domain + "-v"):
+            os.remove(os.path.join(cache_folder, old_file))
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    pd.to_pickle(datasets, tmp_file)
+    os.replace(tmp_file, cache_file)
+    return datasets
+
+
+def _replace_if_changed(filename, text):
+    """Write text to filename unless the file already holds exactly that text."""
+    if os.path.exists(filename):
+        tmp_filename = os.path.join(os.path.dirname(filename), "tmp_" + os.path.basename(filename))
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            f.write(text)
+        # Compare hashes and update if necessary.
+        if sf.calculate_file_hash(tmp_filename) == sf.calculate_file_hash(filename):
+            os.remove(tmp_filename)
+            LOGGER.info(f"The new file is identical to the existing file. Deleted {tmp_filename}.")
+        else:
+            os.replace(tmp_filename, filename)
+            LOGGER.info(f"The new file is different from the existing file. Replaced {filename}.")
+    else:
+        LOGGER.info(f"{filename} does not exist. Writing new file.")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def save_attack_dataset(cfg, df):
+    """Write one dataset as a record file for the mapper, keeping a copy on the volume."""
+    # One JSON object per row, NaN written as null
+    text = df.to_json(orient="records", lines=True, force_ascii=False) if len(df) else ""
+    if text and not text.endswith("\n"):
+        text += "\n"
+    _replace_if_changed(os.path.join(os.environ['VOL_PATH'], cfg["name"] + ".ndjson"), text)
+    parsed_filename = "./data/attack/" + cfg["name"] + ".ndjson"
+    _replace_if_changed(parsed_filename, text)
+    LOGGER.info(f"{parsed_filename} saved successfully with {len(df)} rows")
 
-    url = 'https://attack.mitre.org/resources/attack-data-and-tools/'
+
+def download_attack_json_files():
+    """Fetch each ATT&CK workbook once and emit all DATASETS from its sheets."""
     try:
-        # Download Excel files from the HTML page and convert them to JSON.
-        # Fetch the HTML page from the URL
-        html_response = requests.get(url)
-        html_response.raise_for_status()
-        html = html_response.text
-
-        # Parse HTML using BeautifulSoup
-        soup = BeautifulSoup(html, 'html.parser')
-        # Base URL is needed to build full links from relative paths.
-        base_url = "https://attack.mitre.org"
-
-        # Define the exact Excel file paths we need
-        # Dynamically grab whichever versioned Excel files exist
-        prefixes = ["enterprise-attack", "mobile-attack", "ics-attack"]
-        excel_files = {}
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            for prefix in prefixes:
-                # match any version, but we'll filter by hyphens next
-                pattern = f"/docs/{prefix}-v*/{prefix}-v*.xlsx"
-                if fnmatch(href, pattern):
-                    # grab just the filename portion
-                    filename = href.rsplit("/", 1)[-1]
-                    # split on '-' – the "pure" file has exactly 3 parts:
-                    #   ['mobile', 'attack', 'v*.xlsx']
-                    # everything else (matrices, mitigations, …) has 4+ parts
-                    if len(filename.split("-")) == 3:
-                        excel_files[prefix] = base_url + href
-                    break
-
-        if len(excel_files) < 3:
-            LOGGER.info("Not all required Excel links were found!")
-
-        # For each Excel file, download and convert it to JSON
-        all_data = []
-        for domain, file_url in excel_files.items():
-            LOGGER.info(f"Downloading {file_url}")
-            file_response = requests.get(file_url)
-            file_response.raise_for_status()
-            # Use BytesIO to load the Excel content directly
-            sheet = cfg["sheet_name"] if cfg["sheet_name"] is not None else 0
-            df = pd.read_excel(BytesIO(file_response.content), sheet_name=sheet)
-            #df = pd.read_excel(BytesIO(file_response.content), sheet_name=cfg["sheet_name"])
-            # Replace any NaN values with None (so they become JSON null)
-            df = df.replace({np.nan: None})
-            # Convert DataFrame rows to dictionaries and add them to our list.
-            records = df.to_dict(orient='records')
-            all_data.extend(records)
-
-        # Set the combined JSON data from the Excel files
-            json_data = {"@graph": all_data}
-
-            # Set the filename and volume path
-            vol_path = os.environ['VOL_PATH']
-            final_filename = os.path.join(vol_path, cfg["output_json"])
-
-            # Check if the file already exists and process accordingly
-            if os.path.exists(final_filename):
-                if sf.check_status(cfg["name"]) == 0:
-                    LOGGER.info(cfg["output_json"]+" exists...")
-                    tmp_filename = os.path.join(vol_path, "tmp_" + cfg["output_json"])
-                    LOGGER.info("Writing tmp_"+ cfg["output_json"])
-                    sf.write_file(tmp_filename, json_data)
-
-                    # Calculate the hashes for tmp and final.
-                    tmp_file_hash = sf.calculate_file_hash(tmp_filename)
-                    final_file_hash = sf.calculate_file_hash(final_filename)
-
-                    # Compare hashes and update if necessary.
-                    if tmp_file_hash == final_file_hash:
-                        os.remove(tmp_filename)
-                        LOGGER.info("The new file is identical to the existing file. Deleted tmp_"+ cfg["output_json"] + ".")
-                    else:
-                        os.remove(final_filename)
-                        os.rename(tmp_filename, final_filename)
-                        LOGGER.info("The new file is different from the existing file. Replaced" + cfg["output_json"] + "with tmp_" + cfg["output_json"] + ".")
-                else:
-                    LOGGER.info(cfg["output_json"] + " DOES NOT exist...")
-                    LOGGER.info("Writing " + cfg["output_json"])
-                    sf.write_file(final_filename, json_data)
-
-                LOGGER.info(f"File '{final_filename}' downloaded and saved successfully.")
-            else:
-                # If the file does not exist, simply write the json_data.
-                LOGGER.info(cfg["output_json"] + " does not exist. Writing new file.")
-                sf.write_file(final_filename, json_data)
-                LOGGER.info(f"File '{final_filename}' written successfully.")
-
-            LOGGER.info("Beginning JSON data parse for " + cfg["name"])
-            json_data = cfg["parse_fn"](final_filename)
-            parsed_filename = "./data/attack/" + cfg["output_json"]
-            LOGGER.info(f"Beginning JSON data parse save {parsed_filename}")
-            sf.write_file(parsed_filename, json_data)
-            LOGGER.info(f"{parsed_filename} saved successfully")
+        workbooks = [read_workbook(domain, file_url) for domain, file_url in find_workbook_urls().items()]
     except requests.exceptions.RequestException as e:
         # Handle any API request errors
         LOGGER.info(f"Error making API request: {e}")
+        return
+
+    for cfg in DATASETS:
+        # Rows of the same sheet from every domain, in domain order
+        frames = [workbook[cfg["name"]] for workbook in workbooks if cfg["name"] in workbook]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=cfg["columns"])
+        save_attack_dataset(cfg, df)
+        network.RECORDS_PARSED.labels("attack").inc(len(df))
 
 def attack_init():
     LOGGER.info("############################")
     LOGGER.info("Beginning ATTACK Data Downloads")
     LOGGER.info("############################\n")
-    for cfg in DATASETS:
-        download_attack_json_file(cfg)
+    download_attack_json_files()
 
     # Now call mapper + ontology just once
     LOGGER.info("ATT&CK Data Download Complete")
     LOGGER.info("Beginning ATT&CK Data Call Mapper Update")
-    success = sf.call_mapper_update("attack")
+    # Maps, reasons and loads only if the parsed ATT&CK data differs from what was last loaded
+    success = sf.map_and_load("attack", reason=True)
     LOGGER.info("ATTACK Data Call Mapper Update Complete")
 
     if success:
         LOGGER.info("ATT&CK Data Successfully Mapped")
-        LOGGER.info("Beginning ATT&CK Ontology Updater")
-        sf.call_ontology_updater(reason=True)
         LOGGER.info("ATT&CK Ontology Updater Complete")
         LOGGER.info("############################\n")
     else:
@@ -1,10 +1,13 @@
 import os
 import zipfile
 import requests
+import network
 from config import LOGGER
 from bs4 import BeautifulSoup
-from parse import parse_capec_file
+import xml.etree.ElementTree as ET
+from parse import iter_capec_attack_patterns
 from process import shared_functions as sf
+from data_collection import http_session
 # from utilities import check_status, write_file, calculate_file_hash, call_mapper_update, call_ontology_updater
 
 
@@ -15,7 +18,7 @@ def download_capec_xml_file():
     xml_filename = ""
 
     # Send a GET request to the URL
-    response = requests.get(url)
+    response = http_session.get_cached(url)
 
     # Check if the request was successful
     if response.status_code == 200:
@@ -48,7 +51,7 @@ def download_capec_xml_file():
                     try:
                         # Download the ZIP file to the current directory
                         with open(filename, 'wb') as f:
-                            f.write(requests.get("https://capec.mitre.org" + xml_zip_url).content)
+                            f.write(http_session.get_cached("https://capec.mitre.org" + xml_zip_url).content)
                         LOGGER.info(f"File '{filename}' downloaded successfully.")
 
                         # Extract the contents of the ZIP file
@@ -77,15 +80,21 @@ def download_capec_xml_file():
     # with open(xml_filename, "r") as file:
     #     xml_content = file.read()
 
-    # Call the parse function and pass the XML content
-    capec_json_content = parse_capec_file(xml_filename)
-    # Also write capec to data/capec folder
-    sf.write_file("./data/capec/capec.json", capec_json_content)
+    # Attack patterns are parsed as the XML streams in and written straight to capec.ndjson,
+    # one per line for the mapper, so the full record list is never held in memory
+    records_filename = "./data/capec/capec.ndjson"
+    try:
+        count = sf.write_records(records_filename, iter_capec_attack_patterns(xml_filename))
+    except ET.ParseError as e:
+        LOGGER.info(f"Error parsing XML: {e}")
+        return
+    network.RECORDS_PARSED.labels("capec").inc(count)
+    # The volume copy is built from the record file
     if sf.check_status("capec") == 0:
         filename = os.path.join(os.environ['VOL_PATH'], "tmp_capec.json")
         final_filename = os.path.join(os.environ['VOL_PATH'], "capec.json")
         LOGGER.info("Writing tmp_capec.json")
-        sf.write_file(filename, capec_json_content)
+        sf.write_file_from_records(filename, records_filename)
         tmp_file_hash = sf.calculate_file_hash(filename)
         final_file_hash = sf.calculate_file_hash(final_filename)
 
@@ -96,15 +105,14 @@ def download_capec_xml_file():
             LOGGER.info("The new file is identical to the existing file. Deleted tmp_capec.json.")
         else:
             # Hashes are different, replace existing file
-            os.remove(final_filename)
-            os.rename(filename, "/vol/data/capec.json")
+            os.replace(filename, final_filename)
             LOGGER.info("The new file is different from the existing file. Replaced capec.json with "
                         "tmp_capec.json.")
     elif sf.check_status("capec") == 3:
         LOGGER.info("capec.json DOES NOT exist...")
         LOGGER.info("Writing capec.json")
         final_filename = os.path.join(os.environ['VOL_PATH'], "capec.json")
-        sf.write_file(final_filename, capec_json_content)
+        sf.write_file_from_records(final_filename, records_filename)
 
         LOGGER.info(f"File '{final_filename}' downloaded and saved successfully.")
     else:
@@ -121,12 +129,11 @@ def capec_init():
     LOGGER.info("CAPEC Data Download Complete")
     LOGGER.info("Beginning CAPEC Parse")
 
-    successfully_mapped = sf.call_mapper_update("capec")
+    # Maps, reasons and loads only if the parsed CAPEC data differs from what was last loaded
+    successfully_mapped = sf.map_and_load("capec", reason=True)
 
     if successfully_mapped:
         LOGGER.info("CAPEC Data Successfully Mapped")
-        LOGGER.info("Beginning CAPEC Ontology Updater")
-        sf.call_ontology_updater(reason=True)
         LOGGER.info("CAPEC Ontology Updater Complete")
         LOGGER.info("############################\n")
     else:
@@ -6,9 +6,14 @@ import datetime
 import sqlite3
 import logging
 import xml.etree.ElementTree as ET
+import network
 from process import shared_functions as sf
+from process import graph_updater
+from data_collection import nvd_client
 from time import sleep
 import concurrent.futures
+import queue
+import threading
 
 # Configure the logging module
 logging.basicConfig(level=logging.INFO, 
@@ -22,16 +27,6 @@ uco_ontology = os.environ['UCO_ONTO_PATH']
 root_folder = os.environ['ROOT_FOLDER']
 vol_path = os.environ['VOL_PATH']
 
-# Function to handle API retries
-def try_call(api_url, parameters_arg, header):
-    for i in range(5):  # Retry up to 5 times
-        response = requests.get(api_url, params=parameters_arg, headers=header)
-        if response.status_code == 200:
-            return response
-        logger.warning(f"API call failed with status {response.status_code}. Retrying in 10 seconds...")
-        time.sleep(10)  # Wait before retrying
-    return response  # Return the last response, even if it failed
-
 def count_cpes_in_sqlite(db_path):
     """Count total CPEs in SQLite database."""
     try:
@@ -61,12 +56,9 @@ def count_cpes_in_sqlite(db_path):
 
 def count_cpes_in_nvd():
     """Get total CPEs from NVD API."""
-    header = {
-        'apiKey': 'ccba97f5-3cb8-4bec-bd96-f5084eb8034e'
-    }
-    response = requests.get('https://services.nvd.nist.gov/rest/json/cpes/2.0?resultsPerPage=1', headers=header)
-    if response.status_code != 200:
-        logger.warning(f"NVD API returned error code {response.status_code}")
+    response = nvd_client.get(nvd_client.CPE_API_URL, {'resultsPerPage': 1})
+    if response is None or response.status_code != 200:
+        logger.warning(f"NVD API returned error code {response.status_code if response is not None else 'error'}")
         return None
     
     data = response.json()
@@ -114,92 +106,36 @@ def download_cpe_data_to_db(db_path):
         logger.info(f"Will update CPEs starting from index {sqlite_count + 1}")
         start_index = sqlite_count + 1
     
-    # CPE API URL and headers
-    cpe_url = 'https://services.nvd.nist.gov/rest/json/cpes/2.0'
-    header = {
-        'apiKey': 'ccba97f5-3cb8-4bec-bd96-f5084eb8034e'
-    }
-    parameters = {
-        'startIndex': str(start_index),  # Start from 0 for fresh download or next index for update
-        'resultsPerPage': '10000'  # Explicitly set the maximum limit per request
-    }
-
-    # Initial API call to get total results
-    logger.info("Starting API call to fetch CPEs...")
-    cpe_response = requests.get(cpe_url, params=parameters, headers=header)
-    if cpe_response.status_code != 200:
-        cpe_response = try_call(cpe_url, parameters, header)
-        if cpe_response.status_code != 200:
-            logger.error(f"Initial API call failed with status {cpe_response.status_code}. Exiting.")
-            return
-
-    # Parse the response to get total results
-    cpe_dict = cpe_response.json()
-    total_results = cpe_dict.get('totalResults', 0)
-    remaining_results = total_results - start_index
-    logger.info(f"Remaining CPE records to fetch: {remaining_results}")
-
-    # Pagination setup for remaining results
-    increments = [str(num * 10000 + start_index) for num in range((remaining_results // 10000) + 1)]
-
-    # Multithreading setup
-    logger.info("Starting multithreaded CPE data collection...")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        # Submit all API call tasks
-        # Store futures mapped to their parameters for contextual logging on error/completion
-        future_to_params = {}
-        for increment_val in increments:
-            # Create a distinct copy of parameters for each submitted task
-            current_parameters = parameters.copy()
-            current_parameters['startIndex'] = increment_val
-            
-            future = executor.submit(try_call, cpe_url, current_parameters, header)
-            future_to_params[future] = current_parameters
-
-        processed_count = 0
-        total_calls = len(future_to_params)
-        if total_calls == 0:
-            logger.info("No new CPE records to fetch based on current startIndex and totalResults.")
-        else:
-            logger.info(f"All {total_calls} CPE API calls submitted. Processing responses as they arrive...")
-
-        # Process futures as they complete
-        for future in concurrent.futures.as_completed(future_to_params):
-            params_for_this_call = future_to_params[future] # Get original params for this future
-            try:
-                response = future.result()  # Blocks until this specific future is done
-                if response and response.status_code == 200:
-                    cpe_data = response.json()
-                    for product in cpe_data.get("products", []):
-                        cpe = product.get("cpe", {})
-                        cpe_name = cpe.get("cpeName")
-                        cpe_name_id = cpe.get("cpeNameId")
-                        last_modified = cpe.get("lastModified")
-                        
-                        # Store titles as JSON string of the list of title objects
-                        titles_list = cpe.get("titles", [])
-                        titles_json_string = json.dumps(titles_list)
-
-                        if cpe_name:
-                            # Insert or replace the data into the database
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO cpe_data (cpeName, cpeNameId, lastModified, titles)
-                                VALUES (?, ?, ?, ?)
-                            """, (cpe_name, cpe_name_id, last_modified, titles_json_string))
-                elif response: # try_call returned a response, but it's an error
-                    logger.error(f"API call for startIndex {params_for_this_call['startIndex']} failed with status {response.status_code} after retries.")
-                else: # try_call failed all retries and returned None
-                    logger.error(f"API call for startIndex {params_for_this_call['startIndex']} failed catastrophically (no response object returned from try_call).")
-
-            except Exception as e:
-                # Catches exceptions from future.result() (e.g., task raised an exception) or from the processing block
-                logger.error(f"Error processing result for API call (startIndex {params_for_this_call['startIndex']}): {e}", exc_info=True)
-            
-            processed_count += 1
-            # Log progress periodically and at the very end
-            if processed_count % 100 == 0 or processed_count == total_calls:
-                if total_calls > 0 : # Avoid division by zero or logging if no calls made
-                    logger.info(f"Processed {processed_count}/{total_calls} CPE API responses.")
+    # Pages of 10000 (the maximum per request) are fetched concurrently within the NVD rate limit
+    logger.info("Starting concurrent CPE data collection...")
+    processed_count = 0
+    for page_start, cpe_data, is_last in nvd_client.fetch_pages(nvd_client.CPE_API_URL, {}, start_index, 10000):
+        try:
+            network.RECORDS_PARSED.labels("cpe").inc(len(cpe_data.get("products", [])))
+            for product in cpe_data.get("products", []):
+                cpe = product.get("cpe", {})
+                cpe_name = cpe.get("cpeName")
+                cpe_name_id = cpe.get("cpeNameId")
+                last_modified = cpe.get("lastModified")
+                
+                # Store titles as JSON string of the list of title objects
+                titles_list = cpe.get("titles", [])
+                titles_json_string = json.dumps(titles_list)
+
+                if cpe_name:
+                    # Insert or replace the data into the database
+                    cursor.execute("""
+                        INSERT OR REPLACE INTO cpe_data (cpeName, cpeNameId, lastModified, titles)
+                        VALUES (?, ?, ?, ?)
+                    """, (cpe_name, cpe_name_id, last_modified, titles_json_string))
+        except Exception as e:
+            logger.error(f"Error processing result for API call (startIndex {page_start}): {e}", exc_info=True)
+
+        processed_count += 1
+        # Log progress periodically and at the very end
+        if processed_count % 100 == 0 or is_last:
+            conn.commit()
+            logger.info(f"Processed {processed_count} CPE API responses (startIndex {page_start}).")
 
     conn.commit()
     conn.close()
@@ -220,7 +156,13 @@ def format_datetime_string(datetime_string):
 
     return formatted_datetime
 
-def get_cwe_id_list():
+def get_cwe_ids():
+    """Known CWE IDs as a frozenset, from the catalog cwe_init writes (or the CWE XML if it is missing)."""
+    cwe_ids = sf.load_cwe_ids()
+    if cwe_ids:
+        return cwe_ids
+
+    logger.info("No CWE catalog found, reading the CWE IDs from the CWE XML file")
     # Parse the XML file
     xml_file_path = './data/cwe/cwe_dict.xml'
 
@@ -234,8 +176,8 @@ def get_cwe_id_list():
     tree = ET.parse(xml_file_path)
     root = tree.getroot()
 
-    # List to hold the extracted IDs
-    extracted_ids = []
+    # Set to hold the extracted IDs
+    extracted_ids = set()
 
     # Navigate through the XML tree and extract elements
     for weaknesses in root.findall(target_path['Weaknesses']):
@@ -243,9 +185,9 @@ def get_cwe_id_list():
             id_value = weakness.get('ID')
             if id_value is not None:
                 temp_id = "CWE-" + str(id_value)
-                extracted_ids.append(temp_id.strip())
+                extracted_ids.add(temp_id.strip())
     
-    return extracted_ids
+    return frozenset(extracted_ids)
 
     with open("./data/cwe/cwes.json", "w") as json_file:
         json.dump(cwes, json_file, indent=4)
@@ -258,36 +200,229 @@ def get_cwe_id_list():
     # logger.info(f"Records Added: {records_added}")
     # logger.info(f"Database initialization finished: {init_finished}\n")
     
-def get_cpe_data_from_db(cpe_name, db_path):
-    """Fetch detailed CPE data from the SQLite database."""
+# SQLite limits the number of bound parameters per statement, stay well under it
+CPE_LOOKUP_CHUNK_SIZE = 900
+# Number of looked up CPEs kept between pages; most pages repeat the same popular products
+CPE_CACHE_SIZE = int(os.environ.get('CPE_CACHE_SIZE', '200000'))
+
+class CpeIndex:
+    """Read-only CPE lookups for the CVE pipeline.
+
+    Keeps one connection to cpe_data.db open, resolves the CPEs of a whole page with batched
+    `WHERE cpeName IN (...)` queries and caches the results with their titles already decoded
+    into the language-keyed JSON the CVE mapping expects.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.cache = {}
+
+    def lookup_many(self, cpe_names):
+        """Make sure every name is in the cache (None when it is not in the dictionary)."""
+        missing = [name for name in set(cpe_names) if name not in self.cache]
+        if not missing:
+            return
+        if len(self.cache) + len(missing) > CPE_CACHE_SIZE:
+            self.cache.clear()
+        for start in range(0, len(missing), CPE_LOOKUP_CHUNK_SIZE):
+            chunk = missing[start:start + CPE_LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            try:
+                rows = self.conn.execute(
+                    f"SELECT cpeName, cpeNameId, lastModified, titles FROM cpe_data WHERE cpeName IN ({placeholders})",
+                    chunk).fetchall()
+            except Exception as e:
+                logger.error(f"Error querying the database for {len(chunk)} CPEs: {e}")
+                rows = []
+            for name in chunk:
+                self.cache[name] = None
+            for cpe_name, cpe_name_id, last_modified, titles in rows:
+                try:
+                    # Convert titles from JSON string to array, then transform to language-keyed dictionary
+                    titles = json.dumps({t.get("lang", ""): t.get("title", "") for t in json.loads(titles)})
+                except Exception as e:
+                    logger.error(f"Error decoding the titles of CPE {cpe_name}: {e}")
+                    continue
+                self.cache[cpe_name] = {
+                    "cpeName": cpe_name,
+                    "cpeNameId": cpe_name_id,
+                    "lastModified": last_modified,
+                    "titles": titles
+                }
+
+    def get(self, cpe_name):
+        if cpe_name not in self.cache:
+            self.lookup_many([cpe_name])
+        return self.cache.get(cpe_name)
+
+    def close(self):
+        self.conn.close()
+
+# Page size used when paging through the NVD CVE API
+CVE_PAGE_SIZE = 2000
+
+# Number of pages that may sit between two pipeline stages. A depth of 2 lets the
+# prefetcher stay one page ahead of the mapper, which stays one batch ahead of the loader.
+PIPELINE_QUEUE_DEPTH = int(os.environ.get('CVE_PIPELINE_QUEUE_DEPTH', '2'))
+
+def _page_cpe_names(vulnerabilities):
+    # Same CPE picked per configuration as in build_cve_batch, so the page can be looked up at once
+    names = []
+    for cve in vulnerabilities:
+        try:
+            for product in cve['cve']['configurations']:
+                criteria = product['nodes'][0]['cpeMatch'][0]['criteria']
+                if criteria:
+                    names.append(criteria)
+        except Exception:
+            pass
+    return names
+
+def build_cve_batch(vulnerabilities, cwe_ids, cpe_index):
+    """Shape one NVD page into the cves.json document read by the CVE rml mapping."""
+    cves = {"cves": []}
+    cpe_index.lookup_many(_page_cpe_names(vulnerabilities))
+
+    for cve in vulnerabilities:
+        cwes = []
+        cpes = []
+        try: 
+            for weakness in cve['cve']['weaknesses']:
+                for desc in weakness['description']:
+                    weakness_value = desc['value'].strip()
+                    if weakness_value in cwe_ids:
+                        # logger.info(f"Found CWE match for CVE: {cve['cve']['id']} - hasCWE -> {str(desc['value'])}")
+                        cwes.append({"cwe": {"id": desc['value'], "cve_id": cve['cve']['id']}})                                
+            for product in cve['cve']['configurations']:
+                # Access the dictionary within the list
+                cpeMeta = product['nodes'][0]
+                # Go one step further, access the dictionary within the list.
+                # A lot of key-values where values are lists...
+                cpeMetaInfo = cpeMeta['cpeMatch'][0]
+                if (cpeMetaInfo['criteria']):
+                    # logger.info(f"Found CPE match for CVE: {cve['cve']['id']} - hasCPE -> {cpeMetaInfo['criteria']}")
+                    # cpes.append({"cpe": {"cpeName": cpeMetaInfo['criteria'], "matchCriteriaId": cpeMetaInfo['matchCriteriaId'],"cve_id": cve['cve']['id']}})
+                    cpe_name = cpeMetaInfo['criteria']
+                    cpe_data = cpe_index.get(cpe_name)
+                    if cpe_data:
+                        cpes.append({
+                            "cpe": {
+                                "cpeName": cpe_data["cpeName"],
+                                "cpeNameId": cpe_data["cpeNameId"],
+                                "lastModified": cpe_data["lastModified"],
+                                "titles": cpe_data["titles"],
+                                "cve_id": cve['cve']['id'],
+                                "dictionary_found": True
+                            }
+                        })
+                    else:
+                        cpes.append({
+                            "cpe": {
+                                "cpeName": cpe_name,
+                                "cve_id": cve['cve']['id'],
+                                "dictionary_found": False
+                            }
+                        })
+                        
+        except Exception:
+            pass
+
+        metrics = cve['cve'].get('metrics', {}).get('cvssMetricV2', [{}])[0]
+        cvss_data = metrics.get('cvssData', {})
+        evaluator_solution = cve['cve'].get('evaluatorSolution', "")
+
+        cves["cves"].append({"cve":{
+            "id": cve['cve']["id"],
+            "lastModified": cve['cve']["lastModified"],
+            "published": cve['cve']["published"],
+            "descriptions": cve['cve']['descriptions'],
+            "vulnStatus": cve['cve'].get("vulnStatus", ""),
+            "vectorString": cvss_data.get("vectorString", ""),
+            "baseSeverity": metrics.get("baseSeverity", ""),
+            "exploitabilityScore": metrics.get("exploitabilityScore", ""),
+            "impactScore": metrics.get("impactScore", ""),
+            "obtainAllPrivilege": metrics.get("obtainAllPrivilege", False),
+            "userInteractionRequired": metrics.get("userInteractionRequired", False),
+            "cwes": cwes,
+            "cpes": cpes,
+            "evaluatorSolution": evaluator_solution
+            }})
+
+    return cves
+
+def _get_until_stopped(stage_queue, stop_event):
+    # Wait for the upstream stage, returning None (end of stream) if the pipeline is shutting down
+    while not stop_event.is_set():
+        try:
+            return stage_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+    return None
+
+def _put_until_stopped(stage_queue, item, stop_event):
+    # Block on a full queue, but give up if a downstream stage has died
+    while not stop_event.is_set():
+        try:
+            stage_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _fetch_stage(start_index, pages, stop_event):
+    """Producer: pull pages from NVD ahead of the mapper until the last page."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Query the database for the specific cpeName
-        cursor.execute("SELECT cpeName, cpeNameId, lastModified, titles FROM cpe_data WHERE cpeName = ?", (cpe_name,))
-        result = cursor.fetchone()
-
-        conn.close()
-
-        if result:            
-            # Convert titles from JSON string to array, then transform to language-keyed dictionary
-            titles = json.loads(result[3])
+        for page_start, page, is_last in nvd_client.fetch_pages(nvd_client.CVE_API_URL, {}, start_index,
+                                                                CVE_PAGE_SIZE, stop_event=stop_event):
+            page_item = (page_start, page["vulnerabilities"], is_last, page.get("totalResults", 0))
+            if not _put_until_stopped(pages, page_item, stop_event):
+                break
+    except Exception as e:
+        logger.error(f"CVE fetch stage failed: {e}")
+    finally:
+        _put_until_stopped(pages, None, stop_event)
 
-            return {
-                "cpeName": result[0],
-                "cpeNameId": result[1],
-                "lastModified": result[2],
-                "titles": titles
-            }
-        else:
-            return None
+def _map_stage(pages, batches, cwe_ids, cpe_db_file, stop_event):
+    """Shape each fetched page and run the rml mapper on it, handing the output on to the loader."""
+    cpe_index = None
+    try:
+        cpe_index = CpeIndex(cpe_db_file)
+        while True:
+            page = _get_until_stopped(pages, stop_event)
+            if page is None:
+                break
+            begining_index, vulnerabilities, is_last, total_results = page
+            cves = build_cve_batch(vulnerabilities, cwe_ids, cpe_index)
+            network.RECORDS_PARSED.labels("cve").inc(len(vulnerabilities))
+
+            # Every batch gets its own mapper output so the loader can still be reading the previous one
+            mapped_file = os.path.join(vol_path, f"out_cve_{begining_index}.ttl")
+            successfully_mapped = sf.call_mapper_update("cve", output_file=mapped_file,
+                                                        sources={"./data/cve/cves.json": cves})
+            if not successfully_mapped and os.path.exists(mapped_file):
+                os.remove(mapped_file)
+            batch = (begining_index, len(vulnerabilities), is_last, total_results,
+                     mapped_file if successfully_mapped else None)
+            if not _put_until_stopped(batches, batch, stop_event):
+                break
     except Exception as e:
-        logger.error(f"Error querying the database for CPE {cpe_name}: {e}")
-        return None
+        logger.error(f"CVE mapping stage failed: {e}")
+    finally:
+        if cpe_index is not None:
+            cpe_index.close()
+        _put_until_stopped(batches, None, stop_event)
+
+def _utc_watermark(moment):
+    """cve_meta.last_modified for a UTC datetime, stored without an offset."""
+    return moment.replace(tzinfo=None).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
 
 # function to collect data from cve.mitre.org
-def cve_init():
+def cve_init(wait_for_dependencies=None):
+    """Initialize the CVE data and graph.
+
+    wait_for_dependencies, if given, is called after the CPE download and before the CWE
+    catalog is read, so CVEs are only loaded once the CWEs they link to are in the graph.
+    """
 
     vol_path = os.environ['VOL_PATH']
     # Define the relative path to the data file
@@ -299,9 +434,6 @@ def cve_init():
     download_cpe_data_to_db(db_path=cpe_db_file)
     
     with sqlite3.connect(cve_db_file) as conn:
-        uco_ontology = os.environ['UCO_ONTO_PATH']
-        root_folder = os.environ['ROOT_FOLDER']
-        vol_path = os.environ['VOL_PATH']
         # Create database cursor
         cursor = conn.cursor()
 
@@ -319,6 +451,7 @@ def cve_init():
             row = cursor.fetchone()
             init_finished = row[0]
             if init_finished == 1:
+                network.CVE_BACKLOG.set(0)
                 logger.info("###############################################")
                 logger.info("CVE initializtion already complete exiting now")
                 logger.info("###############################################\n")
@@ -331,144 +464,73 @@ def cve_init():
             # Create cve_meta table
             cursor.execute('''CREATE TABLE IF NOT EXISTS cve_meta 
                             (id INTEGER PRIMARY KEY, offset INTEGER, last_modified TEXT, init_finished INTEGER DEFAULT 0)''')
-            current_time = format_datetime_string(str(datetime.datetime.now()))
-            cursor.execute("INSERT INTO cve_meta (id, offset, last_modified) VALUES (?, ?, ?)", (12345, start_index, current_time))
+            # cve_update syncs everything modified since the initialization started, including what
+            # changed while it ran; set once, in UTC like the update windows
+            cursor.execute("INSERT INTO cve_meta (id, offset, last_modified) VALUES (?, ?, ?)",
+                           (12345, start_index, _utc_watermark(datetime.datetime.now(datetime.timezone.utc))))
             conn.commit()
             
         logger.info(f"Reading in cve data starting with index {start_index}...")
-
-        # get the data from the website
-        cve_api_url = "https://services.nvd.nist.gov/rest/json/cves/2.0?startIndex=" 
-        logger.info(f"{cve_api_url}{start_index}&resultsPerPage=2000")
-        response = requests.get(f"{cve_api_url}{start_index}&resultsPerPage=2000")
+        network.CVE_OFFSET.set(start_index)
         init_finished = False 
         original_offset = start_index
 
-        cwe_id_list = get_cwe_id_list()
-        # logger.info(cwe_id_list)
-        while (response.status_code == 200 or response.status_code == 403 or response.status_code == 503) and init_finished == False:
-            early_exit = False
-            if response.status_code == 403 or response.status_code == 503:
-                for i in range(4):
-                    if i == 3:
-                        logger.info("Unable to recieve response from API, saving results and exiting...")
-                        early_exit = True
-
-                    logger.info(f"Retry #{i + 1}: Waiting for 10 seconds, due to API throttling...")
-                    time.sleep(10)
-                    response = requests.get(f"{cve_api_url}{start_index}&resultsPerPage=2000")
-                    if response.status_code == 200:
-                        logger.info("Retry Successful! Continuing processing...")
-                        break
-
-            if early_exit:
-                break
-            
-            begining_index = start_index
-            json_data = response.json()
-
-            # Check if we are done after this loop
-            # If there are less than 2000 vulnerabilities given from a response,
-            # then that means there are no remaining records to retrieve
-            vul_count = len(json_data["vulnerabilities"])
-
-            if vul_count < 2000:
-                init_finished = True
-
-            cves = {"cves": []}
-
-            for cve in json_data["vulnerabilities"]:
-                cwes = []
-                cpes = []
-                try: 
-                    for weakness in cve['cve']['weaknesses']:
-                        for desc in weakness['description']:
-                            weakness_value = desc['value'].strip()
-                            if weakness_value in cwe_id_list:
-                                # logger.info(f"Found CWE match for CVE: {cve['cve']['id']} - hasCWE -> {str(desc['value'])}")
-                                cwes.append({"cwe": {"id": desc['value'], "cve_id": cve['cve']['id']}})                                
-                    for product in cve['cve']['configurations']:
-                        # Access the dictionary within the list
-                        cpeMeta = product['nodes'][0]
-                        # Go one step further, access the dictionary within the list.
-                        # A lot of key-values where values are lists...
-                        cpeMetaInfo = cpeMeta['cpeMatch'][0]
-                        if (cpeMetaInfo['criteria']):
-                            # logger.info(f"Found CPE match for CVE: {cve['cve']['id']} - hasCPE -> {cpeMetaInfo['criteria']}")
-                            # cpes.append({"cpe": {"cpeName": cpeMetaInfo['criteria'], "matchCriteriaId": cpeMetaInfo['matchCriteriaId'],"cve_id": cve['cve']['id']}})
-                            cpe_name = cpeMetaInfo['criteria']
-                            cpe_data = get_cpe_data_from_db(cpe_name, db_path=cpe_db_file)
-                            if cpe_data:
-                                titles = json.dumps({t.get("lang", ""): t.get("title", "") for t in cpe_data.get("titles", [])})
-                                cpes.append({
-                                    "cpe": {
-                                        "cpeName": cpe_data.get("cpeName", ""),
-                                        "cpeNameId": cpe_data.get("cpeNameId", ""),
-                                        "lastModified": cpe_data.get("lastModified", ""),
-                                        "titles": titles,
-                                        "cve_id": cve['cve']['id'],
-                                        "dictionary_found": True
-                                    }
-                                })
-                            else:
-                                cpes.append({
-                                    "cpe": {
-                                        "cpeName": cpe_name,
-                                        "cve_id": cve['cve']['id'],
-                                        "dictionary_found": False
-                                    }
-                                })
-                                
-                except Exception:
-                    pass
-
-                start_index += 1
-
-                metrics = cve['cve'].get('metrics', {}).get('cvssMetricV2', [{}])[0]
-                cvss_data = metrics.get('cvssData', {})
-                evaluator_solution = cve['cve'].get('evaluatorSolution', "")
-
-                cves["cves"].append({"cve":{
-                    "id": cve['cve']["id"],
-                    "lastModified": cve['cve']["lastModified"],
-                    "published": cve['cve']["published"],
-                    "descriptions": cve['cve']['descriptions'],
-                    "vulnStatus": cve['cve'].get("vulnStatus", ""),
-                    "vectorString": cvss_data.get("vectorString", ""),
-                    "baseSeverity": metrics.get("baseSeverity", ""),
-                    "exploitabilityScore": metrics.get("exploitabilityScore", ""),
-                    "impactScore": metrics.get("impactScore", ""),
-                    "obtainAllPrivilege": metrics.get("obtainAllPrivilege", False),
-                    "userInteractionRequired": metrics.get("userInteractionRequired", False),
-                    "cwes": cwes,
-                    "cpes": cpes,
-                    "evaluatorSolution": evaluator_solution
-                    }})
-
-            with open("./data/cve/cves.json", "w+") as json_file:
-                json.dump(cves, json_file, indent=4)
-
-            successfully_mapped = sf.call_mapper_update("cve")
-            #successfully_mapped2 = sf.call_mapper_update("cpe")
-            successfully_mapped2 = True
-            if successfully_mapped and successfully_mapped2:
-                if vul_count < 2000:
-                    sf.call_ontology_updater(reason = True)
-                else:
-                    sf.call_ontology_updater()
-
-
-
-            current_time = format_datetime_string(str(datetime.datetime.now()))
-            cursor.execute("UPDATE cve_meta SET offset=?, last_modified=? WHERE id=12345", (start_index, current_time))
-            conn.commit()
-            logger.info(f"Completed batch with startIndex={begining_index}")
-
-            # Wait 5 seconds to avoid throttling
-            time.sleep(5)
-
-            response = requests.get(f"{cve_api_url}{start_index}&resultsPerPage=2000")
-
+        if wait_for_dependencies is not None:
+            logger.info("Waiting for the CWE initialization to finish...")
+            wait_for_dependencies()
+        cwe_ids = get_cwe_ids()
+
+        # The fetch and map stages run in their own threads while this thread loads batches
+        # into the graph, so wall-clock time is set by the slowest stage instead of their sum.
+        pages = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+        batches = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+        stop_event = threading.Event()
+        fetcher = threading.Thread(target=_fetch_stage, args=(start_index, pages, stop_event),
+                                   name="cve-fetch", daemon=True)
+        mapper = threading.Thread(target=_map_stage, args=(pages, batches, cwe_ids, cpe_db_file, stop_event),
+                                  name="cve-map", daemon=True)
+        fetcher.start()
+        mapper.start()
+
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                begining_index, vul_count, is_last, total_results, mapped_file = batch
+
+                if mapped_file is None:
+                    logger.error(f"Mapping CVE batch with startIndex={begining_index} failed, stopping")
+                    break
+                try:
+                    loaded = sf.call_ontology_updater(reason=is_last, input_file=mapped_file)
+                finally:
+                    if os.path.exists(mapped_file):
+                        os.remove(mapped_file)
+                if not loaded:
+                    logger.error(f"Loading CVE batch with startIndex={begining_index} failed, stopping")
+                    break
+
+                # Batches arrive in page order and the loop stops at the first one that is not loaded,
+                # so the stored offset never skips an unloaded page; the next run resumes from it
+                start_index = begining_index + vul_count
+                cursor.execute("UPDATE cve_meta SET offset=? WHERE id=12345", (start_index,))
+                conn.commit()
+                network.CVE_OFFSET.set(start_index)
+                network.CVE_BACKLOG.set(max(0, total_results - start_index))
+                logger.info(f"Completed batch with startIndex={begining_index}")
+
+                if is_last:
+                    init_finished = True
+        finally:
+            stop_event.set()
+            fetcher.join()
+            mapper.join()
+            # Mapper output for batches the loop never reached
+            while not batches.empty():
+                batch = batches.get_nowait()
+                if batch is not None and batch[4] is not None and os.path.exists(batch[4]):
+                    os.remove(batch[4])
         
         if init_finished == True:
             cursor.execute("UPDATE cve_meta SET init_finished=1 WHERE id=12345")
@@ -486,8 +548,101 @@ def cve_init():
         logger.info(f"Database initialization finished: {init_finished}\n")
 
 
+# NVD rejects lastModStartDate/lastModEndDate ranges longer than 120 days
+CVE_UPDATE_WINDOW = datetime.timedelta(days=120)
+NVD_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000+00:00"
+
+def _update_windows(since, until):
+    # Split [since, until) into consecutive ranges NVD accepts
+    while since < until:
+        window_end = min(since + CVE_UPDATE_WINDOW, until)
+        yield since, window_end
+        since = window_end
+
+def _sync_modified_cves(window_start, window_end, cwe_ids, cpe_index, reason):
+    """Fetch and load every CVE NVD reports as modified in one window. Returns the count, or None on failure."""
+    filters = {"lastModStartDate": window_start.strftime(NVD_DATETIME_FORMAT),
+               "lastModEndDate": window_end.strftime(NVD_DATETIME_FORMAT)}
+    updated = 0
+    finished = False
+    for start_index, page, is_last in nvd_client.fetch_pages(nvd_client.CVE_API_URL, filters, 0, CVE_PAGE_SIZE):
+        vulnerabilities = page["vulnerabilities"]
+        network.RECORDS_PARSED.labels("cve").inc(len(vulnerabilities))
+        if vulnerabilities:
+            cves = build_cve_batch(vulnerabilities, cwe_ids, cpe_index)
+            mapped_file = os.path.join(vol_path, f"out_cve_update_{start_index}.ttl")
+            if not sf.call_mapper_update("cve", output_file=mapped_file, sources={"./data/cve/cves.json": cves}):
+                return None
+            # Drop what the graph holds for these CVEs, then load the current version in its place
+            try:
+                with sf.graph_write_lock():
+                    graph_updater.remove_cve_subgraphs([cve['cve']['id'] for cve in vulnerabilities])
+                    loaded = sf.call_ontology_updater(reason=reason and is_last, input_file=mapped_file)
+            finally:
+                if os.path.exists(mapped_file):
+                    os.remove(mapped_file)
+            if not loaded:
+                # The window is synced again next run, which restores the CVEs removed above
+                logger.error(f"Loading updated CVEs (startIndex {start_index}) failed")
+                return None
+        updated += len(vulnerabilities)
+        finished = is_last
+    # fetch_pages stops early when a page cannot be fetched
+    return updated if finished else None
+
 def cve_update():
-    logger.info("Not added yet...")
+    """Bring the graph up to date with the CVEs NVD added or changed since cve_meta.last_modified."""
+    vol_path = os.environ['VOL_PATH']
+    cve_db_file = os.path.join(vol_path, 'cve_database.db')
+    cpe_db_file = os.path.join(vol_path, 'cpe_data.db')
+
+    with sqlite3.connect(cve_db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='cve_meta'")
+        row = None
+        if cursor.fetchone():
+            cursor.execute("SELECT init_finished, last_modified FROM cve_meta WHERE id=12345")
+            row = cursor.fetchone()
+        if row is None or row[0] != 1:
+            logger.info("CVE initialization has not finished yet, run cve_init before updating")
+            return
+
+        # New CPEs may be referenced by the changed CVEs
+        download_cpe_data_to_db(db_path=cpe_db_file)
+
+        # Stored in UTC without an offset (_utc_watermark)
+        since = datetime.datetime.fromisoformat(row[1])
+        until = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        logger.info(f"Updating CVEs modified between {since} and {until}...")
+
+        cwe_ids = get_cwe_ids()
+        cpe_index = CpeIndex(cpe_db_file)
+        windows = list(_update_windows(since, until))
+        total_updated = 0
+        try:
+            for position, (window_start, window_end) in enumerate(windows):
+                updated = _sync_modified_cves(window_start, window_end, cwe_ids, cpe_index,
+                                              reason=position == len(windows) - 1)
+                if updated is None:
+                    logger.error(f"CVE update stopped in the window starting {window_start}, it is retried next run")
+                    break
+                total_updated += updated
+                # Only move the mark past windows that were fully loaded
+                cursor.execute("UPDATE cve_meta SET last_modified=? WHERE id=12345", (_utc_watermark(window_end),))
+                conn.commit()
+        finally:
+            cpe_index.close()
+
+    logger.info("############################")
+    logger.info("CVE update completed")
+    logger.info("############################\n")
+    logger.info(f"Records Updated: {total_updated}")
+
+def reset_cve_progress():
+    """Forget how far the CVE initialization got, so the next cve_init starts from the first page."""
+    cve_db_file = os.path.join(os.environ['VOL_PATH'], 'cve_database.db')
+    with sqlite3.connect(cve_db_file) as conn:
+        conn.execute("DROP TABLE IF EXISTS cve_meta")
 
 # This funnction is used to determine if the cve table initialization is complete init (1), not complete init (0), not started yet (3), or complete init and dataload into neo4j
 def check_cve_status():
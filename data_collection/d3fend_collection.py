@@ -1,8 +1,10 @@
 import os
 import requests
+import network
 from config import LOGGER
 from parse import parse_d3fend_file
 from process import shared_functions as sf
+from data_collection import http_session
 # from utilities import check_status, write_file, calculate_file_hash, call_mapper_update, call_ontology_updater
 
 
@@ -12,7 +14,7 @@ def download_d3fend_json_file():
 
     try:
         # Make API call to retrieve JSON data
-        response = requests.get(url)
+        response = http_session.get_cached(url)
         response.raise_for_status()  # Raise an exception for HTTP errors
         json_data = response.json()
 
@@ -54,9 +56,10 @@ def download_d3fend_json_file():
 
         LOGGER.info("Beginning JSON data parse for d3fend")
         d3fend_json_data = parse_d3fend_file(final_filename)
-        d3fend_parsed_filename = "./data/d3fend/d3fend.json"
+        d3fend_parsed_filename = "./data/d3fend/d3fend.ndjson"
         LOGGER.info(f"Beginning JSON data parse save {d3fend_parsed_filename}")
-        sf.write_file(d3fend_parsed_filename, d3fend_json_data)
+        count = sf.write_records(d3fend_parsed_filename, d3fend_json_data or [])
+        network.RECORDS_PARSED.labels("d3fend").inc(count)
         LOGGER.info(f"{d3fend_parsed_filename} saved successfully")
     except requests.exceptions.RequestException as e:
         # Handle any API request errors
@@ -74,12 +77,11 @@ def d3fend_init():
     LOGGER.info("D3FEND Data Download Complete")
     LOGGER.info("Beginning D3FEND Data Call Mapper Update")
 
-    successfully_mapped = sf.call_mapper_update("d3fend")
+    # Maps, reasons and loads only if the parsed D3FEND data differs from what was last loaded
+    successfully_loaded = sf.map_and_load("d3fend", reason=True)
 
-    if successfully_mapped:
+    if successfully_loaded:
         LOGGER.info("D3FEND Data Successfully Mapped")
-        LOGGER.info("Beginning D3FEND Ontology Updater")
-        sf.call_ontology_updater(reason=True)
         LOGGER.info("############################\n")
         LOGGER.info("D3FEND Ontology Updater Complete")
         LOGGER.info("############################\n")
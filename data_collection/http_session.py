@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from data_collection import snapshot_store
+
+# Shared HTTP layer for the collectors. One requests.Session keeps connections alive between
+# calls (no new TLS handshake per request) and asks for gzip/deflate bodies. get_cached() adds
+# conditional requests for the bulk downloads: the body of every successful download is kept on
+# the volume with its ETag/Last-Modified, and the next request sends them back so an unchanged
+# file costs a 304 instead of a full re-download.
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('collect_logger')
+
+# Enough pooled connections per host for the concurrent NVD and D3FEND fetches
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+REQUEST_TIMEOUT = 300
+CACHE_FOLDER = "http_cache"
+
+session = requests.Session()
+session.headers.update({"Accept-Encoding": "gzip, deflate"})
+_adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+
+def get(url, **kwargs):
+    """GET through the shared session, or from the snapshot store when replaying."""
+    if snapshot_store.mode == "replay":
+        return snapshot_store.replay(url, kwargs.get("params"))
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    response = session.get(url, **kwargs)
+    if snapshot_store.mode == "record" and response.status_code == 200:
+        snapshot_store.record(url, kwargs.get("params"), response.content)
+    return response
+
+
+def _cache_paths(url):
+    cache_folder = os.path.join(os.environ['VOL_PATH'], CACHE_FOLDER)
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_folder, key + ".json"), os.path.join(cache_folder, key + ".body")
+
+
+def _replace_file(path, data, mode="wb"):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_cached(url, **kwargs):
+    """Conditional GET backed by the volume cache.
+
+    The response looks like a normal 200 response either way; `from_cache` tells whether the
+    server answered 304 and the body came from the cache.
+    """
+    if snapshot_store.mode == "replay":
+        return snapshot_store.replay(url, kwargs.get("params"))
+    meta_path, body_path = _cache_paths(url)
+    headers = dict(kwargs.pop("headers", None) or {})
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(body_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get(url, headers=headers, **kwargs)
+    response.from_cache = False
+    if response.status_code == 304 and meta is not None:
+        with open(body_path, "rb") as f:
+            response._content = f.read()
+        response.status_code = 200
+        response.from_cache = True
+        logger.info(f"{url} not modified, using the cached copy")
+        if snapshot_store.mode == "record":
+            snapshot_store.record(url, kwargs.get("params"), response.content)
+    elif response.status_code == 200:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        # Nothing to revalidate with next time, so nothing worth keeping
+        if etag or last_modified:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            _replace_file(body_path, response.content)
+            _replace_file(meta_path, json.dumps({"url": url, "etag": etag, "last_modified": last_modified}), "w")
+    return response
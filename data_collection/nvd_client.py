@@ -0,0 +1,169 @@
+import os
+import time
+import random
+import logging
+import threading
+import collections
+import concurrent.futures
+import email.utils
+import requests
+import network
+from data_collection import http_session, snapshot_store
+
+# Shared client for the NVD 2.0 APIs (CVE and CPE). Every request first takes a slot from a
+# sliding-window limiter sized to NVD's published limits (50 requests per rolling 30 seconds
+# with an API key, 5 without), so pages can be fetched concurrently without tripping the
+# throttle. Throttled or failed requests are retried with jittered exponential backoff,
+# waiting at least as long as a Retry-After header asks for.
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('collect_logger')
+
+CVE_API_URL = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+CPE_API_URL = "https://services.nvd.nist.gov/rest/json/cpes/2.0"
+
+API_KEY = os.environ.get('NVD_API_KEY', 'ccba97f5-3cb8-4bec-bd96-f5084eb8034e')
+RATE_LIMIT_WINDOW = 30
+RATE_LIMIT_REQUESTS = int(os.environ.get('NVD_RATE_LIMIT', '50' if API_KEY else '5'))
+# Pages requested at the same time by fetch_pages
+FETCH_WORKERS = int(os.environ.get('NVD_FETCH_WORKERS', '4'))
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 2
+BACKOFF_MAX = 120
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = 120
+
+
+class SlidingWindowLimiter:
+    """Allow at most max_requests calls to acquire() in any window of window_seconds."""
+
+    def __init__(self, max_requests, window_seconds):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.sent = collections.deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.window_seconds:
+                    self.sent.popleft()
+                if len(self.sent) < self.max_requests:
+                    self.sent.append(now)
+                    return waited
+                wait = self.window_seconds - (now - self.sent[0])
+            time.sleep(wait)
+            waited += wait
+
+
+limiter = SlidingWindowLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
+
+
+def _endpoint(url):
+    return url.rstrip("/").split("/")[-2] if url.rstrip("/").endswith("2.0") else url
+
+
+def _retry_after(response):
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return None
+
+
+def _backoff(attempt, response):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = _retry_after(response)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def get(url, params=None):
+    """GET an NVD API url within the rate limit, retrying throttling and server errors.
+
+    Returns the last response (check its status code), or None if every attempt failed to connect.
+    """
+    endpoint = _endpoint(url)
+    headers = {'apiKey': API_KEY} if API_KEY else {}
+    response = None
+    # Replayed pages come from the volume: no rate limit, and a missing page will stay missing
+    replaying = snapshot_store.mode == "replay"
+    attempts = 1 if replaying else MAX_RETRIES
+    for attempt in range(attempts):
+        if not replaying:
+            network.NVD_RATE_LIMIT_WAIT.labels(endpoint).inc(limiter.acquire())
+        started = time.monotonic()
+        try:
+            response = http_session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            logger.warning(f"NVD {endpoint} request failed: {e}")
+            response, status = None, "error"
+        network.NVD_REQUEST_SECONDS.labels(endpoint).observe(time.monotonic() - started)
+        network.NVD_REQUESTS.labels(endpoint, status).inc()
+
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return response
+        if attempt + 1 < attempts:
+            delay = _backoff(attempt, response)
+            network.NVD_RETRIES.labels(endpoint).inc()
+            logger.info(f"Retry #{attempt + 1} of NVD {endpoint} request (status {status}) in {delay:.1f} seconds...")
+            time.sleep(delay)
+    return response
+
+
+def fetch_pages(url, params, start_index, page_size, workers=FETCH_WORKERS, stop_event=None):
+    """Yield (start_index, page JSON, is_last) for every page from start_index on, in order.
+
+    Pages are fetched by up to `workers` threads, bounded by the shared rate limit. Every page's
+    totalResults extends the range if records were added while paging, and a short page ends it.
+    Stops (after yielding nothing more) when a page cannot be fetched.
+    """
+    def fetch(index):
+        response = get(url, {**params, "startIndex": index, "resultsPerPage": page_size})
+        if response is None or response.status_code != 200:
+            logger.error(f"NVD {_endpoint(url)} page startIndex={index} failed with status "
+                         f"{response.status_code if response is not None else 'error'}")
+            return None
+        return response.json()
+
+    first = fetch(start_index)
+    if first is None:
+        return
+    total_results = first.get("totalResults", 0)
+    next_index = start_index + page_size
+    if first.get("resultsPerPage", page_size) < page_size or next_index >= total_results:
+        yield start_index, first, True
+        return
+    yield start_index, first, False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = collections.deque()
+        while True:
+            # Keep a bounded number of pages ahead of the consumer
+            while next_index < total_results and len(in_flight) < workers * 2:
+                in_flight.append((next_index, executor.submit(fetch, next_index)))
+                next_index += page_size
+            index, future = in_flight.popleft()
+            page = future.result()
+            if page is None or (stop_event is not None and stop_event.is_set()):
+                break
+            total_results = max(total_results, page.get("totalResults", 0))
+            short_page = page.get("resultsPerPage", page_size) < page_size
+            is_last = short_page or (not in_flight and next_index >= total_results)
+            yield index, page, is_last
+            if is_last:
+                break
+        for _, pending in in_flight:
+            pending.cancel()
@@ -0,0 +1,105 @@
+import os
+import gzip
+import sqlite3
+import hashlib
+import datetime
+import logging
+import threading
+import requests
+from urllib.parse import urlencode
+
+# Raw-download store on the volume. With SNAPSHOT_MODE=record every successful download made
+# through data_collection/http_session.py (NVD pages, the CWE/CAPEC zips, d3fend.json, the
+# ATT&CK workbooks, D3FEND technique lookups) is kept gzip-compressed under its SHA-256, so an
+# unchanged body is stored once however often it is fetched. An index records which body each
+# request returned and when, keeping every version. With SNAPSHOT_MODE=replay (or
+# `python entry.py --replay`) the same requests are answered from the store and nothing goes
+# to the network; SNAPSHOT_AS_OF (ISO date-time) replays the versions current at that time.
+#
+#   VOL_PATH/snapshots/objects/ab/abcdef....gz
+#   VOL_PATH/snapshots/index.db   snapshots(request_key, sha256, stored_at)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('collect_logger')
+
+# "off", "record" or "replay"
+mode = os.environ.get('SNAPSHOT_MODE', 'off')
+as_of = os.environ.get('SNAPSHOT_AS_OF')
+SNAPSHOT_FOLDER = "snapshots"
+
+_index_lock = threading.Lock()
+
+
+def _path(*parts):
+    return os.path.join(os.environ['VOL_PATH'], SNAPSHOT_FOLDER, *parts)
+
+
+def _index():
+    os.makedirs(_path(), exist_ok=True)
+    conn = sqlite3.connect(_path("index.db"), timeout=60)
+    conn.execute("""CREATE TABLE IF NOT EXISTS snapshots
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, request_key TEXT, sha256 TEXT, stored_at TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS snapshots_request ON snapshots (request_key, stored_at)")
+    return conn
+
+
+def request_key(url, params=None):
+    """The url with its query parameters in a stable order; headers such as the API key are left out."""
+    if not params:
+        return url
+    return url + "?" + urlencode(sorted((str(key), str(value)) for key, value in params.items()))
+
+
+def _object_path(sha256):
+    return _path("objects", sha256[:2], sha256 + ".gz")
+
+
+def record(url, params, content):
+    """Store a downloaded body, adding an index entry only if it differs from the latest one."""
+    sha256 = hashlib.sha256(content).hexdigest()
+    object_path = _object_path(sha256)
+    if not os.path.exists(object_path):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            f.write(content)
+        os.replace(tmp_path, object_path)
+
+    key = request_key(url, params)
+    with _index_lock, _index() as conn:
+        latest = conn.execute("SELECT sha256 FROM snapshots WHERE request_key=? ORDER BY stored_at DESC, id DESC LIMIT 1",
+                              (key,)).fetchone()
+        if latest is None or latest[0] != sha256:
+            conn.execute("INSERT INTO snapshots (request_key, sha256, stored_at) VALUES (?, ?, ?)",
+                         (key, sha256, datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")))
+
+
+def load(url, params=None):
+    """Return the stored body for a request (the version current at SNAPSHOT_AS_OF, if set), or None."""
+    key = request_key(url, params)
+    with _index() as conn:
+        if as_of:
+            row = conn.execute("""SELECT sha256 FROM snapshots WHERE request_key=? AND stored_at<=?
+                                  ORDER BY stored_at DESC, id DESC LIMIT 1""", (key, as_of)).fetchone()
+        else:
+            row = conn.execute("SELECT sha256 FROM snapshots WHERE request_key=? ORDER BY stored_at DESC, id DESC LIMIT 1",
+                               (key,)).fetchone()
+    if row is None:
+        return None
+    with gzip.open(_object_path(row[0]), "rb") as f:
+        return f.read()
+
+
+def replay(url, params=None):
+    """Answer a request from the store as a 200 response; raise ConnectionError when it was never recorded."""
+    content = load(url, params)
+    if content is None:
+        raise requests.exceptions.ConnectionError(f"No snapshot of {request_key(url, params)}")
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.url = url
+    response.encoding = "utf-8"
+    response.from_cache = True
+    return response
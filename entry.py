@@ -1,9 +1,11 @@
 import sys
 import os
 import logging
-import time
+import multiprocessing
 import network
 from process import shared_functions as sf
+from process import graph_updater, graph_admin_import
+from data_collection import snapshot_store
 
 sys.path.append("./data_collection")
 from data_collection import cve_collection as cve, cwe_collection as cwe, d3fend_collection as d3fend, attack_collection as attack, capec_collection as capec
@@ -18,57 +20,92 @@ logging.basicConfig(level=logging.INFO,
 # Create a logger
 logger = logging.getLogger('entry_logger')
 
+# `python entry.py --replay` rebuilds everything from the snapshot store without touching the network
+replay = "--replay" in sys.argv[1:] or snapshot_store.mode == "replay"
+if replay:
+    snapshot_store.mode = "replay"
+    logger.info("Replay mode: every download is answered from the snapshot store\n")
+
 # Start the network script to expose scripts to prometheus
 network.signal_network_start()
 
-# Waiting for neo4j to startup
-logger.info("Waiting 2 minutes for neo4j to startup...")
-time.sleep(120)
+# Wait until neo4j accepts connections instead of sleeping a fixed time
+graph_ready_timeout = int(os.environ.get('GRAPH_READY_TIMEOUT', '600'))
+logger.info(f"Waiting up to {graph_ready_timeout} seconds for neo4j to startup...")
+if not graph_updater.is_graph_ready(timeout=graph_ready_timeout):
+    logger.error("Neo4j did not become ready, exiting now")
+    sys.exit(1)
 
 
 cwe_data_status = cwe.check_cwe_status()
-if cwe_data_status == 3:
-    logger.info("The CWE database has not been created yet, starting initialization now...\n")
-    cwe.cwe_init()
-elif cwe_data_status == 0:
-    logger.info("The CWE initialization has not finished yet, continuing now...\n")
-    cwe.cwe_init()
-    
-
 cve_data_status = cve.check_cve_status()
-if cve_data_status == 3:
-    logger.info("The CVE database has not been created yet, starting initialization now...\n")
-    cve.cve_init()
-elif cve_data_status == 0:
-    logger.info("The CVE initialization has not finished yet, continuing now...\n")
-    cve.cve_init()
-
-
 d3fend_data_status = sf.check_status("d3fend")
-if d3fend_data_status == 3:
-    logger.info("The D3FEND database has not been created yet, starting initialization now...\n")
-    d3fend.d3fend_init()
-elif d3fend_data_status == 0:
-    logger.info("The D3FEND initialization has not finished yet, continuing now...\n")
-    d3fend.d3fend_init()
-
-
 attack_data_status = sf.check_status("attack")
-if attack_data_status == 3:
-    logger.info("The ATT&CK database has not been created yet, starting initialization now...\n")
-    attack.attack_init()
-elif attack_data_status == 0:
-    logger.info("The ATT&CK initialization has not finished yet, continuing now...\n")
-    attack.attack_init()
-
-
 capec_data_status = sf.check_status("capec")
-if capec_data_status == 3:
-    logger.info("The CAPEC database has not been created yet, starting initialization now...\n")
-    capec.capec_init()
-elif capec_data_status == 0:
-    logger.info("The CAPEC initialization has not finished yet, continuing now...\n")
-    capec.capec_init()
+
+if replay:
+    # Rebuild every source from its recorded downloads, whatever state the volume is in
+    cve.reset_cve_progress()
+    cwe_data_status = cve_data_status = d3fend_data_status = attack_data_status = capec_data_status = 3
+
+# neo4j-admin import needs an empty database, so it is only used when nothing has been built yet
+cold_start = all(status == 3 for status in [cwe_data_status, cve_data_status, d3fend_data_status,
+                                             attack_data_status, capec_data_status])
+if graph_updater.load_mode == "admin-import" and not cold_start:
+    logger.info("Not a cold start, loading into Neo4j with n10s instead of neo4j-admin import\n")
+    graph_updater.load_mode = "n10s"
+
+# Every data source downloads, parses and maps in its own process; only reasoning and the graph
+# writes are serialized (shared_functions.graph_write_lock). CVEs link to CWEs, so the CVE process
+# waits for the CWE process before it loads anything.
+SOURCES = [
+    # (name, display name, status, init function, sources it depends on)
+    ("cwe", "CWE", cwe_data_status, cwe.cwe_init, []),
+    ("cve", "CVE", cve_data_status, cve.cve_init, ["cwe"]),
+    ("d3fend", "D3FEND", d3fend_data_status, d3fend.d3fend_init, []),
+    ("attack", "ATT&CK", attack_data_status, attack.attack_init, []),
+    ("capec", "CAPEC", capec_data_status, capec.capec_init, []),
+]
+
+# fork keeps the settings made above (e.g. load_mode) in the children
+mp_context = multiprocessing.get_context("fork")
+finished = {name: mp_context.Event() for name, _, _, _, _ in SOURCES}
+
+
+def run_source(name, init, dependencies):
+    try:
+        if dependencies:
+            init(wait_for_dependencies=lambda: [finished[dependency].wait() for dependency in dependencies])
+        else:
+            init()
+    finally:
+        # Set even if the init failed so dependent sources are not left waiting forever
+        finished[name].set()
+
+
+processes = {}
+for name, display_name, status, init, dependencies in SOURCES:
+    if status == 3:
+        logger.info(f"The {display_name} database has not been created yet, starting initialization now...\n")
+    elif status == 0:
+        logger.info(f"The {display_name} initialization has not finished yet, continuing now...\n")
+    else:
+        finished[name].set()
+        continue
+    processes[name] = mp_context.Process(target=run_source, args=(name, init, dependencies), name=f"{name}-init")
+    processes[name].start()
+
+for name, process in processes.items():
+    process.join()
+    # A crashed child never got to set its event
+    finished[name].set()
+    if process.exitcode != 0:
+        logger.error(f"The {name} initialization exited with code {process.exitcode}")
+
+
+if graph_updater.load_mode == "admin-import":
+    logger.info("Importing the staged data sources with neo4j-admin...\n")
+    graph_admin_import.finish_admin_import()
 
 
 logger.info("###############################################")
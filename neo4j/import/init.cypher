@@ -1,3 +1,6 @@
+// Runs on every start (apoc.initializer.cypher). force re-applies this same config to a graph that
+// already has data, which recreates it after a neo4j-admin import replaced the database (see
+// process/graph_admin_import.py); without it n10s refuses to init a non-empty graph.
 CALL n10s.graphconfig.init({
   handleVocabUris: 'MAP',
   handleMultival: 'ARRAY',
@@ -16,5 +19,6 @@ CALL n10s.graphconfig.init({
   ],
   keepLangTag: true,
   keepCustomDataTypes: true,
-  applyNeo4jNaming: true
+  applyNeo4jNaming: true,
+  force: true
 });
\ No newline at end of file
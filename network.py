@@ -1,4 +1,19 @@
-from prometheus_client import start_http_server, Counter
+import os
+import atexit
+import resource
+import shutil
+import tempfile
+
+# Data sources run in forked processes (entry.py) and full ontology updates in a subprocess, so
+# every process writes its metrics to files in PROMETHEUS_MULTIPROC_DIR and the :8000 endpoint
+# adds them up. The first process of a run picks a fresh folder; the processes it starts inherit
+# it. This has to happen before prometheus_client is imported.
+_metrics_dir_owner = None
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix="uckg_metrics_")
+    _metrics_dir_owner = os.getpid()
+
+from prometheus_client import start_http_server, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
 import logging
 import time
 
@@ -8,13 +23,79 @@ logger = logging.getLogger('network_logger')
 
 REQUESTS = Counter('uckg_requests_total', 'Total requests received')
 
+# NVD API client (data_collection/nvd_client.py), labelled by endpoint ("cves", "cpes")
+NVD_REQUESTS = Counter('uckg_nvd_requests_total', 'Requests sent to the NVD API', ['endpoint', 'status'])
+NVD_REQUEST_SECONDS = Histogram('uckg_nvd_request_seconds', 'NVD API request latency', ['endpoint'],
+                                buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120))
+NVD_RETRIES = Counter('uckg_nvd_retries_total', 'NVD API requests retried after throttling or errors', ['endpoint'])
+NVD_RATE_LIMIT_WAIT = Counter('uckg_nvd_rate_limit_wait_seconds_total',
+                              'Time spent waiting for the NVD rate limit', ['endpoint'])
+
+# D3FEND technique lookups (parse.parse_d3fend_file)
+D3FEND_REQUESTS = Counter('uckg_d3fend_requests_total', 'Requests sent to the D3FEND technique API', ['status'])
+D3FEND_RETRIES = Counter('uckg_d3fend_retries_total', 'D3FEND technique requests retried after throttling or errors')
+
+# Records parsed from each data source ("cve", "cpe", "cwe", "capec", "attack", "d3fend") before mapping
+RECORDS_PARSED = Counter('uckg_records_parsed_total', 'Records parsed from a data source', ['source'])
+
+# RML mapping (shared_functions.call_mapper_update), labelled by data source
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+MAPPER_SECONDS = Histogram('uckg_mapper_seconds', 'Time to map a data source or CVE batch', ['source'],
+                           buckets=STAGE_BUCKETS)
+MAPPER_TRIPLES = Counter('uckg_mapper_triples_total', 'Triples emitted by the rml mapper', ['source'])
+
+# Ontology updates, labelled by ONTOLOGY_UPDATE_MODE ("full" runs process/ontology_updater.py in
+# a subprocess with HermiT in a java child of it, "delta" runs in the data source's own process)
+ONTOLOGY_UPDATE_SECONDS = Histogram('uckg_ontology_update_seconds', 'Time to merge, reason over and write one update',
+                                    ['mode'], buckets=STAGE_BUCKETS)
+REASONER_SECONDS = Histogram('uckg_reasoner_seconds', 'Time spent reasoning in one ontology update', ['mode'],
+                             buckets=STAGE_BUCKETS)
+ONTOLOGY_UPDATE_PEAK_RSS = Gauge('uckg_ontology_update_peak_rss_bytes',
+                                 'Peak resident memory of the last ontology update ("updater" or "reasoner" process)',
+                                 ['mode', 'process'], multiprocess_mode='mostrecent')
+
+# Steps of ontology updates run with ONTOLOGY_PROFILE set (process/ontology_profiler.py)
+ONTOLOGY_STEP_SECONDS = Histogram('uckg_ontology_step_seconds', 'Time of one profiled ontology update step',
+                                  ['mode', 'step'], buckets=STAGE_BUCKETS)
+ONTOLOGY_STEP_PEAK_TRACED_BYTES = Gauge('uckg_ontology_step_peak_traced_bytes',
+                                        'Peak Python memory traced during the last profiled run of a step',
+                                        ['mode', 'step'], multiprocess_mode='mostrecent')
+
+# Graph loading (graph_updater.update_graph), labelled by GRAPH_LOAD_MODE
+GRAPH_LOAD_SECONDS = Histogram('uckg_graph_load_seconds', 'Time to load one file into Neo4j', ['mode'],
+                               buckets=STAGE_BUCKETS)
+GRAPH_TRIPLES_LOADED = Counter('uckg_graph_triples_loaded_total', 'Triples loaded into Neo4j', ['mode'])
+
+# Progress of the initial CVE load (cve_collection.cve_init)
+CVE_OFFSET = Gauge('uckg_cve_offset', 'CVEs loaded by the initial CVE load so far (cve_meta.offset)',
+                   multiprocess_mode='mostrecent')
+CVE_BACKLOG = Gauge('uckg_cve_backlog', 'CVEs reported by NVD that the initial CVE load has not reached yet',
+                    multiprocess_mode='mostrecent')
+
+
+def peak_rss_bytes(children=False):
+    """Peak resident memory of this process, or of the largest child it has waited for."""
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _remove_metrics_dir():
+    if _metrics_dir_owner == os.getpid():
+        shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+atexit.register(_remove_metrics_dir)
+
 def process_request():
     REQUESTS.inc()
     time.sleep(1)
 
 def signal_network_start():
     logger.info("Scirpt launched successfully in network.py file")
-    start_http_server(8000)  # Start metrics endpoint on port 8000
+    # Serve the metrics of every process of the run, not just this one
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(8000, registry=registry)  # Start metrics endpoint on port 8000
     logger.info("Server successfully started on port 8000")
 
 if __name__ == "__main__":
@@ -24,10 +24,39 @@
 # Last Updated (by):
 
 import xml.etree.ElementTree as ET
+import os
 import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import collections
+import concurrent.futures
 from config import LOGGER
 import requests
-import math
+import network
+from data_collection import http_session
+
+
+def iter_xml_elements(file_path, tag):
+    """Stream an XML file and yield each complete `tag` element, one at a time.
+
+    Elements directly under the root and their children (e.g. Weaknesses/Weakness) are
+    dropped from the tree as soon as they end, so memory stays at about one record no
+    matter how large the catalog is. Read what you need from a yielded element before
+    asking for the next one.
+    """
+    path = []
+    for event, element in ET.iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            path.append(element)
+            continue
+        path.pop()
+        if element.tag == tag:
+            yield element
+        if 0 < len(path) <= 2:
+            path[-1].remove(element)
 
 
 # Function to parse XML file and extract specific elements
@@ -71,366 +100,321 @@ def extract_cwe_elements():
         json.dump(cwes, json_file, indent=4)
 
 
-def parse_d3fend_file(file_path):
-
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            for item in json_data['@graph']:
-                if item.get("d3f:d3fend-id") is None:
-                    continue
-                entry = {'@id': item.get('@id', ''), 'd3f:definition': item.get('d3f:definition', ''),
-                         'd3f:d3fend-id': item.get('d3f:d3fend-id', ''),
-                         'rdfs:label': item.get('rdfs:label', '')}
-                api_url = f"https://d3fend.mitre.org/api/technique/{item['@id']}.json"
-
-                try:
-                    # Make API call to retrieve JSON data
-                    response = requests.get(api_url)
-                    response.raise_for_status()  # Raise an exception for HTTP errors
-                    json_data = response.json()
-
-                    # Parse JSON data for off_tech_id
-                    bindings = json_data['def_to_off']['results']['bindings']
-                    off_tech_id = ""
-                    for binding in bindings:
-                        off_tech_id = binding.get('off_tech_id', {}).get('value', '')
-                        if off_tech_id:
-                            break  # Assuming there's only one off_tech_id
-                    entry['off_tech_id'] = off_tech_id
-                except requests.exceptions.RequestException as e:
-                    # Handle any API request errors
-                    continue  # Skip this entry if API call fails
-                parsed_data.append(entry)
-            return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing D3FEND file: {e}")
-        return None
+D3FEND_TECHNIQUE_URL = "https://d3fend.mitre.org/api/technique/{}.json"
+# Technique lookups in flight at once
+D3FEND_FETCH_WORKERS = int(os.environ.get('D3FEND_FETCH_WORKERS', '8'))
+D3FEND_MAX_RETRIES = 4
+D3FEND_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Looked up off_tech_ids per technique and ontology version, kept on the volume
+D3FEND_CACHE_DB = "d3fend_cache.db"
+
+
+def d3fend_version(json_data, file_path):
+    """The ontology's owl:versionInfo, or a hash of the file when it does not declare one."""
+    for item in json_data.get('@graph', []):
+        version = item.get('owl:versionInfo')
+        if version:
+            return str(version.get('@value', version) if isinstance(version, dict) else version)
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _d3fend_cache():
+    conn = sqlite3.connect(os.path.join(os.environ['VOL_PATH'], D3FEND_CACHE_DB))
+    conn.execute("""CREATE TABLE IF NOT EXISTS d3fend_techniques
+                    (technique_id TEXT, version TEXT, off_tech_id TEXT, PRIMARY KEY (technique_id, version))""")
+    return conn
+
+
+def fetch_off_tech_id(technique_id, stats, stats_lock):
+    """Look up a technique's offensive technique ID, retrying throttling and server errors.
+
+    Returns None if every attempt failed. stats counts requests, retries and failures.
+    """
+    url = D3FEND_TECHNIQUE_URL.format(technique_id)
+    for attempt in range(D3FEND_MAX_RETRIES):
+        try:
+            response = http_session.get(url, timeout=60)
+            status = str(response.status_code)
+        except requests.exceptions.RequestException:
+            response, status = None, "error"
+        network.D3FEND_REQUESTS.labels(status).inc()
+        with stats_lock:
+            stats["requests"] += 1
+
+        if response is not None and response.status_code not in D3FEND_RETRY_STATUSES:
+            try:
+                response.raise_for_status()  # Raise an exception for HTTP errors
+                # Parse JSON data for off_tech_id
+                bindings = response.json()['def_to_off']['results']['bindings']
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                LOGGER.info(f"D3FEND technique {technique_id} lookup failed: {e}")
+                break
+            off_tech_id = ""
+            for binding in bindings:
+                off_tech_id = binding.get('off_tech_id', {}).get('value', '')
+                if off_tech_id:
+                    break  # Assuming there's only one off_tech_id
+            return off_tech_id
+
+        if attempt + 1 < D3FEND_MAX_RETRIES:
+            network.D3FEND_RETRIES.inc()
+            with stats_lock:
+                stats["retries"] += 1
+            time.sleep(random.uniform(0, 2 ** attempt))
+    with stats_lock:
+        stats["failed"] += 1
+    return None
 
-def parse_attack_file(file_path):
-
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                #entry = {'@id': item['@id'], 'd3f:attack-id': item['d3f:attack-id'], 'rdfs:label': item['rdfs:label']}
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
-    
-def parse_mitigations_file(file_path):
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
-
-def parse_campaigns_file(file_path):
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
-def parse_groups_file(file_path):
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
-
-def parse_software_file(file_path):
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
-def parse_tactics_file(file_path):
-    parsed_data = []
-
-    try:
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                entry = {'ID': item['ID'], 'name': item['name'], 'description': item['description'], 'url': item['url'], 'domain': item['domain']}
-                parsed_data.append(entry)
-
-        return parsed_data
-    except Exception as e:
-        # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
-        return None
 
+def parse_d3fend_file(file_path):
 
-def parse_relationships_file(file_path):
     parsed_data = []
 
     try:
         with open(file_path, 'r') as file:
             json_data = json.load(file)
-            graph = json_data.get('@graph', [])
-
-            for item in graph:
-                source_id = item.get('source ID')
-                # skip missing or NaN source IDs
-                if source_id is None or (isinstance(source_id, float) and math.isnan(source_id)):
-                    continue
-
-                # now you know source_id is valid
-                entry = {
-                    'source ID': source_id,
-                    'source type': item.get('source type'),
-                    'target ID': item.get('target ID'),
-                    'target type': item.get('target type')
-                }
+        version = d3fend_version(json_data, file_path)
+        entries = []
+        for item in json_data['@graph']:
+            if item.get("d3f:d3fend-id") is None:
+                continue
+            entries.append({'@id': item.get('@id', ''), 'd3f:definition': item.get('d3f:definition', ''),
+                            'd3f:d3fend-id': item.get('d3f:d3fend-id', ''),
+                            'rdfs:label': item.get('rdfs:label', '')})
+
+        with _d3fend_cache() as conn:
+            cached = dict(conn.execute("SELECT technique_id, off_tech_id FROM d3fend_techniques WHERE version=?",
+                                       (version,)))
+        missing = sorted({entry['@id'] for entry in entries} - cached.keys())
+        LOGGER.info(f"D3FEND {version}: {len(entries) - len(missing)} techniques cached, looking up {len(missing)}")
+
+        # Only the techniques this ontology version has not been seen with are requested
+        stats = collections.Counter()
+        stats_lock = threading.Lock()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=D3FEND_FETCH_WORKERS) as executor:
+            futures = {technique_id: executor.submit(fetch_off_tech_id, technique_id, stats, stats_lock)
+                       for technique_id in missing}
+        results = {technique_id: future.result() for technique_id, future in futures.items()}
+        fetched = {technique_id: off_tech_id for technique_id, off_tech_id in results.items()
+                   if off_tech_id is not None}
+        with _d3fend_cache() as conn:
+            conn.executemany("INSERT OR REPLACE INTO d3fend_techniques (technique_id, version, off_tech_id) VALUES (?, ?, ?)",
+                             [(technique_id, version, off_tech_id) for technique_id, off_tech_id in fetched.items()])
+            conn.execute("DELETE FROM d3fend_techniques WHERE version<>?", (version,))
+        cached.update(fetched)
+
+        LOGGER.info(f"D3FEND technique lookups: {stats['requests']} requests, {stats['retries']} retries, "
+                    f"{stats['failed']} failed")
+        failed = [technique_id for technique_id in missing if technique_id not in fetched]
+        if failed:
+            # Entries without a lookup are left out, and asked for again on the next run
+            LOGGER.info(f"Skipping D3FEND techniques whose lookup failed: {', '.join(failed)}")
+        for entry in entries:
+            if entry['@id'] in cached:
+                entry['off_tech_id'] = cached[entry['@id']]
                 parsed_data.append(entry)
-
         return parsed_data
     except Exception as e:
         # Handle any API request errors
-        LOGGER.info(f"Error parsing ATTACK file: {e}")
+        LOGGER.info(f"Error parsing D3FEND file: {e}")
         return None
 
-import xml.etree.ElementTree as ET
+CAPEC_NAMESPACE = "{http://capec.mitre.org/capec-3}"
+CAPEC_NAMESPACES = {
+    'xmlns': 'http://capec.mitre.org/capec-3',
+    'xhtml': 'http://www.w3.org/1999/xhtml',
+}
+# Namespaced paths from an Attack_Pattern to the children it is built from, expanded once
+CAPEC_PATH = {path: "/".join(CAPEC_NAMESPACE + step for step in path.split("/")) for path in (
+    'Consequences/Consequence',
+    'Description',
+    'Example_Instances/Example',
+    'Execution_Flow/Attack_Step',
+    'Extended_Description',
+    'Likelihood_Of_Attack',
+    'Mitigations/Mitigation',
+    'Prerequisites/Prerequisite',
+    'Related_Attack_Patterns/Related_Attack_Pattern',
+    'Related_Weaknesses/Related_Weakness',
+    'Resources_Required/Resource',
+    'Skills_Required/Skill',
+    'Taxonomy_Mappings/Taxonomy_Mapping[@Taxonomy_Name="ATTACK"]',
+    'Typical_Severity',
+)}
+
+
+def parse_attack_pattern(attack_pattern):
+    """Build the capec.json record for one <Attack_Pattern> element."""
+    attack = {}
+    attack['ID'] = attack_pattern.get('ID')
+    attack['Name'] = attack_pattern.get('Name')
+    attack['Abstraction'] = attack_pattern.get('Abstraction')
+    attack['Status'] = attack_pattern.get('Status')
+
+    # Description
+    description = attack_pattern.find(CAPEC_PATH['Description'])
+    if description is not None:
+        # Try direct text first
+        description_text = description.text.strip() if description.text else ""
+
+        # If no direct text, look for all <xhtml:p> children
+        if not description_text:
+            paras = description.findall('.//xhtml:p', CAPEC_NAMESPACES)
+            description_texts = [p.text.strip() for p in paras if p is not None and p.text]
+            description_text = " ".join(description_texts)
+    else:
+        description_text = ""
+    attack['Description'] = description_text
+
+    # Extended Description
+    extended_description = attack_pattern.find(CAPEC_PATH['Extended_Description'])
+    # If not directly, check nested xhtml:p for it
+    if extended_description is not None:
+        extendeds = extended_description.findall('.//xhtml:p', CAPEC_NAMESPACES)
+        extended_texts = [p.text.strip() for p in extendeds if p is not None and p.text]
+    else:
+        extended_texts = []
+    attack['Extended_Description'] = extended_texts
+
+    # Likelihood of Attack
+    likelihood = attack_pattern.find(CAPEC_PATH['Likelihood_Of_Attack'])
+    attack['Likelihood_Of_Attack'] = likelihood.text if likelihood is not None else ''
+
+    # Typical Severity
+    severity = attack_pattern.find(CAPEC_PATH['Typical_Severity'])
+    attack['Typical_Severity'] = severity.text if severity is not None else ''
+
+    # Related Attack Patterns
+    related_patterns = attack_pattern.findall(CAPEC_PATH['Related_Attack_Patterns/Related_Attack_Pattern'])
+    # Related patterns are stored as a list of strings with format "{Nature} CAPEC-{ID}"
+    attack['Related_Attack_Patterns'] = [f"{related_pattern.get('Nature')} CAPEC-{related_pattern.get('CAPEC_ID')}" for related_pattern in
+                                       related_patterns if related_pattern.get('CAPEC_ID')]
+
+    # Execution Flow
+    execution_flow = attack_pattern.findall(CAPEC_PATH['Execution_Flow/Attack_Step'])
+    flow_items = []
+    # Reconstruct the execution flow, including techniques, and Clean up the text
+    for step in execution_flow:
+        # Extract step elements directly using findtext
+        step_num = step.findtext('./xmlns:Step', '', CAPEC_NAMESPACES)
+        phase = step.findtext('./xmlns:Phase', '', CAPEC_NAMESPACES)
+        desc = step.findtext('./xmlns:Description', '', CAPEC_NAMESPACES)
+
+        # Clean up the text values
+        step_num = step_num.strip() if isinstance(step_num, str) else ''
+        phase = phase.strip() if isinstance(phase, str) else ''
+        desc = desc.strip() if isinstance(desc, str) else ''
+
+        if step_num and phase and desc:
+            # Start with the step information
+            step_info = [f"STEP-{step_num} ({phase}): {desc}"]
+            # Collect all techniques for this step
+            techniques = step.findall('./xmlns:Technique', CAPEC_NAMESPACES)
+            for idx, technique in enumerate(techniques, 1):
+                if technique is not None and technique.text:
+                    tech_text = technique.text.strip()
+                    if tech_text:
+                        step_info.append(f"TECHNIQUE-{idx}: {tech_text}")
+
+            # Join all information with semicolons
+            flow_items.append(" | ".join(step_info))
+    attack['Execution_Flow'] = flow_items
+
+    # Prerequisites
+    prerequisites = attack_pattern.findall(CAPEC_PATH['Prerequisites/Prerequisite'])
+    attack['Prerequisites'] = [prerequisite.text for prerequisite in prerequisites]
+
+    # Skills Required
+    skills_required = attack_pattern.findall(CAPEC_PATH['Skills_Required/Skill'])
+    attack['Skills_Required'] = []
+    # Clean up the text values and format as "Level:level - Description:description"
+    for skill in skills_required:
+        level = skill.get('Level', '')
+        description = skill.text.strip() if skill.text else ''
+        if level and description:
+            attack['Skills_Required'].append(f"Level:{level} - Description:{description}")
+
+    # Resources Required
+    resources_required = attack_pattern.findall(CAPEC_PATH['Resources_Required/Resource'])
+    resource_texts = []
+    # Flatten all <xhtml:p> from each <Resource> into a list of strings
+    for resource in resources_required:
+        paras = resource.findall('.//xhtml:p', CAPEC_NAMESPACES)
+        for p in paras:
+            if p is not None and p.text:
+                resource_texts.append(p.text.strip())
+    attack['Resources_Required'] = resource_texts
+
+    # Consequences
+    consequences = attack_pattern.findall(CAPEC_PATH['Consequences/Consequence'])
+    attack['Consequences'] = []
+    # Clean up the text values and format as "SCOPE:scope1,scope2,scope3 - IMPACT:impact_text"
+    for consequence in consequences:
+        # Get all scopes for this consequence
+        scopes = consequence.findall('./xmlns:Scope', CAPEC_NAMESPACES)
+        impact = consequence.findtext('./xmlns:Impact', '', CAPEC_NAMESPACES)
+
+        if scopes and impact:
+            # Clean and collect all scope texts
+            scope_texts = []
+            for idx, scope in enumerate(scopes, 1):
+                if scope.text:
+                    scope_texts.append(scope.text.strip())
+
+            if scope_texts:
+                # Format as "SCOPE:scope1,scope2,scope3 - IMPACT:impact_text"
+                scope_str = ",".join(scope_texts)
+                attack['Consequences'].append(f"SCOPE:{scope_str} - IMPACT:{impact.strip()}")
+
+    # Mitigations
+    mitigations = attack_pattern.findall(CAPEC_PATH['Mitigations/Mitigation'])
+    attack['Mitigations'] = [mitigation.text for mitigation in mitigations]
+
+    # Example Instances
+    example_instances = attack_pattern.findall(CAPEC_PATH['Example_Instances/Example'])
+    attack['Example_Instances'] = []
+    for example in example_instances:
+        # Try to get direct text first
+        example_text = example.text.strip() if example.text else ""
+
+        # If direct text is empty, try nested <xhtml:p>
+        if not example_text:
+            para = example.find('.//xhtml:p', CAPEC_NAMESPACES)
+            example_text = para.text.strip() if para is not None and para.text else ""
+
+        # Only add non-empty examples
+        if example_text:
+            attack['Example_Instances'].append(example_text)
+
+    # Related Weaknesses
+    related_weaknesses = attack_pattern.findall(CAPEC_PATH['Related_Weaknesses/Related_Weakness'])
+    attack['Related_Weaknesses'] = ["CWE-" + weakness.get('CWE_ID') for weakness in related_weaknesses]
+
+    # Taxonomy Mappings
+    taxonomy_mappings = attack_pattern.findall(CAPEC_PATH['Taxonomy_Mappings/Taxonomy_Mapping[@Taxonomy_Name="ATTACK"]'])
+    attack['Taxonomy_Mappings'] = []
+    # Extract Entry_ID and Entry_Name from each mapping only to those with ATTACK taxonomy of MITRE ATT&CK
+    for mapping in taxonomy_mappings:
+        entry_id = mapping.findtext('./xmlns:Entry_ID', '', CAPEC_NAMESPACES)
+        entry_name = mapping.findtext('./xmlns:Entry_Name', '', CAPEC_NAMESPACES)
+        if entry_id and entry_name:
+            if isinstance(entry_id, str) and isinstance(entry_name, str):
+                # Combine ID and Name into a single string
+                attack['Taxonomy_Mappings'].append(f"T{entry_id.strip()}")
+
+    return attack
+
+
+def iter_capec_attack_patterns(file_path):
+    """Yield the parsed attack patterns of a CAPEC catalog as the file streams in."""
+    for attack_pattern in iter_xml_elements(file_path, CAPEC_NAMESPACE + "Attack_Pattern"):
+        yield parse_attack_pattern(attack_pattern)
 
 
 def parse_capec_file(file_path):
     try:
-        # Parse XML file
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        # Define namespaces
-        namespaces = {
-            'xmlns': 'http://capec.mitre.org/capec-3',
-            'xhtml': 'http://www.w3.org/1999/xhtml',
-        }
-
-        # Initialize list to store parsed data
-        parsed_data = []
-
-        # Extract attack patterns
-        attack_patterns = root.findall('.//xmlns:Attack_Pattern', namespaces)
-        for attack_pattern in attack_patterns:
-            attack = {}
-            attack['ID'] = attack_pattern.get('ID')
-            attack['Name'] = attack_pattern.get('Name')
-            attack['Abstraction'] = attack_pattern.get('Abstraction')
-            attack['Status'] = attack_pattern.get('Status')
-
-           # Description
-            description = attack_pattern.find('.//xmlns:Description', namespaces)
-            if description is not None:
-                # Try direct text first
-                description_text = description.text.strip() if description.text else ""
-
-                # If no direct text, look for all <xhtml:p> children
-                if not description_text:
-                    paras = description.findall('.//xhtml:p', namespaces)
-                    description_texts = [p.text.strip() for p in paras if p is not None and p.text]
-                    description_text = " ".join(description_texts)
-            else:
-                description_text = ""
-            attack['Description'] = description_text
-
-            # Extended Description
-            extended_description = attack_pattern.find('.//xmlns:Extended_Description', namespaces)
-            # If not directly, check nested xhtml:p for it
-            if extended_description is not None:
-                extendeds = extended_description.findall('.//xhtml:p', namespaces)
-                extended_texts = [p.text.strip() for p in extendeds if p is not None and p.text]
-            else:
-                extended_texts = []
-            attack['Extended_Description'] = extended_texts
-
-            # Likelihood of Attack
-            likelihood = attack_pattern.find('.//xmlns:Likelihood_Of_Attack', namespaces)
-            attack['Likelihood_Of_Attack'] = likelihood.text if likelihood is not None else ''
-
-            # Typical Severity
-            severity = attack_pattern.find('.//xmlns:Typical_Severity', namespaces)
-            attack['Typical_Severity'] = severity.text if severity is not None else ''
-
-            # Related Attack Patterns
-            related_patterns = attack_pattern.findall('.//xmlns:Related_Attack_Patterns/xmlns:Related_Attack_Pattern',
-                                                    namespaces)
-            # Related patterns are stored as a list of strings with format "{Nature} CAPEC-{ID}"
-            attack['Related_Attack_Patterns'] = [f"{related_pattern.get('Nature')} CAPEC-{related_pattern.get('CAPEC_ID')}" for related_pattern in
-                                               related_patterns if related_pattern.get('CAPEC_ID')]
-
-            # Execution Flow
-            execution_flow = attack_pattern.findall('.//xmlns:Execution_Flow/xmlns:Attack_Step', namespaces)
-            flow_items = []
-            # Reconstruct the execution flow, including techniques, and Clean up the text
-            for step in execution_flow:
-                # Extract step elements directly using findtext
-                step_num = step.findtext('./xmlns:Step', '', namespaces)
-                phase = step.findtext('./xmlns:Phase', '', namespaces)
-                desc = step.findtext('./xmlns:Description', '', namespaces)
-                
-                # Clean up the text values
-                step_num = step_num.strip() if isinstance(step_num, str) else ''
-                phase = phase.strip() if isinstance(phase, str) else ''
-                desc = desc.strip() if isinstance(desc, str) else ''
-                
-                if step_num and phase and desc:
-                    # Start with the step information
-                    step_info = [f"STEP-{step_num} ({phase}): {desc}"]
-                    # Collect all techniques for this step
-                    techniques = step.findall('./xmlns:Technique', namespaces)
-                    for idx, technique in enumerate(techniques, 1):
-                        if technique is not None and technique.text:
-                            tech_text = technique.text.strip()
-                            if tech_text:
-                                step_info.append(f"TECHNIQUE-{idx}: {tech_text}")
-                    
-                    # Join all information with semicolons
-                    flow_items.append(" | ".join(step_info))
-            attack['Execution_Flow'] = flow_items
-
-            # Prerequisites
-            prerequisites = attack_pattern.findall('.//xmlns:Prerequisites/xmlns:Prerequisite', namespaces)
-            attack['Prerequisites'] = [prerequisite.text for prerequisite in prerequisites]
-
-            # Skills Required
-            skills_required = attack_pattern.findall('.//xmlns:Skills_Required/xmlns:Skill', namespaces)
-            attack['Skills_Required'] = []
-            # Clean up the text values and format as "Level:level - Description:description"
-            for skill in skills_required:
-                level = skill.get('Level', '')
-                description = skill.text.strip() if skill.text else ''
-                if level and description:
-                    attack['Skills_Required'].append(f"Level:{level} - Description:{description}")
-
-            # Resources Required
-            resources_required = attack_pattern.findall('.//xmlns:Resources_Required/xmlns:Resource', namespaces)
-            resource_texts = []
-            # Flatten all <xhtml:p> from each <Resource> into a list of strings
-            for resource in resources_required:
-                paras = resource.findall('.//xhtml:p', namespaces)
-                for p in paras:
-                    if p is not None and p.text:
-                        resource_texts.append(p.text.strip())
-            attack['Resources_Required'] = resource_texts
-
-            # Consequences
-            consequences = attack_pattern.findall('.//xmlns:Consequences/xmlns:Consequence', namespaces)
-            attack['Consequences'] = []
-            # Clean up the text values and format as "SCOPE:scope1,scope2,scope3 - IMPACT:impact_text"
-            for consequence in consequences:
-                # Get all scopes for this consequence
-                scopes = consequence.findall('./xmlns:Scope', namespaces)
-                impact = consequence.findtext('./xmlns:Impact', '', namespaces)
-                
-                if scopes and impact:
-                    # Clean and collect all scope texts
-                    scope_texts = []
-                    for idx, scope in enumerate(scopes, 1):
-                        if scope.text:
-                            scope_texts.append(scope.text.strip())
-                    
-                    if scope_texts:
-                        # Format as "SCOPE:scope1,scope2,scope3 - IMPACT:impact_text"
-                        scope_str = ",".join(scope_texts)
-                        attack['Consequences'].append(f"SCOPE:{scope_str} - IMPACT:{impact.strip()}")
-
-            # Mitigations
-            mitigations = attack_pattern.findall('.//xmlns:Mitigations/xmlns:Mitigation', namespaces)
-            attack['Mitigations'] = [mitigation.text for mitigation in mitigations]
-
-            # Example Instances
-            example_instances = attack_pattern.findall('.//xmlns:Example_Instances/xmlns:Example', namespaces)
-            attack['Example_Instances'] = []
-            for example in example_instances:
-                # Try to get direct text first
-                example_text = example.text.strip() if example.text else ""
-                
-                # If direct text is empty, try nested <xhtml:p>
-                if not example_text:
-                    para = example.find('.//xhtml:p', namespaces)
-                    example_text = para.text.strip() if para is not None and para.text else ""
-
-                # Only add non-empty examples
-                if example_text:
-                    attack['Example_Instances'].append(example_text)
-
-            # Related Weaknesses
-            related_weaknesses = attack_pattern.findall('.//xmlns:Related_Weaknesses/xmlns:Related_Weakness', namespaces)
-            attack['Related_Weaknesses'] = ["CWE-" + weakness.get('CWE_ID') for weakness in related_weaknesses]
-
-            # Taxonomy Mappings
-            taxonomy_mappings = attack_pattern.findall('.//xmlns:Taxonomy_Mappings/xmlns:Taxonomy_Mapping[@Taxonomy_Name="ATTACK"]', namespaces)
-            attack['Taxonomy_Mappings'] = []
-            # Extract Entry_ID and Entry_Name from each mapping only to those with ATTACK taxonomy of MITRE ATT&CK
-            for mapping in taxonomy_mappings:
-                entry_id = mapping.findtext('./xmlns:Entry_ID', '', namespaces)
-                entry_name = mapping.findtext('./xmlns:Entry_Name', '', namespaces)
-                if entry_id and entry_name:
-                    if isinstance(entry_id, str) and isinstance(entry_name, str):
-                        # Combine ID and Name into a single string
-                        attack['Taxonomy_Mappings'].append(f"T{entry_id.strip()}")
-
-            # Append parsed attack pattern to list
-            parsed_data.append(attack)
-
-        return parsed_data
+        return list(iter_capec_attack_patterns(file_path))
 
     except ET.ParseError as e:
         print(f"Error parsing XML: {e}")
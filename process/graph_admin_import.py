@@ -0,0 +1,295 @@
+import os
+import json
+import shutil
+import logging
+import datetime
+import itertools
+import subprocess
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import RDF
+from process import graph_bulk_loader as bulk
+
+# Offline import for cold-start builds. While every data source is initialized for the first
+# time, update_graph only stages the files it would have imported (GRAPH_LOAD_MODE=admin-import).
+# Once all sources are done the staged triples are turned into node and relationship CSVs, named
+# the same way the n10s config in neo4j/import/init.cypher names them, and loaded into an empty
+# database with neo4j-admin import. Rows go through files deduplicated with sort(1), so the
+# staged data never has to fit in memory.
+#
+# neo4j-admin has to run where the database files are, with the database stopped. When it is not
+# installed next to these scripts, the generated import.sh is run in the neo4j container instead,
+# which shares VOL_PATH:
+#   docker compose stop neo4j && docker compose run --rm neo4j /vol/data/admin_import/import.sh
+#
+# The import replaces the whole database, including the n10s graph config node. init.cypher runs
+# n10s.graphconfig.init with force: true on every start, so starting neo4j again afterwards
+# recreates the config that later n10s loads (incremental runs, the cve_update DAG) need.
+
+logger = logging.getLogger('graph_updater_logger')
+
+IMPORT_FOLDER = "admin_import"
+STAGED_FOLDER = "staged"
+# Separates array elements (and labels) inside one CSV field; control character so it cannot clash with text
+ARRAY_DELIMITER = "\x1f"
+
+# Named subjects of the base ontology, read the first time a staged file has to leave it out
+_base_subjects = None
+
+
+def _import_path(*parts):
+    return os.path.join(os.environ['VOL_PATH'], IMPORT_FOLDER, *parts)
+
+
+def has_staged_files():
+    staged_folder = _import_path(STAGED_FOLDER)
+    return os.path.isdir(staged_folder) and len(os.listdir(staged_folder)) > 0
+
+
+def _base_ontology_subjects():
+    global _base_subjects
+    if _base_subjects is None:
+        # Imported here, the ontology updater is only needed once a file has to be filtered
+        from process import ontology_updater
+        _base_subjects = {s for s in ontology_updater.load_base_ontology().subjects() if isinstance(s, URIRef)}
+    return _base_subjects
+
+
+def _is_base_triple(s, o, base_subjects):
+    # Mapped instances are never blank nodes, so these all come from the ontology and its restrictions
+    return isinstance(s, BNode) or isinstance(o, BNode) or s in base_subjects
+
+
+def stage_file(file_path, with_base_ontology=False):
+    """Move a file update_graph would have imported into the staging folder.
+
+    A file that carries the base ontology (every full-mode update does) keeps it only when it is the
+    first one staged, so the ontology is imported once rather than once per batch.
+    """
+    staged_folder = _import_path(STAGED_FOLDER)
+    os.makedirs(staged_folder, exist_ok=True)
+    staged_count = len(os.listdir(staged_folder))
+    staged_file = os.path.join(staged_folder, f"{staged_count:06d}.ttl")
+    if with_base_ontology and staged_count > 0:
+        base_subjects = _base_ontology_subjects()
+        graph = Graph()
+        graph.parse(file_path, format="turtle")
+        instances = Graph()
+        for s, p, o in graph:
+            if not _is_base_triple(s, o, base_subjects):
+                instances.add((s, p, o))
+        # N-Triples is valid Turtle, and much cheaper to write
+        instances.serialize(staged_file, format="nt", encoding="utf-8")
+        os.remove(file_path)
+        logger.info(f"Staged {len(instances)} of the {len(graph)} triples in {file_path} as {staged_file} "
+                    f"for neo4j-admin import, leaving out the base ontology")
+        return True
+    os.replace(file_path, staged_file)
+    logger.info(f"Staged {file_path} as {staged_file} for neo4j-admin import")
+    return True
+
+
+def _csv_type(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, datetime.datetime):
+        return "datetime" if value.tzinfo is not None else "localdatetime"
+    if isinstance(value, datetime.date):
+        return "date"
+    return "string"
+
+
+def _csv_text(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_field(value):
+    # Empty unquoted fields are read as "no property"; everything else is quoted
+    if value is None:
+        return ""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _write_row(f, fields):
+    f.write(",".join(_csv_field(field) for field in fields) + "\n")
+
+
+def _sort_file(path, *keys, unique=False):
+    """Sort a tab separated file in place on disk with sort(1), bytewise, spilling to its folder."""
+    command = ["sort", "-t", "\t", "-T", os.path.dirname(path), "-o", path]
+    command += ["-u"] if unique else ["-s"]
+    for key in keys:
+        command += ["-k", f"{key},{key}"]
+    subprocess.run(command + [path], check=True, env={**os.environ, "LC_ALL": "C"})
+
+
+def _fields(line):
+    return [json.loads(field) for field in line.rstrip("\n").split("\t")]
+
+
+def _merge_type(columns, name, column_type):
+    # A property seen with different types is stored as text
+    if columns.setdefault(name, column_type) != column_type:
+        columns[name] = "string[]" if column_type.endswith("[]") or columns[name].endswith("[]") else "string"
+
+
+def collect_staged_triples(staged_folder, work_folder):
+    """Stream every staged file into on-disk node and relationship rows, one file at a time.
+
+    Every field is JSON encoded, so rows are tab separated and one per line. Node rows are
+    (uri, "label", label) or (uri, "property", name, text, multi-valued); a node that only takes
+    part in relationships gets a label row with no label. Returns the two row files and the Neo4j type of
+    every property column.
+    """
+    node_rows_file = os.path.join(work_folder, "node_rows.tsv")
+    relationship_rows_file = os.path.join(work_folder, "relationship_rows.tsv")
+    columns = {}
+    with open(node_rows_file, "w", encoding="utf-8") as node_rows, \
+            open(relationship_rows_file, "w", encoding="utf-8") as relationship_rows:
+        def write(f, *fields):
+            f.write("\t".join(json.dumps(field) for field in fields) + "\n")
+
+        for file in sorted(os.listdir(staged_folder)):
+            graph = Graph()
+            graph.parse(os.path.join(staged_folder, file), format="turtle")
+            for s, p, o in graph:
+                subject = bulk.node_uri(s)
+                if p == RDF.type and isinstance(o, URIRef):
+                    write(node_rows, subject, "label", bulk.label_name(o))
+                elif isinstance(o, Literal):
+                    value = bulk.property_value(o)
+                    name = bulk.property_name(p)
+                    multi = str(p) in bulk.MULTIVAL_PROPERTIES
+                    _merge_type(columns, name, _csv_type(value) + ("[]" if multi else ""))
+                    write(node_rows, subject, "property", name, _csv_text(value), multi)
+                else:
+                    write(node_rows, subject, "label", "")
+                    write(node_rows, bulk.node_uri(o), "label", "")
+                    write(relationship_rows, subject, bulk.relationship_type(p), bulk.node_uri(o))
+            logger.info(f"Collected {file} ({len(graph)} triples)")
+    return node_rows_file, relationship_rows_file, columns
+
+
+def _merge_node(rows):
+    """Labels and property values of one node from its rows, a later single value replacing an earlier one."""
+    labels = set()
+    properties = {}
+    for row in rows:
+        if row[1] == "label":
+            if row[2]:
+                labels.add(row[2])
+        elif row[4]:
+            values = properties.setdefault(row[2], [])
+            if row[3] not in values:
+                values.append(row[3])
+        else:
+            properties[row[2]] = row[3]
+    return labels, properties
+
+
+def write_csv_files(staged_folder, output_folder):
+    """Write one nodes CSV per label set and relationships.csv for neo4j-admin import.
+
+    Rows are deduplicated on disk (sorted by uri) rather than merged in memory. Returns the
+    node files and the relationships file.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    work_folder = os.path.join(output_folder, "work")
+    shutil.rmtree(work_folder, ignore_errors=True)
+    os.makedirs(work_folder)
+    for old_file in os.listdir(output_folder):
+        if old_file.startswith("nodes") and old_file.endswith(".csv"):
+            os.remove(os.path.join(output_folder, old_file))
+
+    node_rows_file, relationship_rows_file, columns = collect_staged_triples(staged_folder, work_folder)
+
+    # A stable sort on uri keeps each node's rows in staging order, so the last single value wins
+    _sort_file(node_rows_file, 1)
+    merged_nodes_file = os.path.join(work_folder, "merged_nodes.tsv")
+    label_set_columns = {}
+    node_count = 0
+    with open(node_rows_file, encoding="utf-8") as rows, open(merged_nodes_file, "w", encoding="utf-8") as merged:
+        for uri, node_rows in itertools.groupby(map(_fields, rows), key=lambda row: row[0]):
+            labels, properties = _merge_node(node_rows)
+            label_set = ARRAY_DELIMITER.join(["Resource"] + sorted(labels))
+            label_set_columns.setdefault(label_set, set()).update(properties)
+            merged.write(json.dumps(label_set) + "\t" + json.dumps(uri) + "\t" + json.dumps(properties) + "\n")
+            node_count += 1
+
+    # Grouped by label set, each CSV is written in turn with only the columns its nodes use
+    _sort_file(merged_nodes_file, 1)
+    nodes_files = []
+    with open(merged_nodes_file, encoding="utf-8") as merged:
+        for label_set, nodes in itertools.groupby(map(_fields, merged), key=lambda row: row[0]):
+            names = sorted(label_set_columns[label_set])
+            nodes_file = os.path.join(output_folder, f"nodes_{len(nodes_files):04d}.csv")
+            with open(nodes_file, "w", encoding="utf-8", newline="") as f:
+                _write_row(f, ["uri:ID", ":LABEL"] + [f"{name}:{columns[name]}" for name in names])
+                for _, uri, properties in nodes:
+                    row = [uri, label_set]
+                    for name in names:
+                        value = properties.get(name)
+                        if isinstance(value, list):
+                            value = ARRAY_DELIMITER.join(value)
+                        row.append(value)
+                    _write_row(f, row)
+            nodes_files.append(nodes_file)
+
+    _sort_file(relationship_rows_file, unique=True)
+    relationships_file = os.path.join(output_folder, "relationships.csv")
+    relationship_count = 0
+    with open(relationship_rows_file, encoding="utf-8") as rows, \
+            open(relationships_file, "w", encoding="utf-8", newline="") as f:
+        _write_row(f, [":START_ID", ":TYPE", ":END_ID"])
+        for row in map(_fields, rows):
+            _write_row(f, row)
+            relationship_count += 1
+
+    shutil.rmtree(work_folder)
+    logger.info(f"Wrote {node_count} nodes in {len(nodes_files)} label files and {relationship_count} "
+                f"relationships for neo4j-admin import")
+    return nodes_files, relationships_file
+
+
+def import_command(nodes_files, relationships_file, neo4j_admin="neo4j-admin"):
+    return [neo4j_admin, "import", "--database=neo4j", "--force"] \
+        + [f"--nodes={nodes_file}" for nodes_file in nodes_files] \
+        + [f"--relationships={relationships_file}", "--array-delimiter=U+001F", "--multiline-fields=true"]
+
+
+def finish_admin_import():
+    """Turn the staged files into CSVs and import them, or leave import.sh to run next to the database."""
+    staged_folder = _import_path(STAGED_FOLDER)
+    if not os.path.isdir(staged_folder) or not os.listdir(staged_folder):
+        logger.info("Nothing staged for neo4j-admin import")
+        return False
+    nodes_files, relationships_file = write_csv_files(staged_folder, _import_path())
+
+    script_file = _import_path("import.sh")
+    with open(script_file, "w") as f:
+        f.write("#!/bin/sh\n# Run with the neo4j database stopped; replaces the neo4j database, including the\n"
+                "# n10s graph config. Start neo4j again afterwards: init.cypher recreates the config\n"
+                "# (n10s.graphconfig.init with force: true), which later n10s loads depend on\nset -e\n")
+        f.write(" ".join(f"'{arg}'" for arg in import_command(nodes_files, relationships_file)) + "\n")
+    os.chmod(script_file, 0o755)
+
+    neo4j_admin = shutil.which(os.environ.get('NEO4J_ADMIN', 'neo4j-admin'))
+    if neo4j_admin is None:
+        logger.info(f"neo4j-admin is not available here, run {script_file} where the neo4j database lives "
+                    f"(with the database stopped) to finish the import")
+        return False
+
+    result = subprocess.run(import_command(nodes_files, relationships_file, neo4j_admin))
+    if result.returncode != 0:
+        logger.error(f"neo4j-admin import failed with exit code {result.returncode}")
+        return False
+    shutil.rmtree(staged_folder)
+    logger.info("neo4j-admin import finished, start neo4j again so init.cypher recreates the n10s graph config")
+    return True
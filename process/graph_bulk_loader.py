@@ -0,0 +1,187 @@
+import os
+import re
+import logging
+import network
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import RDF, XSD
+
+# Loads a delta file with batched, parameterized Cypher instead of n10s.rdf.import.fetch.
+# Triples are grouped into node rows (per label set) and relationship rows (per type) in
+# Python, then sent as UNWIND $rows MERGE statements in chunks, several transactions at a
+# time. Names follow the n10s graph config in neo4j/import/init.cypher (handleVocabUris MAP,
+# applyNeo4jNaming, keepLangTag, keepCustomDataTypes, handleMultival ARRAY) so nodes loaded
+# either way look the same.
+
+logger = logging.getLogger('graph_updater_logger')
+
+# Rows sent per transaction
+CHUNK_SIZE = int(os.environ.get('GRAPH_LOAD_CHUNK_SIZE', '5000'))
+# Number of transactions run at the same time
+WORKERS = int(os.environ.get('GRAPH_LOAD_WORKERS', '4'))
+
+# Keep in sync with multivalPropList in neo4j/import/init.cypher
+MULTIVAL_PROPERTIES = {
+    'http://example.com/ucoexRelatedAttPattern',
+    'http://example.com/ucoexExecutionFlowTechnique',
+    'http://example.com/ucoexPrerequisites',
+    'http://example.com/ucoexSkills_Required',
+    'http://example.com/ucoexResources_Required',
+    'http://example.com/ucoexMitigations',
+    'http://example.com/ucoexConsequences',
+    'http://example.com/ucoexExample',
+    'http://example.com/ucoexTaxonomyMappingATTACK',
+    'http://example.com/ucoexRelatedWeaknesses',
+    'http://example.com/ucoexExtendedDescription',
+}
+
+# XSD datatypes n10s stores as native Neo4j values, everything else keeps its datatype IRI
+NATIVE_DATATYPES = {XSD.string, XSD.boolean, XSD.integer, XSD.int, XSD.long, XSD.short,
+                    XSD.decimal, XSD.double, XSD.float, XSD.dateTime, XSD.date}
+
+
+def local_name(iri):
+    iri = str(iri)
+    for separator in ("#", "/", ":"):
+        position = iri.rfind(separator)
+        if position != -1:
+            return iri[position + 1:]
+    return iri
+
+
+def label_name(iri):
+    name = local_name(iri)
+    return name[:1].upper() + name[1:]
+
+
+def relationship_type(iri):
+    return re.sub(r'([a-z])([A-Z])', r'\1_\2', local_name(iri)).upper()
+
+
+def property_name(iri):
+    name = local_name(iri)
+    return name[:1].lower() + name[1:]
+
+
+def node_uri(term):
+    if isinstance(term, BNode):
+        return "bnode://" + str(term)
+    return str(term)
+
+
+def property_value(literal):
+    if literal.language:
+        return f"{literal}@{literal.language}"
+    if literal.datatype is None or literal.datatype == XSD.string:
+        return str(literal)
+    if literal.datatype not in NATIVE_DATATYPES:
+        return f"{literal}^^{literal.datatype}"
+    value = literal.toPython()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Literal):
+        # Ill-formed lexical value, keep it as text
+        return str(literal)
+    return value
+
+
+def _quote(name):
+    return "`" + name.replace("`", "``") + "`"
+
+
+def group_triples(graph):
+    """Group the triples of a graph into node batches by label set and relationship batches by type."""
+    labels = defaultdict(set)
+    properties = defaultdict(dict)
+    multival = defaultdict(lambda: defaultdict(list))
+    relationships = defaultdict(set)
+
+    for s, p, o in graph:
+        subject = node_uri(s)
+        labels[subject]
+        if p == RDF.type and isinstance(o, URIRef):
+            labels[subject].add(label_name(o))
+        elif isinstance(o, Literal):
+            value = property_value(o)
+            if str(p) in MULTIVAL_PROPERTIES:
+                if value not in multival[subject][property_name(p)]:
+                    multival[subject][property_name(p)].append(value)
+            else:
+                properties[subject][property_name(p)] = value
+        else:
+            labels[node_uri(o)]
+            relationships[relationship_type(p)].add((subject, node_uri(o)))
+
+    node_batches = defaultdict(list)
+    for uri, node_labels in labels.items():
+        node_multival = multival.get(uri, {})
+        key = (tuple(sorted(node_labels)), tuple(sorted(node_multival)))
+        node_batches[key].append({"uri": uri, "props": properties.get(uri, {}), "multival": dict(node_multival)})
+
+    relationship_batches = {rel_type: [{"from": start, "to": end} for start, end in pairs]
+                            for rel_type, pairs in relationships.items()}
+    return node_batches, relationship_batches
+
+
+def _node_query(node_labels, multival_properties):
+    query = "UNWIND $rows AS row MERGE (n:Resource {uri: row.uri}) SET n += row.props"
+    if node_labels:
+        query += " SET n:" + ":".join(_quote(label) for label in node_labels)
+    for name in multival_properties:
+        # Append to the existing array without duplicates, like handleMultival ARRAY does
+        prop = "n." + _quote(name)
+        query += (f" SET {prop} = coalesce({prop}, []) + "
+                  f"[v IN row.multival.{_quote(name)} WHERE NOT v IN coalesce({prop}, [])]")
+    return query
+
+
+def _relationship_query(rel_type):
+    return ("UNWIND $rows AS row "
+            "MATCH (a:Resource {uri: row.from}) MATCH (b:Resource {uri: row.to}) "
+            f"MERGE (a)-[:{_quote(rel_type)}]->(b)")
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _run_chunk(driver, query, rows):
+    with driver.session() as session:
+        session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+    return len(rows)
+
+
+def _run_batches(driver, batches, chunk_size, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_chunk, driver, query, chunk)
+                   for query, rows in batches for chunk in _chunks(rows, chunk_size)]
+        return sum(future.result() for future in futures)
+
+
+def load_graph(driver, graph, chunk_size=CHUNK_SIZE, workers=WORKERS):
+    """Merge an rdflib graph into Neo4j; nodes go in first so relationships can match both ends."""
+    node_batches, relationship_batches = group_triples(graph)
+    nodes = _run_batches(driver, [(_node_query(*key), rows) for key, rows in node_batches.items()],
+                         chunk_size, workers)
+    relationships = _run_batches(driver, [(_relationship_query(rel_type), rows)
+                                          for rel_type, rows in relationship_batches.items()],
+                                 chunk_size, workers)
+    logger.info(f"Bulk loaded {nodes} nodes and {relationships} relationships")
+    return nodes, relationships
+
+
+def load_file(driver, file_path, chunk_size=CHUNK_SIZE, workers=WORKERS):
+    """Bulk load a Turtle/N-Triples file, returning True when every batch committed."""
+    try:
+        graph = Graph()
+        graph.parse(file_path, format="nt" if file_path.endswith(".nt") else "turtle")
+        load_graph(driver, graph, chunk_size, workers)
+        network.GRAPH_TRIPLES_LOADED.labels("bulk").inc(len(graph))
+        logger.info(f"Successfully bulk loaded {file_path}")
+        return True
+    except Exception as e:
+        logger.exception(f"Error bulk loading {file_path}: {e}")
+        return False
@@ -1,7 +1,10 @@
 import os
 import time
 import logging
-from neo4j import GraphDatabase
+import network
+from process import graph_driver
+from process import graph_bulk_loader
+from process import graph_admin_import
 
 # Configure the logging module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d, %(funcName)s)')
@@ -9,14 +12,24 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Create a logger
 logger = logging.getLogger('graph_updater_logger')
 
+# IRI of the UCO ontology header, used to tell whether the base ontology is already in the graph
+BASE_ONTOLOGY_URI = "http://purl.org/cyber/uco"
+# "n10s" imports each file with n10s.rdf.import.fetch, "bulk" sends it as batched UNWIND/MERGE
+# statements (see graph_bulk_loader.py) and only takes instance deltas (ONTOLOGY_UPDATE_MODE=delta,
+# which shared_functions switches to), "admin-import" only stages files for an offline
+# neo4j-admin import on a cold start (see graph_admin_import.py)
+load_mode = os.environ.get('GRAPH_LOAD_MODE', 'n10s')
+
 # Function to load TTL file
-def load_ttl_file(driver, file_path):
-       with driver.session() as session:
-            try:
-                session.write_transaction(_load_ttl, file_path)
-                logger.info(f"Successfully loaded TTL file from {file_path}")
-            except Exception as e:
-                logger.info(f"Error loading TTL file: {e}")
+def load_ttl_file(file_path):
+    try:
+        triples_loaded = graph_driver.execute_write(_load_ttl, file_path)
+        network.GRAPH_TRIPLES_LOADED.labels("n10s").inc(triples_loaded)
+        logger.info(f"Successfully loaded {triples_loaded} triples from TTL file {file_path}")
+        return True
+    except Exception as e:
+        logger.info(f"Error loading TTL file: {e}")
+        return False
 
 def _load_ttl(tx, file_path):
     final_file_path = "file://" + file_path
@@ -25,15 +38,17 @@ def _load_ttl(tx, file_path):
     )
     logger.info("################# Final File Path")
     logger.info(final_file_path)
-    tx.run(query, file_path=final_file_path)
+    # n10s reports what it did as a single row (terminationStatus, triplesLoaded, triplesParsed, ...)
+    record = tx.run(query, file_path=final_file_path).single()
+    return record["triplesLoaded"] if record is not None else 0
 
-def create_constraint_if_not_exists(driver):
+def create_constraint_if_not_exists():
     label = 'Resource'
     property_name = 'uri'
     constraint_name = 'n10s_unique_uri'
     constraint_description = f"CONSTRAINT ON ({label.lower()}:{label}) ASSERT {label.lower()}.{property_name} IS UNIQUE"
 
-    with driver.session() as session:
+    with graph_driver.get_driver().session() as session:
         # Query to check if the specific constraint exists
         result = session.run("SHOW CONSTRAINTS")
         constraints = [record["name"] for record in result]
@@ -45,46 +60,59 @@ def create_constraint_if_not_exists(driver):
             session.run(f"CREATE CONSTRAINT {constraint_name} ON ({label.lower()}:{label}) ASSERT {label.lower()}.{property_name} IS UNIQUE")
             logger.info("Constraint created.")
 
-def is_graph_ready():
-    uri = "bolt://neo4j:7687" 
-    username = "neo4j"
-    password = "abcd90909090"
+def is_graph_ready(timeout=60):
     start_time = time.time()
-    while time.time() - start_time < 60:
-        try:
-            # Attempt to create a Neo4j session
-            driver = GraphDatabase.driver(uri, auth=(username, password))
-            with driver.session() as session:
-                # Run a simple query to check the connection
-                session.run("RETURN 1")
-                logger.info("Neo4j is ready.")
-                return True
-        except Exception:
-            # If connection fails, wait for a bit before retrying
-            logger.info("Waiting for Neo4j to start...")
-            time.sleep(5)
-        finally:
-            # Ensure the driver is closed properly
-            if 'driver' in locals():
-                driver.close()
+    while time.time() - start_time < timeout:
+        # The shared driver is reused between attempts, only the connectivity check is repeated
+        if graph_driver.is_available():
+            logger.info("Neo4j is ready.")
+            return True
+        logger.info("Waiting for Neo4j to start...")
+        time.sleep(5)
     logger.info("Timed out waiting for Neo4j to start.")
     return False
 
 
-def update_graph():
-    uco_ontology = os.environ['UCO_ONTO_PATH']
-    root_folder = os.environ['ROOT_FOLDER']
-    vol_path = os.environ['VOL_PATH']
+def is_base_ontology_loaded():
+    if load_mode == "admin-import":
+        # Nothing is in Neo4j yet; the first staged file carries the base ontology
+        return graph_admin_import.has_staged_files()
+    # The ontology header node only exists once uco2.ttl itself has been imported
+    records = graph_driver.run_read("MATCH (n:Resource {uri: $uri}) RETURN count(n) AS total", uri=BASE_ONTOLOGY_URI)
+    return records[0]["total"] > 0
 
-    uri = "bolt://neo4j:7687" 
-    username = "neo4j"
-    password = "abcd90909090"
 
+# IRIs the CVE mapping (mapping/cve/cve_rml.ttl) gives a CVE and its vulnerability
+CVE_URI = "http://purl.org/cyber/uco#{}"
+VULNERABILITY_URI = "http://purl.org/cyber/uco#VULN-{}"
 
-    # Connect to Neo4j
-    driver = GraphDatabase.driver(uri, auth=(username, password))
+def _remove_cve_subgraphs(tx, cve_uris, vulnerability_uris):
+    # The vulnerability node only belongs to its CVE, so all of its relationships go; the CVE keeps
+    # what other sources point at it and loses what it points at (CPEs and the like)
+    tx.run("UNWIND $uris AS uri MATCH (n:Resource {uri: uri}) "
+           "OPTIONAL MATCH (n)-[r]-() DELETE r SET n = {uri: n.uri}", uris=vulnerability_uris).consume()
+    tx.run("UNWIND $uris AS uri MATCH (n:Resource {uri: uri}) "
+           "OPTIONAL MATCH (n)-[r]->() DELETE r SET n = {uri: n.uri}", uris=cve_uris).consume()
 
-    ttl_file_path = os.path.join(vol_path, "uco_with_instances.ttl")
+def remove_cve_subgraphs(cve_ids):
+    """Clear the properties and mapped relationships of CVEs before their updated version is loaded."""
+    if load_mode == "admin-import":
+        return
+    graph_driver.execute_write(_remove_cve_subgraphs,
+                               [CVE_URI.format(cve_id) for cve_id in cve_ids],
+                               [VULNERABILITY_URI.format(cve_id) for cve_id in cve_ids])
+    logger.info(f"Removed the previous version of {len(cve_ids)} CVEs")
+
+
+def update_graph(ttl_file_name="uco_with_instances.ttl"):
+    uco_ontology = os.environ['UCO_ONTO_PATH']
+    root_folder = os.environ['ROOT_FOLDER']
+    vol_path = os.environ['VOL_PATH']
+
+    ttl_file_path = os.path.join(vol_path, ttl_file_name)
+    if load_mode == "admin-import":
+        # Full-mode updates carry the whole base ontology along with the batch
+        return graph_admin_import.stage_file(ttl_file_path, with_base_ontology=ttl_file_name != "uco_delta.ttl")
 
     # Print the contents of the TTL file
     # print(f"Contents of {ttl_file_path}:")
@@ -92,15 +120,23 @@ def update_graph():
     #     print(file.read())
 
     # Make sure RDF constraint is added
-    create_constraint_if_not_exists(driver)
+    create_constraint_if_not_exists()
 
     # Load the TTL file
-    load_ttl_file(driver, ttl_file_path)
+    started = time.monotonic()
+    if load_mode == "bulk":
+        if ttl_file_name != "uco_delta.ttl":
+            # A full ontology update would be MERGEd whole, ontology and fresh blank nodes included
+            logger.error(f"GRAPH_LOAD_MODE=bulk only loads instance deltas (ONTOLOGY_UPDATE_MODE=delta), "
+                         f"not {ttl_file_name}")
+            os.remove(ttl_file_path)
+            return False
+        loaded = graph_bulk_loader.load_file(graph_driver.get_driver(), ttl_file_path)
+    else:
+        loaded = load_ttl_file(ttl_file_path)
+    network.GRAPH_LOAD_SECONDS.labels(load_mode).observe(time.monotonic() - started)
 
     # Remove uco_with_instances.ttl
     os.remove(ttl_file_path)
-    logger.info(">>>>>>>>>>>>> removed uco_with_instances.ttl")
-
-
-
-    driver.close()
\ No newline at end of file
+    logger.info(f">>>>>>>>>>>>> removed {ttl_file_name}")
+    return loaded
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import shutil
+import pstats
+import cProfile
+import logging
+import datetime
+import tracemalloc
+import contextlib
+import network
+
+# Opt-in profiling of the ontology updater, one run per update. With ONTOLOGY_PROFILE set (or
+# `ontology_updater.py --profile`), every step of the update (base parse, XML serialize,
+# owlready load, instance parse, datetime fix, reasoner, Turtle serialize, ...) is run under
+# cProfile and/or tracemalloc, and its time and memory are written under VOL_PATH:
+#
+#   VOL_PATH/ontology_profiles/<time>_<mode>_<pid>/
+#       summary.json                         seconds, traced memory and RSS per step
+#       01_owlready_load.prof                cProfile stats (python -m pstats, snakeviz, ...)
+#       01_owlready_load.txt                 top functions by cumulative time
+#       01_owlready_load.tracemalloc.txt     allocations the step added, by line
+#       01_owlready_load.tracemalloc         raw snapshot (tracemalloc.Snapshot.load)
+#
+# Step times and peak traced memory also go to Prometheus (uckg_ontology_step_*). HermiT runs in
+# java, so the reasoner step only shows its wall time and the java process's peak RSS.
+#
+# ONTOLOGY_PROFILE: "cpu" (cProfile), "memory" (tracemalloc) or "all"/"1" (both); unset is off.
+
+logger = logging.getLogger('ontology_updater_logger')
+
+PROFILE_FOLDER = "ontology_profiles"
+# Profiled runs kept on the volume; older ones are removed when a new run starts
+PROFILE_KEEP = int(os.environ.get('ONTOLOGY_PROFILE_KEEP', '20'))
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+SUMMARY_MESSAGE = "Ontology update profile written to"
+
+setting = os.environ.get('ONTOLOGY_PROFILE', '').strip().lower()
+
+
+def _modes(value):
+    if value in ("", "0", "off", "false", "no"):
+        return set()
+    if value in ("cpu", "memory"):
+        return {value}
+    return {"cpu", "memory"}
+
+
+class ProfileRun:
+    """Profiles the steps of one ontology update; a run with no modes only passes steps through."""
+
+    def __init__(self, mode, modes):
+        self.mode = mode
+        self.modes = modes
+        self.steps = []
+        self.folder = None
+        if not modes:
+            return
+        profile_root = os.path.join(os.environ['VOL_PATH'], PROFILE_FOLDER)
+        stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.folder = os.path.join(profile_root, f"{stamp}_{mode}_{os.getpid()}")
+        os.makedirs(self.folder, exist_ok=True)
+        _prune(profile_root)
+        if "memory" in modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        logger.info(f"Profiling the {mode} ontology update into {self.folder}")
+
+    @contextlib.contextmanager
+    def step(self, name):
+        if not self.modes:
+            yield
+            return
+        prefix = os.path.join(self.folder, f"{len(self.steps) + 1:02d}_{name}")
+        before = None
+        if "memory" in self.modes:
+            tracemalloc.reset_peak()
+            before = _snapshot()
+        profile = cProfile.Profile() if "cpu" in self.modes else None
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - started
+            entry = {"step": name, "seconds": round(seconds, 3), "rss_peak_bytes": network.peak_rss_bytes(),
+                     "child_rss_peak_bytes": network.peak_rss_bytes(children=True)}
+            if profile is not None:
+                _write_profile(profile, prefix)
+            if before is not None:
+                entry.update(_write_allocations(before, prefix))
+            self.steps.append(entry)
+            network.ONTOLOGY_STEP_SECONDS.labels(self.mode, name).observe(seconds)
+            if "traced_peak_bytes" in entry:
+                network.ONTOLOGY_STEP_PEAK_TRACED_BYTES.labels(self.mode, name).set(entry["traced_peak_bytes"])
+            logger.info(f"Profiled step {name}: {seconds:.2f} seconds")
+
+    def finish(self):
+        """Write summary.json for the run. Returns its path, or None when not profiling."""
+        if not self.modes:
+            return None
+        summary_file = os.path.join(self.folder, "summary.json")
+        with open(summary_file, "w") as f:
+            json.dump({"mode": self.mode, "profiled": sorted(self.modes), "steps": self.steps}, f, indent=2)
+        slowest = max(self.steps, key=lambda entry: entry["seconds"], default=None)
+        if slowest is not None:
+            logger.info(f"{SUMMARY_MESSAGE} {summary_file}, slowest step {slowest['step']} "
+                        f"({slowest['seconds']:.2f} seconds)")
+        return summary_file
+
+
+def enabled():
+    return bool(_modes(setting))
+
+
+def start_run(mode, profile=None):
+    """Start profiling one update in the given ONTOLOGY_UPDATE_MODE ("full" or "delta").
+
+    profile overrides ONTOLOGY_PROFILE ("cpu", "memory" or "all").
+    """
+    return ProfileRun(mode, _modes(setting if profile is None else profile))
+
+
+# Runs that are not profiled; steps run as they would without a profiler
+DISABLED = ProfileRun("off", set())
+
+
+def _write_profile(profile, prefix):
+    profile.dump_stats(prefix + ".prof")
+    with open(prefix + ".txt", "w") as f:
+        pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+
+def _snapshot():
+    # Leave out what tracemalloc allocates for the snapshots themselves
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _write_allocations(before, prefix):
+    after = _snapshot()
+    after.dump(prefix + ".tracemalloc")
+    differences = after.compare_to(before, "lineno")
+    with open(prefix + ".tracemalloc.txt", "w") as f:
+        for difference in differences[:TOP_ALLOCATIONS]:
+            f.write(f"{difference}\n")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    return {"traced_peak_bytes": traced_peak,
+            "traced_growth_bytes": sum(difference.size_diff for difference in differences)}
+
+
+def _prune(profile_root):
+    runs = sorted(name for name in os.listdir(profile_root) if os.path.isdir(os.path.join(profile_root, name)))
+    for name in runs[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        shutil.rmtree(os.path.join(profile_root, name), ignore_errors=True)
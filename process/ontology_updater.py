@@ -3,6 +3,15 @@ from rdflib import *
 import os
 import sys
 import logging
+import time
+import pickle
+import hashlib
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import network
+from process import tbox_reasoner
+from process import ontology_profiler
 
 def validate_and_fix_datetime_literals(graph):
     # Iterate over all triples in the graph
@@ -34,54 +43,190 @@ logging.basicConfig(level=logging.DEBUG , format='%(asctime)s - %(name)s - %(lev
 
 # # Create a logger
 logger = logging.getLogger('ontology_updater_logger')
-# Create a graph to convert uco to owl xml format
-def update_ontology(run_reasoner=False):
+# Parsed base ontology (uco2.ttl + uco_extended.ttl), kept for the life of the process
+_base_ontology = None
+# Classified TBox of the base ontology, used for scoped reasoning over delta batches
+_tbox = None
+# Parsed and classified TBox is cached on disk under this folder, one file per pair of ontology hashes
+TBOX_CACHE_FOLDER = "tbox_cache"
+
+def _file_hash(file_path):
+    # Hashed here rather than with shared_functions, which would pull neo4j and the collectors
+    # into the updater subprocess
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+def _tbox_cache_key():
+    uco_hash = _file_hash(os.environ['UCO_ONTO_PATH'])
+    extended_hash = _file_hash(os.environ['UCO_ONTO_EXTEND_PATH'])
+    return f"{uco_hash[:16]}_{extended_hash[:16]}"
+
+def _tbox_cache_path(suffix):
+    return os.path.join(os.environ['VOL_PATH'], TBOX_CACHE_FOLDER, _tbox_cache_key() + suffix)
+
+def _build_tbox_cache(cache_path):
+    g = Graph()
+    g.parse(os.environ['UCO_ONTO_PATH'], format="turtle")
+    g.parse(os.environ['UCO_ONTO_EXTEND_PATH'])
+    # Remove redundant imports which cause NTriples Parse error
+    g.remove((None, OWL.imports, None))
+    tbox = tbox_reasoner.classify(g)
+    cache_folder = os.path.dirname(cache_path)
+    os.makedirs(cache_folder, exist_ok=True)
+    # Older entries belong to ontology files that have changed since
+    for file in os.listdir(cache_folder):
+        if file.endswith(".pickle"):
+            os.remove(os.path.join(cache_folder, file))
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"triples": list(g), "tbox": tbox}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Cached parsed and classified TBox in {cache_path}")
+    return g, tbox
+
+def _load_tbox_cache():
+    """Load the base ontology and its classified TBox, rebuilding the cache if either TTL changed."""
+    global _base_ontology, _tbox
+    cache_path = _tbox_cache_path(".pickle")
     try:
-        # Get the current working directory
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
         g = Graph()
-        uco_ontology = os.environ['UCO_ONTO_PATH']
-        uco_extended_ontology = os.environ['UCO_ONTO_EXTEND_PATH']
+        g.addN((s, p, o, g) for s, p, o in cached["triples"])
+        _base_ontology, _tbox = g, cached["tbox"]
+        logger.info(f"Loaded cached TBox from {cache_path}")
+    except FileNotFoundError:
+        _base_ontology, _tbox = _build_tbox_cache(cache_path)
+    except Exception as e:
+        logger.error(f"Could not read TBox cache {cache_path}, rebuilding it: {e}")
+        _base_ontology, _tbox = _build_tbox_cache(cache_path)
+
+def load_base_ontology(profiler=ontology_profiler.DISABLED):
+    """Return the UCO base ontology and its extension, parsed once per process."""
+    if _base_ontology is None:
+        with profiler.step("base_parse"):
+            _load_tbox_cache()
+        logger.info(f"Parsed base ontology ({len(_base_ontology)} triples)")
+    return _base_ontology
+
+def load_tbox():
+    """Return the classified base ontology for scoped reasoning, classified once per ontology version."""
+    if _tbox is None:
+        _load_tbox_cache()
+    return _tbox
+
+def base_ontology_owl_file(profiler=ontology_profiler.DISABLED):
+    """Path of the base ontology as RDF/XML for owlready2, written once per ontology version."""
+    owl_path = _tbox_cache_path(".owl")
+    if not os.path.exists(owl_path):
+        os.makedirs(os.path.dirname(owl_path), exist_ok=True)
+        for file in os.listdir(os.path.dirname(owl_path)):
+            if file.endswith(".owl"):
+                os.remove(os.path.join(os.path.dirname(owl_path), file))
+        tmp_path = owl_path + f".{os.getpid()}.tmp"
+        base_ontology = load_base_ontology(profiler)
+        with profiler.step("xml_serialize"):
+            base_ontology.serialize(tmp_path, format="xml")
+        os.replace(tmp_path, owl_path)
+        logger.info(f"Created file {owl_path}")
+    return owl_path
+
+def write_instance_delta(input_file=None, output_file=None, include_base=False, reason=False, profile=None):
+    """Write one batch of mapped instances as a delta file for the graph loader.
+
+    Unlike update_ontology this never round-trips through owlready2 or RDF/XML: the mapped
+    triples are parsed, their dateTime literals fixed, and the result is written as N-Triples
+    (which n10s reads as Turtle). The base ontology is only added when include_base is set,
+    i.e. when it is not in Neo4j yet. With reason set, the inferences about the batch's
+    individuals are materialized against the cached TBox instead of running HermiT over
+    the whole ontology world. profile overrides ONTOLOGY_PROFILE (see ontology_profiler.py).
+    """
+    profiler = ontology_profiler.start_run("delta", profile)
+    try:
+        vol_path = os.environ['VOL_PATH']
+        if input_file is None:
+            input_file = os.path.join(vol_path, "out.ttl")
+        if output_file is None:
+            output_file = os.path.join(vol_path, "uco_delta.ttl")
+        delta = Graph()
+        with profiler.step("instance_parse"):
+            delta.parse(input_file, format="turtle")
+        with profiler.step("datetime_fix"):
+            validate_and_fix_datetime_literals(delta)
+        if reason:
+            logger.info(f"Running scoped reasoning over the delta")
+            started = time.monotonic()
+            with profiler.step("reasoner"):
+                tbox_reasoner.materialize(delta, load_tbox())
+            network.REASONER_SECONDS.labels("delta").observe(time.monotonic() - started)
+        if include_base:
+            base_ontology = load_base_ontology(profiler)
+            with profiler.step("base_merge"):
+                delta += base_ontology
+        with profiler.step("ntriples_serialize"):
+            delta.serialize(output_file, format="nt", encoding="utf-8")
+        logger.info(f"Created delta file {output_file} ({len(delta)} triples)")
+        return True
+    except Exception as e:
+        logger.error(e)
+        return False
+    finally:
+        profiler.finish()
+
+# Create a graph to convert uco to owl xml format
+def update_ontology(run_reasoner=False, input_file=None, profile=None):
+    # Every step below is profiled when ONTOLOGY_PROFILE (or profile) is set
+    profiler = ontology_profiler.start_run("full", profile)
+    try:
         vol_path = os.environ['VOL_PATH']
-        # Adding the base ontology
-        g.parse(uco_ontology, format="turtle")
-        # Extending the ontology
-        g.parse(uco_extended_ontology)
-        # Remove redundant imports which cause NTriples Parse error
-        g.remove((None, OWL.imports, None))
-        write_path = os.path.join(vol_path, "uco.owl")
-        g.serialize(write_path, format="xml")
-        logger.info(f"Created file uco.owl")
+        # The base ontology (uco2.ttl extended with uco_extended.ttl) as RDF/XML, cached per version
+        write_path = base_ontology_owl_file(profiler)
 
         # Load the ontolgy
-        onto = get_ontology(write_path).load()
+        with profiler.step("owlready_load"):
+            onto = get_ontology(write_path).load()
 
         # Switch back to to rdflib so I can add the instances
         graph_2 = onto.world.as_rdflib_graph()
 
         with onto:
-            graph_2.parse(os.path.join(vol_path, "out.ttl"))
+            if input_file is None:
+                input_file = os.path.join(vol_path, "out.ttl")
+            with profiler.step("instance_parse"):
+                graph_2.parse(input_file, format="turtle")
             write_path = os.path.join(vol_path, "uco_with_instances.owl")
-            validate_and_fix_datetime_literals(graph_2)
-            graph_2.serialize(write_path, format="xml")
+            with profiler.step("datetime_fix"):
+                validate_and_fix_datetime_literals(graph_2)
+            with profiler.step("instances_xml_serialize"):
+                graph_2.serialize(write_path, format="xml")
             logger.info(f"Created file uco_with_instances.owl")
 
         # Switch back to owlready2 so I can use the sync_reasoner
-        onto_final = get_ontology(write_path).load()
+        with profiler.step("owlready_reload"):
+            onto_final = get_ontology(write_path).load()
         if run_reasoner:
             logger.info(f"Running the reasoner")
             with onto_final:
-                validate_and_fix_datetime_literals(onto_final.world.as_rdflib_graph())
-                sync_reasoner()
+                with profiler.step("reasoner_datetime_fix"):
+                    validate_and_fix_datetime_literals(onto_final.world.as_rdflib_graph())
+                started = time.monotonic()
+                with profiler.step("reasoner"):
+                    sync_reasoner()
+                network.REASONER_SECONDS.labels("full").observe(time.monotonic() - started)
 
         # Finally switch back to rdflib so I can the ontology and instances as turtle format
         graph_3 = onto_final.world.as_rdflib_graph()
 
         with onto_final:
             write_path = os.path.join(vol_path, "uco_with_instances.ttl")
-            graph_3.serialize(write_path, format="turtle")
+            with profiler.step("turtle_serialize"):
+                graph_3.serialize(write_path, format="turtle")
             logger.info(f"Created file uco_with_instances.ttl")
 
-        files_to_delete = ["uco.owl", "uco_with_instances.owl"]
+        files_to_delete = ["uco_with_instances.owl"]
 
         for file in files_to_delete:
             to_delete = os.path.join(vol_path, file)
@@ -94,7 +239,20 @@ def update_ontology(run_reasoner=False):
     except Exception as e:
         logger.error(e)
         return False
+    finally:
+        profiler.finish()
 
 if __name__ == "__main__":
-    success = update_ontology()
+    parser = argparse.ArgumentParser(description="Merge mapped instances into the UCO ontology")
+    parser.add_argument("--reason", action="store_true", help="run the reasoner over the merged ontology")
+    parser.add_argument("--input", default=None, help="mapper output to merge (defaults to VOL_PATH/out.ttl)")
+    parser.add_argument("--profile", nargs="?", const="all", default=None, choices=["cpu", "memory", "all"],
+                        help="profile every step into VOL_PATH/ontology_profiles (overrides ONTOLOGY_PROFILE)")
+    args = parser.parse_args()
+    success = update_ontology(run_reasoner=args.reason, input_file=args.input, profile=args.profile)
+    # Reported through the shared metrics folder, since this process is gone by the next scrape
+    network.ONTOLOGY_UPDATE_PEAK_RSS.labels("full", "updater").set(network.peak_rss_bytes())
+    if args.reason:
+        # HermiT runs as a java child of this process
+        network.ONTOLOGY_UPDATE_PEAK_RSS.labels("full", "reasoner").set(network.peak_rss_bytes(children=True))
     sys.exit(0 if success else 1)
\ No newline at end of file
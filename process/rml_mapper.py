@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import logging
+import itertools
+from urllib.parse import quote
+from rdflib import Graph, Namespace, URIRef
+from rdflib.namespace import RDF
+
+# In-process replacement for `java -jar mapper.jar`. Each *_rml.ttl file is read once per
+# process and every TriplesMap in it is compiled into a small Python emitter, which then
+# walks the collected JSON and writes N-Triples. Only the parts of RML used by the files under
+# mapping/ are supported: JSONPath logical sources, template/reference/constant term maps,
+# rr:class, rr:datatype, rr:termType and parent triples maps with join conditions.
+#
+# Collectors write each rml:source as a record file next to it (cwes.json -> cwes.ndjson):
+# newline-delimited JSON holding the elements of the array the iterators start from, e.g.
+# one {"cwe": ...} per line for "cwes[*]" or one object per line for "$[*]". Record files
+# are streamed a line at a time; a plain JSON document is only read when no record file exists.
+
+# Configure the logging module
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('rml_mapper_logger')
+
+RML = Namespace("http://semweb.mmlab.be/ns/rml#")
+RR = Namespace("http://www.w3.org/ns/r2rml#")
+
+MAPPING_FILES = {
+    "cve": "./mapping/cve/cve_rml.ttl",
+    "cwe": "./mapping/cwe/cwe_rml.ttl",
+    "cpe": "./mapping/cpe/cpe_rml2.ttl",
+    "d3fend": "./mapping/d3fend/d3fend_rml.ttl",
+    "attack": "./mapping/attack/attack_rml.ttl",
+    "capec": "./mapping/capec/capec_rml.ttl",
+}
+
+# Compiled triples maps per mapping file, filled on first use
+_compiled_mappings = {}
+
+RECORD_FILE_SUFFIX = ".ndjson"
+
+_FILTER_CONDITION = re.compile(r"@\['([^']+)'\]\s*==\s*'([^']*)'")
+_TEMPLATE_REFERENCE = re.compile(r"\{([^}]*)\}")
+
+
+# ---------------------------------------------------------------------------
+# JSONPath
+# ---------------------------------------------------------------------------
+
+def compile_json_path(path):
+    """Turn the JSONPath subset used by our mappings into a list of (step, argument) tuples."""
+    steps = []
+    i = 0
+    if path.startswith("$"):
+        i = 1
+    # A reference starting with "." is appended to the iterator path by the jar, which
+    # makes it a deep scan ("$.cves[0]..cpes")
+    recursive = False
+    if path.startswith(".") and not path.startswith(".."):
+        recursive = True
+        i = 1
+    while i < len(path):
+        char = path[i]
+        if char == ".":
+            if path.startswith("..", i):
+                recursive = True
+                i += 2
+            else:
+                i += 1
+            continue
+        if char == "[":
+            end = path.index("]", i)
+            if path.startswith("[?(", i):
+                end = path.index(")]", i) + 1
+                conditions = _FILTER_CONDITION.findall(path[i + 3:end - 1])
+                steps.append(("filter", tuple(conditions)))
+            else:
+                inner = path[i + 1:end]
+                if inner == "*":
+                    steps.append(("wildcard", None))
+                elif inner.startswith("'") and inner.endswith("'"):
+                    steps.append(("recurse" if recursive else "key", inner[1:-1]))
+                    recursive = False
+                else:
+                    steps.append(("index", int(inner)))
+            i = end + 1
+            continue
+        end = i
+        while end < len(path) and path[end] not in ".[":
+            end += 1
+        steps.append(("recurse" if recursive else "key", path[i:end]))
+        recursive = False
+        i = end
+    return steps
+
+
+def _deep_scan(node, key):
+    if isinstance(node, dict):
+        if key in node:
+            yield node[key]
+        for child in node.values():
+            yield from _deep_scan(child, key)
+    elif isinstance(node, list):
+        for child in node:
+            yield from _deep_scan(child, key)
+
+
+def select(node, steps):
+    """Yield every node reached from node by following the compiled path steps."""
+    nodes = [node]
+    for step, argument in steps:
+        next_nodes = []
+        for current in nodes:
+            if step == "key":
+                if isinstance(current, dict) and argument in current:
+                    next_nodes.append(current[argument])
+            elif step == "recurse":
+                next_nodes.extend(_deep_scan(current, argument))
+            elif step == "wildcard":
+                if isinstance(current, list):
+                    next_nodes.extend(current)
+                elif isinstance(current, dict):
+                    next_nodes.extend(current.values())
+            elif step == "index":
+                if isinstance(current, list) and -len(current) <= argument < len(current):
+                    next_nodes.append(current[argument])
+            elif step == "filter":
+                candidates = current if isinstance(current, list) else [current]
+                for candidate in candidates:
+                    if isinstance(candidate, dict) and all(str(candidate.get(key)) == value
+                                                           for key, value in argument):
+                        next_nodes.append(candidate)
+        nodes = next_nodes
+    return nodes
+
+
+def _lexical(value):
+    # Render JSON values the way the jar's JSONPath provider prints them
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value)
+
+
+def reference_values(record, steps):
+    """Values of a reference on one iterated record; arrays are flattened and nulls dropped."""
+    values = []
+    for value in select(record, steps):
+        if isinstance(value, list):
+            values.extend(_lexical(item) for item in value if item is not None)
+        elif value is not None:
+            values.append(_lexical(value))
+    return values
+
+
+# ---------------------------------------------------------------------------
+# N-Triples terms
+# ---------------------------------------------------------------------------
+
+def _iri_safe(value):
+    # R2RML IRI-safe version of a template value: everything but unreserved characters is percent-encoded
+    return quote(value, safe="-._~")
+
+
+def _nt_iri(iri):
+    return f"<{iri}>"
+
+
+def _nt_literal(value, datatype=None, language=None):
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"')
+               .replace("\n", "\\n").replace("\r", "\\r"))
+    if language:
+        return f'"{escaped}"@{language}'
+    if datatype:
+        return f'"{escaped}"^^<{datatype}>'
+    return f'"{escaped}"'
+
+
+# ---------------------------------------------------------------------------
+# Term maps
+# ---------------------------------------------------------------------------
+
+class TermMap:
+    """A compiled rr:subjectMap, rr:predicateMap or rr:objectMap."""
+
+    def __init__(self, graph, node, default_literal):
+        self.constant = graph.value(node, RR.constant)
+        self.reference = graph.value(node, RML.reference)
+        self.template = graph.value(node, RR.template)
+        datatype = graph.value(node, RR.datatype)
+        language = graph.value(node, RR.language)
+        self.datatype = str(datatype) if datatype is not None else None
+        self.language = str(language) if language is not None else None
+        self.classes = [str(c) for c in graph.objects(node, RR["class"])]
+
+        term_type = graph.value(node, RR.termType)
+        if term_type is not None:
+            self.term_type = str(term_type).rsplit("#", 1)[-1]
+        elif default_literal and (self.reference is not None or self.datatype or self.language):
+            self.term_type = "Literal"
+        elif isinstance(self.constant, URIRef) or self.constant is None:
+            self.term_type = "IRI"
+        else:
+            self.term_type = "Literal"
+
+        if self.reference is not None:
+            self.reference_steps = compile_json_path(str(self.reference))
+        if self.template is not None:
+            template = str(self.template)
+            self.template_parts = _TEMPLATE_REFERENCE.split(template)
+            self.template_steps = [compile_json_path(reference)
+                                   for reference in _TEMPLATE_REFERENCE.findall(template)]
+
+    def values(self, record):
+        """Lexical values (IRIs or literal forms) this term map produces for a record."""
+        if self.constant is not None:
+            return [str(self.constant)]
+        if self.reference is not None:
+            return reference_values(record, self.reference_steps)
+        if self.template is not None:
+            encode = _iri_safe if self.term_type == "IRI" else (lambda value: value)
+            per_reference = [[encode(value) for value in reference_values(record, steps)]
+                             for steps in self.template_steps]
+            if any(not values for values in per_reference):
+                return []
+            results = []
+            for combination in itertools.product(*per_reference):
+                parts = list(self.template_parts)
+                parts[1::2] = combination
+                results.append("".join(parts))
+            return results
+        return []
+
+    def terms(self, record):
+        if self.term_type == "Literal":
+            return [_nt_literal(value, self.datatype, self.language) for value in self.values(record)]
+        return [_nt_iri(value) for value in self.values(record)]
+
+
+class ParentMap:
+    """An rr:objectMap that refers to another triples map through rr:parentTriplesMap."""
+
+    def __init__(self, graph, node, triples_maps):
+        self.parent = triples_maps[graph.value(node, RR.parentTriplesMap)]
+        self.conditions = []
+        for condition in graph.objects(node, RR.joinCondition):
+            self.conditions.append((compile_json_path(str(graph.value(condition, RR.child))),
+                                    compile_json_path(str(graph.value(condition, RR.parent)))))
+
+    def terms(self, record, context):
+        if not self.conditions:
+            return self.parent.subject.terms(record)
+        child_keys = itertools.product(*[reference_values(record, child) for child, _ in self.conditions])
+        index = context.join_index(self)
+        terms = []
+        for key in child_keys:
+            terms.extend(index.get(key, ()))
+        return terms
+
+
+class TriplesMap:
+
+    def __init__(self, graph, node):
+        self.node = node
+        logical_source = graph.value(node, RML.logicalSource)
+        self.source = str(graph.value(logical_source, RML.source))
+        iterator = graph.value(logical_source, RML.iterator)
+        self.iterator_steps = compile_json_path(str(iterator) if iterator is not None else "$")
+        self.subject = TermMap(graph, graph.value(node, RR.subjectMap), default_literal=False)
+        self.predicate_object_maps = []
+
+    def compile_predicate_objects(self, graph, triples_maps):
+        for pom in graph.objects(self.node, RR.predicateObjectMap):
+            predicates = [_nt_iri(str(p)) for p in graph.objects(pom, RR.predicate)]
+            predicates += [TermMap(graph, p, default_literal=False).terms(None)[0]
+                           for p in graph.objects(pom, RR.predicateMap)]
+            objects = []
+            for o in graph.objects(pom, RR.object):
+                objects.append(_nt_iri(str(o)) if isinstance(o, URIRef) else _nt_literal(str(o)))
+            object_maps = []
+            for object_map in graph.objects(pom, RR.objectMap):
+                if graph.value(object_map, RR.parentTriplesMap) is not None:
+                    object_maps.append(ParentMap(graph, object_map, triples_maps))
+                else:
+                    object_maps.append(TermMap(graph, object_map, default_literal=True))
+            self.predicate_object_maps.append((predicates, objects, object_maps))
+
+    def emit(self, context):
+        """Yield N-Triples lines for every record of this map's logical source."""
+        rdf_type = _nt_iri(str(RDF.type))
+        classes = [_nt_iri(c) for c in self.subject.classes]
+        for record in context.records(self):
+            for subject in self.subject.terms(record):
+                for rdf_class in classes:
+                    yield f"{subject} {rdf_type} {rdf_class} ."
+                for predicates, objects, object_maps in self.predicate_object_maps:
+                    terms = list(objects)
+                    for object_map in object_maps:
+                        if isinstance(object_map, ParentMap):
+                            terms.extend(object_map.terms(record, context))
+                        else:
+                            terms.extend(object_map.terms(record))
+                    for predicate in predicates:
+                        for term in terms:
+                            yield f"{subject} {predicate} {term} ."
+
+
+def record_file(source):
+    """The newline-delimited JSON file a collector writes for an rml:source path."""
+    return os.path.splitext(source)[0] + RECORD_FILE_SUFFIX
+
+
+def _record_steps(iterator_steps):
+    # Drop the key naming the top-level array, if any: a record file holds its elements
+    if len(iterator_steps) > 1 and iterator_steps[0][0] == "key" and iterator_steps[1][0] in ("wildcard", "filter"):
+        return iterator_steps[0][1], iterator_steps[1:]
+    if iterator_steps and iterator_steps[0][0] in ("wildcard", "filter"):
+        return None, iterator_steps
+    raise ValueError("iterator does not start from an array, so its source cannot be a record file")
+
+
+def _read_record_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class MappingContext:
+    """Per-run state: the loaded source documents and join indexes built from them."""
+
+    def __init__(self, sources=None):
+        self.documents = dict(sources or {})
+        self.indexes = {}
+
+    def document(self, source):
+        if source not in self.documents:
+            with open(source, "r", encoding="utf-8") as f:
+                self.documents[source] = json.load(f)
+        return self.documents[source]
+
+    def records(self, triples_map):
+        source = triples_map.source
+        if source not in self.documents and os.path.exists(record_file(source)):
+            return self._streamed_records(record_file(source), triples_map.iterator_steps)
+        return select(self.document(source), triples_map.iterator_steps)
+
+    @staticmethod
+    def _streamed_records(path, iterator_steps):
+        _, steps = _record_steps(iterator_steps)
+        for record in _read_record_file(path):
+            yield from select([record], steps)
+
+    def join_index(self, parent_map):
+        if id(parent_map) not in self.indexes:
+            index = {}
+            for record in self.records(parent_map.parent):
+                parent_keys = itertools.product(*[reference_values(record, parent)
+                                                  for _, parent in parent_map.conditions])
+                subjects = parent_map.parent.subject.terms(record)
+                for key in parent_keys:
+                    index.setdefault(key, []).extend(subjects)
+            self.indexes[id(parent_map)] = index
+        return self.indexes[id(parent_map)]
+
+
+def compile_mapping(mapping_file):
+    """Parse an RML mapping document once and return its compiled triples maps."""
+    if mapping_file not in _compiled_mappings:
+        graph = Graph()
+        graph.parse(mapping_file, format="turtle")
+        triples_maps = {}
+        for node in graph.subjects(RML.logicalSource, None):
+            triples_maps[node] = TriplesMap(graph, node)
+        for triples_map in triples_maps.values():
+            triples_map.compile_predicate_objects(graph, triples_maps)
+        _compiled_mappings[mapping_file] = list(triples_maps.values())
+        logger.info(f"Compiled {len(triples_maps)} triples maps from {mapping_file}")
+    return _compiled_mappings[mapping_file]
+
+
+def source_files(datasource):
+    """The files a data source's mapping reads (record files where they exist), in a stable order."""
+    sources = {triples_map.source for triples_map in compile_mapping(MAPPING_FILES[datasource])}
+    return sorted(record_file(source) if os.path.exists(record_file(source)) else source for source in sources)
+
+
+def record_documents(datasource):
+    """Rebuild the whole JSON document of every rml:source that has a record file, for the jar."""
+    documents = {}
+    for triples_map in compile_mapping(MAPPING_FILES[datasource]):
+        source = triples_map.source
+        if source in documents or not os.path.exists(record_file(source)):
+            continue
+        key, _ = _record_steps(triples_map.iterator_steps)
+        records = list(_read_record_file(record_file(source)))
+        documents[source] = {key: records} if key is not None else records
+    return documents
+
+
+def map_datasource(datasource, sources=None):
+    """Yield the distinct N-Triples lines produced by a data source's mapping.
+
+    sources maps rml:source paths to already loaded documents; any source not given
+    is read from disk, just like the jar would.
+    """
+    context = MappingContext(sources)
+    seen = set()
+    for triples_map in compile_mapping(MAPPING_FILES[datasource]):
+        for line in triples_map.emit(context):
+            if line not in seen:
+                seen.add(line)
+                yield line
+
+
+def write_ntriples(datasource, output_file, sources=None):
+    """Map a data source straight into output_file and return the number of triples written."""
+    count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for line in map_datasource(datasource, sources):
+            f.write(line)
+            f.write("\n")
+            count += 1
+    return count
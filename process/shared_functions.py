@@ -1,10 +1,17 @@
 import os
 import sys
 import json
+import time
 import logging
 import subprocess
 import hashlib
 import sqlite3
+import datetime
+import fcntl
+import threading
+import contextlib
+import network
+from neo4j.exceptions import DriverError, Neo4jError
 from data_collection import cve_collection as cve
 
 # Configure the logging module
@@ -17,43 +24,210 @@ logger = logging.getLogger('collect_logger')
 uco_ontology = os.environ['UCO_ONTO_PATH']
 root_folder = os.environ['ROOT_FOLDER']
 vol_path = os.environ['VOL_PATH']
+# "jar" shells out to mapping/mapper.jar, "native" maps in-process with process/rml_mapper.py.
+# The jar stays the default until benchmarks/compare_mappers.py has shown both give the same
+# triples on our data: mapped values become node URIs, so a difference would split nodes
+mapper_backend = os.environ.get('RML_MAPPER_BACKEND', 'jar')
+# "full" rebuilds UCO + instances through owlready2 on every batch, "delta" only sends each
+# batch's instance triples to Neo4j, reasoning only over that batch against a cached TBox
+ontology_update_mode = os.environ.get('ONTOLOGY_UPDATE_MODE', 'full')
 
 # Import ontology updater script
 sys.path.append(os.path.join(root_folder, "/process")) 
 from process import ontology_updater
+from process import ontology_profiler
 
 # Import graph updater script
 sys.path.append(os.path.join(root_folder, "/process")) 
 from process import graph_updater
+from process import rml_mapper
+
+# The bulk loader MERGEs everything in the file it is given, so it only scales with the batch when
+# that file is the batch's instance delta; full-mode files repeat the ontology and its blank nodes
+if graph_updater.load_mode == "bulk" and ontology_update_mode != "delta":
+    logger.warning(f"GRAPH_LOAD_MODE=bulk needs ONTOLOGY_UPDATE_MODE=delta, using delta instead of "
+                   f"{ontology_update_mode}")
+    ontology_update_mode = "delta"
+
+# Data sources are initialized in parallel processes (see entry.py), but reasoning and graph
+# loading go through fixed files on the volume (uco_delta.ttl, uco_with_instances.*) and write
+# overlapping nodes, so that part runs under one lock shared by every process and thread
+GRAPH_WRITE_LOCK_FILE = "graph_write.lock"
+_graph_write_lock = threading.RLock()
+_graph_write_depth = 0
+_graph_write_lock_file = None
+
+@contextlib.contextmanager
+def graph_write_lock():
+    """Hold the cross-process graph write lock. Re-entrant within a thread."""
+    global _graph_write_depth, _graph_write_lock_file
+    with _graph_write_lock:
+        if _graph_write_depth == 0:
+            _graph_write_lock_file = open(os.path.join(vol_path, GRAPH_WRITE_LOCK_FILE), "a")
+            fcntl.flock(_graph_write_lock_file, fcntl.LOCK_EX)
+        _graph_write_depth += 1
+        try:
+            yield
+        finally:
+            _graph_write_depth -= 1
+            if _graph_write_depth == 0:
+                fcntl.flock(_graph_write_lock_file, fcntl.LOCK_UN)
+                _graph_write_lock_file.close()
+                _graph_write_lock_file = None
+
+def base_ontology_loaded():
+    """graph_updater.is_base_ontology_loaded, or False (load everything again) if Neo4j cannot be asked."""
+    try:
+        return graph_updater.is_base_ontology_loaded()
+    except (DriverError, Neo4jError) as e:
+        logger.warning(f"Could not check Neo4j for the base ontology, treating it as not loaded: {e}")
+        return False
+
+def call_ontology_updater(reason=False, input_file=None):
+    with graph_write_lock():
+        return _call_ontology_updater(reason, input_file)
+
+def _call_ontology_updater(reason, input_file):
+    if ontology_update_mode == "delta":
+        # Only the batch's own triples go to Neo4j; the base ontology is parsed once per
+        # process and sent along just the first time. Scoped reasoning costs as much as the
+        # batch, so every batch is reasoned over rather than only the one asking for it
+        include_base = not base_ontology_loaded()
+        started = time.monotonic()
+        written = ontology_updater.write_instance_delta(input_file, os.path.join(vol_path, "uco_delta.ttl"),
+                                                        include_base, reason=True)
+        network.ONTOLOGY_UPDATE_SECONDS.labels("delta").observe(time.monotonic() - started)
+        # Runs in this process, so its peak includes everything the data source has held so far
+        network.ONTOLOGY_UPDATE_PEAK_RSS.labels("delta", "updater").set(network.peak_rss_bytes())
+        if written:
+            logger.info("successfully wrote the ontology delta now going to try to insert into the db")
+            return graph_updater.update_graph("uco_delta.ttl")
+        logger.error("Ontology updater failed to write the delta file")
+        return False
 
-def call_ontology_updater(reason=False):
     # Run the ontology updater in a subprocess to avoid heap size issues
+    command = ["python3", os.path.join(root_folder, "process", "ontology_updater.py")]
     if reason:
-        result = subprocess.run(
-            ["python3", os.path.join(root_folder, "process", "ontology_updater.py"), "--reason"],
-            capture_output=True, text=True
-        )
-        successfully_updated_ontology = (result.returncode == 0)
-        if not successfully_updated_ontology:
-            logger.error(f"Ontology updater failed:\n{result.stderr}")
-    else:
-        result = subprocess.run(
-            ["python3", os.path.join(root_folder, "process", "ontology_updater.py")],
-            capture_output=True, text=True
-        )
-        successfully_updated_ontology = (result.returncode == 0)
-        if not successfully_updated_ontology:
-            logger.error(f"Ontology updater failed:\n{result.stderr}")
+        command.append("--reason")
+    if input_file is not None:
+        # Mapper output other than the default out.ttl, e.g. one batch of the CVE pipeline
+        command.extend(["--input", input_file])
+    # The subprocess reports its own peak memory and reasoner time (see ontology_updater.py)
+    started = time.monotonic()
+    result = subprocess.run(command, capture_output=True, text=True)
+    network.ONTOLOGY_UPDATE_SECONDS.labels("full").observe(time.monotonic() - started)
+    if ontology_profiler.enabled():
+        # The subprocess's log is only kept on failure, but where its profile went is always worth saying
+        for line in result.stderr.splitlines():
+            if ontology_profiler.SUMMARY_MESSAGE in line:
+                logger.info(line)
+    successfully_updated_ontology = (result.returncode == 0)
+    if not successfully_updated_ontology:
+        logger.error(f"Ontology updater failed:\n{result.stderr}")
     if successfully_updated_ontology:
         logger.info("successfully updated the ontology now going to try to insert into the db")
-        graph_updater.update_graph()
-    else:
-        pass
+        return graph_updater.update_graph()
+    return False
+
+# Ledger of the content each data source last loaded into the graph, kept on the volume
+SOURCE_LEDGER_DB = "source_ledger.db"
+
+def _source_ledger():
+    conn = sqlite3.connect(os.path.join(vol_path, SOURCE_LEDGER_DB))
+    conn.execute("""CREATE TABLE IF NOT EXISTS source_hashes
+                    (source TEXT PRIMARY KEY, content_hash TEXT, loaded_at TEXT)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS source_runs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, content_hash TEXT, action TEXT, ran_at TEXT)""")
+    return conn
+
+def source_content_hash(datasource):
+    """SHA-256 over everything that decides what a data source puts in the graph:
+    the files its mapping reads, the mapping itself and the UCO ontology files."""
+    files = rml_mapper.source_files(datasource) + [rml_mapper.MAPPING_FILES[datasource], uco_ontology,
+                                                   os.environ['UCO_ONTO_EXTEND_PATH']]
+    combined = hashlib.sha256()
+    for file in files:
+        combined.update(file.encode("utf-8"))
+        combined.update(calculate_file_hash(file).encode("ascii"))
+    return combined.hexdigest()
+
+def record_source_run(datasource, content_hash, action):
+    """Log a run in the ledger; "loaded" runs also become the source's current content hash."""
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    with _source_ledger() as conn:
+        conn.execute("INSERT INTO source_runs (source, content_hash, action, ran_at) VALUES (?, ?, ?, ?)",
+                     (datasource, content_hash, action, now))
+        if action == "loaded":
+            conn.execute("INSERT OR REPLACE INTO source_hashes (source, content_hash, loaded_at) VALUES (?, ?, ?)",
+                         (datasource, content_hash, now))
+
+def is_source_unchanged(datasource, content_hash):
+    """True when this exact content was already loaded and the graph still holds it."""
+    with _source_ledger() as conn:
+        row = conn.execute("SELECT content_hash FROM source_hashes WHERE source=?", (datasource,)).fetchone()
+    if row is None or row[0] != content_hash:
+        return False
+    # A fresh or wiped Neo4j volume needs everything again, whatever the ledger says
+    return graph_updater.load_mode != "admin-import" and base_ontology_loaded()
+
+def map_and_load(datasource, reason=True):
+    """Map a data source and load it into the graph, unless its content hash shows nothing changed."""
+    try:
+        content_hash = source_content_hash(datasource)
+    except OSError as e:
+        logger.error(f"Could not hash the {datasource} sources: {e}")
+        return False
+    if is_source_unchanged(datasource, content_hash):
+        logger.info(f"{datasource} content unchanged since it was last loaded, skipping map, reasoning and load")
+        record_source_run(datasource, content_hash, "skipped")
+        return True
+    # Each source maps into its own file, so mapping can run while another source holds the graph lock
+    mapped_file = os.path.join(vol_path, f"out_{datasource}.ttl")
+    try:
+        if not call_mapper_update(datasource, output_file=mapped_file):
+            record_source_run(datasource, content_hash, "map_failed")
+            return False
+        if not call_ontology_updater(reason=reason, input_file=mapped_file):
+            record_source_run(datasource, content_hash, "load_failed")
+            return False
+    finally:
+        if os.path.exists(mapped_file):
+            os.remove(mapped_file)
+    record_source_run(datasource, content_hash, "loaded")
+    return True
 
 # Move to tools file later
 def write_file(filename, data):
+    # Compact: these copies are only hashed and re-parsed, never read by people
     with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+        json.dump(data, f, separators=(",", ":"))
+
+def write_records(filename, records):
+    """Write records as newline-delimited JSON, one compact object per line, consuming the
+    iterable as it goes. The file is replaced only once complete. Returns the record count."""
+    count = 0
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+    os.replace(tmp_filename, filename)
+    return count
+
+def write_file_from_records(filename, record_file):
+    """Write the records of a newline-delimited JSON file as one JSON list, a line at a time."""
+    with open(record_file, encoding="utf-8") as records, open(filename, "w", encoding="utf-8") as f:
+        f.write("[")
+        for index, line in enumerate(records):
+            if index:
+                f.write(",")
+            f.write(line.rstrip("\n"))
+        f.write("]")
 
 def calculate_file_hash(file_path):
     """Calculate the SHA-256 hash of a file."""
@@ -63,6 +237,41 @@ def calculate_file_hash(file_path):
             sha256_hash.update(chunk)
     return sha256_hash.hexdigest()
 
+# CWE IDs with their name and abstraction, written by cwe_init and shared by the other collectors
+CWE_CATALOG_FILE = "cwe_catalog.json"
+_cwe_catalog = None
+_cwe_ids = frozenset()
+_cwe_catalog_mtime = None
+
+def write_cwe_catalog(catalog):
+    """Persist the CWE catalog, {"CWE-79": {"name": ..., "abstraction": ...}, ...}."""
+    catalog_file = os.path.join(vol_path, CWE_CATALOG_FILE)
+    tmp_file = catalog_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    os.replace(tmp_file, catalog_file)
+    logger.info(f"Wrote CWE catalog with {len(catalog)} entries")
+
+def load_cwe_catalog():
+    """Return the CWE catalog dict, read once and again only after cwe_init rewrites it. Empty if not built yet."""
+    global _cwe_catalog, _cwe_ids, _cwe_catalog_mtime
+    catalog_file = os.path.join(vol_path, CWE_CATALOG_FILE)
+    try:
+        mtime = os.path.getmtime(catalog_file)
+    except OSError:
+        return {}
+    if _cwe_catalog is None or mtime != _cwe_catalog_mtime:
+        with open(catalog_file, encoding="utf-8") as f:
+            _cwe_catalog = json.load(f)
+        _cwe_ids = frozenset(_cwe_catalog)
+        _cwe_catalog_mtime = mtime
+    return _cwe_catalog
+
+def load_cwe_ids():
+    """Return the known CWE IDs ("CWE-79", ...) as a frozenset for membership checks."""
+    load_cwe_catalog()
+    return _cwe_ids
+
 
 def format_datetime_string(datetime_string):
     # Split the string into date and time components
@@ -79,26 +288,44 @@ def format_datetime_string(datetime_string):
 
     return formatted_datetime
 
-def call_mapper_update(datasource):
-    jar_path = "./mapping/mapper.jar"
-    output_file = os.path.join(vol_path, "out.ttl")
-    if datasource == "cve":
-        mapping_file = "./mapping/cve/cve_rml.ttl"
-    elif datasource == "cwe":
-        mapping_file = "./mapping/cwe/cwe_rml.ttl"
-    elif datasource == 'cpe':
-        mapping_file = "./mapping/cpe/cpe_rml2.ttl"
-    elif datasource == "d3fend":
-        mapping_file = "./mapping/d3fend/d3fend_rml.ttl"
-    elif datasource == "attack":
-        mapping_file = "./mapping/attack/attack_rml.ttl"
-    elif datasource == "capec":
-        mapping_file = "./mapping/capec/capec_rml.ttl"
-    else:
+def call_mapper_update(datasource, output_file=None, sources=None):
+    """Run the rml mapping for a data source into output_file (VOL_PATH/out.ttl by default).
+
+    sources optionally maps the rml:source paths of the mapping to documents that are already
+    in memory, so the native mapper does not have to re-read them from disk.
+    """
+    started = time.monotonic()
+    try:
+        return _call_mapper_update(datasource, output_file, sources)
+    finally:
+        network.MAPPER_SECONDS.labels(datasource).observe(time.monotonic() - started)
+
+def _call_mapper_update(datasource, output_file, sources):
+    if output_file is None:
+        output_file = os.path.join(vol_path, "out.ttl")
+    if datasource not in rml_mapper.MAPPING_FILES:
         logger.info("Not a valid rml source...")
         return False
-    
+    mapping_file = rml_mapper.MAPPING_FILES[datasource]
+
+    if mapper_backend == "native":
+        try:
+            triple_count = rml_mapper.write_ntriples(datasource, output_file, sources)
+            network.MAPPER_TRIPLES.labels(datasource).inc(triple_count)
+            logger.info(f"Mapped {triple_count} triples, output saved to: {output_file}")
+            return True
+        except Exception as e:
+            logger.error(f"Error running rml mapping: {e}")
+            return False
+
+    # The jar can only read whole JSON documents from disk, so record files are expanded first
+    sources = {**rml_mapper.record_documents(datasource), **(sources or {})}
+    for source_path, document in sources.items():
+        with open(source_path, "w+") as json_file:
+            json.dump(document, json_file, indent=4)
+
     # Construct the command
+    jar_path = "./mapping/mapper.jar"
     command = ["java", "-jar", jar_path, "-m", mapping_file, "-s", "turtle"]
 
     with open(output_file, "w+") as file:
@@ -152,11 +379,11 @@ def check_status(data_source):
         # Get the directory of the currently executing script
         current_directory = os.path.dirname(os.path.abspath(__file__))
 
-        # Define the relative path to the attack.json file
-        attack_file_path = os.path.join(vol_path, 'attack.json')
+        # Define the relative path to the attack.ndjson file (attack.json before the record files)
+        attack_file_path = os.path.join(vol_path, 'attack.ndjson')
 
-        # Check if attack.json file exists
-        if os.path.exists(attack_file_path):
+        # Check if attack.ndjson file exists
+        if os.path.exists(attack_file_path) or os.path.exists(os.path.join(vol_path, 'attack.json')):
             return 0  # File exists, return 0
         else:
             return 3  # File doesn't exist, return 3
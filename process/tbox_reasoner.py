@@ -0,0 +1,246 @@
+import logging
+from collections import defaultdict
+from rdflib import URIRef, Literal
+from rdflib.namespace import RDF, RDFS, OWL
+from rdflib.collection import Collection
+
+# Scoped reasoning for delta batches. Instead of running HermiT over the whole ontology world,
+# the UCO TBox is classified once into plain lookup tables (class hierarchy, property hierarchy,
+# inverse/symmetric/transitive properties, property chains, domains, ranges and existential
+# class definitions) and only the individuals of one batch are reasoned over with them.
+# Like owlready2's sync_reasoner() defaults, the result is the most specific inferred classes of
+# each individual. Property closures only feed the type inferences; like sync_reasoner() without
+# infer_property_values, no inferred property values are added.
+
+logger = logging.getLogger('ontology_updater_logger')
+
+
+class TBox:
+    """Classified UCO TBox; every table maps a class or property IRI to a set of IRIs."""
+
+    def __init__(self):
+        self.superclasses = defaultdict(set)
+        self.superproperties = defaultdict(set)
+        self.inverses = defaultdict(set)
+        self.symmetric = set()
+        self.transitive = set()
+        self.domains = defaultdict(set)
+        self.ranges = defaultdict(set)
+        # (super property, (first property, second property))
+        self.chains = []
+        # (defined class, property, filler classes): x p y with y in a filler class makes x a defined class
+        self.existentials = []
+
+
+def _transitive_closure(direct):
+    closure = {}
+    for start in direct:
+        seen = set()
+        stack = list(direct[start])
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                stack.extend(direct.get(node, ()))
+        closure[start] = seen
+    return closure
+
+
+def _named_classes(graph, node):
+    """Named classes a class expression stands for, or None if it is not a class or union of classes."""
+    if isinstance(node, URIRef):
+        return {node}
+    members = graph.value(node, OWL.unionOf)
+    if members is None:
+        return None
+    classes = set()
+    for member in Collection(graph, members):
+        member_classes = _named_classes(graph, member)
+        if member_classes is None:
+            return None
+        classes |= member_classes
+    return classes
+
+
+def _restriction_filler(graph, node):
+    """(property, filler classes) for someValuesFrom / min 1 qualified cardinality restrictions."""
+    prop = graph.value(node, OWL.onProperty)
+    if not isinstance(prop, URIRef):
+        return None
+    filler = graph.value(node, OWL.someValuesFrom)
+    if filler is None:
+        cardinality = graph.value(node, OWL.minQualifiedCardinality)
+        if cardinality is None or int(cardinality) < 1:
+            return None
+        filler = graph.value(node, OWL.onClass)
+    classes = _named_classes(graph, filler) if filler is not None else None
+    if not classes:
+        return None
+    return prop, classes
+
+
+def classify(graph):
+    """Compute the class/property closures of an ontology graph once."""
+    tbox = TBox()
+    subclass = defaultdict(set)
+    subproperty = defaultdict(set)
+
+    for child, parent in graph.subject_objects(RDFS.subClassOf):
+        if isinstance(child, URIRef) and isinstance(parent, URIRef):
+            subclass[child].add(parent)
+    for cls, other in graph.subject_objects(OWL.equivalentClass):
+        if not isinstance(cls, URIRef):
+            continue
+        if isinstance(other, URIRef):
+            subclass[cls].add(other)
+            subclass[other].add(cls)
+            continue
+        # A named class equivalent to a union is a superclass of every member
+        union = _named_classes(graph, other)
+        if union is not None:
+            for member in union:
+                subclass[member].add(cls)
+            continue
+        # Restrictions are sufficient conditions for the named class
+        restriction = _restriction_filler(graph, other)
+        if restriction is not None:
+            tbox.existentials.append((cls, restriction[0], frozenset(restriction[1])))
+
+    for child, parent in graph.subject_objects(RDFS.subPropertyOf):
+        if isinstance(child, URIRef) and isinstance(parent, URIRef):
+            subproperty[child].add(parent)
+    for prop, other in graph.subject_objects(OWL.equivalentProperty):
+        if isinstance(prop, URIRef) and isinstance(other, URIRef):
+            subproperty[prop].add(other)
+            subproperty[other].add(prop)
+    for prop, other in graph.subject_objects(OWL.inverseOf):
+        if isinstance(prop, URIRef) and isinstance(other, URIRef):
+            tbox.inverses[prop].add(other)
+            tbox.inverses[other].add(prop)
+
+    tbox.symmetric = set(graph.subjects(RDF.type, OWL.SymmetricProperty))
+    tbox.transitive = set(graph.subjects(RDF.type, OWL.TransitiveProperty))
+
+    for prop, chain in graph.subject_objects(OWL.propertyChainAxiom):
+        links = list(Collection(graph, chain))
+        # Longer chains are not used by UCO and would need a join per extra link
+        if len(links) == 2 and all(isinstance(link, URIRef) for link in links):
+            tbox.chains.append((prop, (links[0], links[1])))
+
+    tbox.superclasses.update(_transitive_closure(subclass))
+    tbox.superproperties.update(_transitive_closure(subproperty))
+
+    for prop, domain in graph.subject_objects(RDFS.domain):
+        classes = _named_classes(graph, domain)
+        if isinstance(prop, URIRef) and classes and len(classes) == 1:
+            tbox.domains[prop] |= classes
+    for prop, range_ in graph.subject_objects(RDFS.range):
+        classes = _named_classes(graph, range_)
+        if isinstance(prop, URIRef) and classes and len(classes) == 1:
+            tbox.ranges[prop] |= classes
+
+    # Domains and ranges are inherited by sub-properties
+    for prop, parents in tbox.superproperties.items():
+        for parent in parents:
+            tbox.domains[prop] |= tbox.domains.get(parent, set())
+            tbox.ranges[prop] |= tbox.ranges.get(parent, set())
+
+    logger.info(f"Classified TBox: {len(tbox.superclasses)} classes, {len(tbox.superproperties)} sub-properties, "
+                f"{len(tbox.existentials)} existential definitions")
+    return tbox
+
+
+def _close_types(types, tbox):
+    closed = set(types)
+    for cls in types:
+        closed |= tbox.superclasses.get(cls, set())
+    return closed
+
+
+def _close_edges(edges, tbox):
+    """Apply sub-property, inverse, symmetric, transitive and chain axioms until nothing changes."""
+    edges = set(edges)
+    while True:
+        new_edges = set()
+        by_property = defaultdict(set)
+        for s, p, o in edges:
+            by_property[p].add((s, o))
+            for parent in tbox.superproperties.get(p, ()):
+                new_edges.add((s, parent, o))
+            for inverse in tbox.inverses.get(p, ()):
+                new_edges.add((o, inverse, s))
+            if p in tbox.symmetric:
+                new_edges.add((o, p, s))
+        for p in tbox.transitive:
+            pairs = by_property.get(p, set())
+            successors = defaultdict(set)
+            for s, o in pairs:
+                successors[s].add(o)
+            for s, o in pairs:
+                for o2 in successors.get(o, ()):
+                    new_edges.add((s, p, o2))
+        for prop, (first, second) in tbox.chains:
+            successors = defaultdict(set)
+            for s, o in by_property.get(second, ()):
+                successors[s].add(o)
+            for s, o in by_property.get(first, ()):
+                for o2 in successors.get(o, ()):
+                    new_edges.add((s, prop, o2))
+        new_edges -= edges
+        if not new_edges:
+            return edges
+        edges |= new_edges
+
+
+def materialize(delta, tbox):
+    """Add the inferences about the individuals of delta to it and return how many triples were added."""
+    asserted = defaultdict(set)
+    edges = set()
+    literal_subjects = defaultdict(set)
+    for s, p, o in delta:
+        if not isinstance(s, URIRef):
+            continue
+        if p == RDF.type:
+            if isinstance(o, URIRef) and str(o).startswith(str(OWL)) is False:
+                asserted[s].add(o)
+        elif isinstance(o, Literal):
+            literal_subjects[p].add(s)
+        elif isinstance(o, URIRef):
+            edges.add((s, p, o))
+
+    closed_edges = _close_edges(edges, tbox)
+
+    types = defaultdict(set)
+    for individual, classes in asserted.items():
+        types[individual] = _close_types(classes, tbox)
+    for s, p, o in closed_edges:
+        types[s] |= _close_types(tbox.domains.get(p, set()), tbox)
+        types[o] |= _close_types(tbox.ranges.get(p, set()), tbox)
+    for p, subjects in literal_subjects.items():
+        for s in subjects:
+            types[s] |= _close_types(tbox.domains.get(p, set()), tbox)
+
+    # Existential definitions can build on each other, so repeat until no class is added
+    changed = True
+    while changed:
+        changed = False
+        for s, p, o in closed_edges:
+            for defined, prop, fillers in tbox.existentials:
+                if p == prop and defined not in types[s] and types.get(o, set()) & fillers:
+                    types[s] |= _close_types({defined}, tbox)
+                    changed = True
+
+    added = 0
+    for individual, inferred in types.items():
+        already_known = _close_types(asserted.get(individual, set()), tbox)
+        new_classes = inferred - already_known
+        # Keep only the most specific new classes, like owlready2 does when reparenting individuals
+        for cls in new_classes:
+            if any(cls in tbox.superclasses.get(other, ()) and other not in tbox.superclasses.get(cls, ())
+                   for other in new_classes if other != cls):
+                continue
+            delta.add((individual, RDF.type, cls))
+            added += 1
+
+    logger.info(f"Scoped reasoning added {added} triples for {len(types)} individuals")
+    return added